@@ -3,17 +3,19 @@ import json
 import csv
 import time
 import signal
+import argparse
+import pathlib
 import threading
+from typing import Optional
 
-import uvicorn
-from fastapi import FastAPI, Path
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Path, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 
-from .power_data import PowerData
 from .data_handler import DataHandler, DB_FILE_PATH
-from .utils import systemd_service_is_active
+from .payload import SECTIONS, Payload, resolve_fields
+from .shared import SharedDataHandler, SnapshotPublisher, WORKER_ENV
 
 app = FastAPI()
 app.add_middleware(
@@ -27,13 +29,112 @@ app.add_middleware(
 # app.add_middleware(GZipMiddleware, minimum_size=1000)  # Adjust the minimum size as needed
 # automatically unpack if Content-Encoding: gzip
 
-data_handler = DataHandler()
+# Unlocks the /admin endpoints, sent as X-Admin-Token. Without it, they don't exist
+# and neither does the profiling middleware (see profiling.py).
+ADMIN_TOKEN = os.environ.get("POWERPLOT_ADMIN_TOKEN")
+if ADMIN_TOKEN:
+    from .profiling import ProfilingMiddleware
+
+    app.add_middleware(ProfilingMiddleware)
+
+if WORKER_ENV in os.environ:
+    # One of several workers, see main().
+    data_handler = SharedDataHandler(pathlib.Path(os.environ[WORKER_ENV]))
+else:
+    data_handler = DataHandler()
+payload = Payload(data_handler)
+
+
+def degree_day_model():
+    from .degree_days import DegreeDayModel
+
+    return DegreeDayModel()
+
+
+def load_profile_cube():
+    from .cube import LoadProfileCube
+
+    return LoadProfileCube()
+
+
+def usage_forecast():
+    from .forecast import UsageForecast
+
+    return UsageForecast()
+
+
+def anomaly_detector():
+    from .anomalies import AnomalyDetector
+
+    return AnomalyDetector()
+
+
+def data_quality():
+    from .quality import DataQuality
+
+    return DataQuality()
+
+
+def appliance_events():
+    from .events import ApplianceEvents
+
+    return ApplianceEvents()
+
+
+data_handler.register("degree_days", degree_day_model)
+data_handler.register("cube", load_profile_cube)
+data_handler.register("forecast", usage_forecast)
+data_handler.register("anomalies", anomaly_detector)
+data_handler.register("quality", data_quality)
+data_handler.register("events", appliance_events)
+
+
+def reload_data() -> Optional[JSONResponse]:
+    """
+    Make sure the latest data is loaded. Returns the error response if it can't be.
+    """
+
+    try:
+        data_handler.reload()
+    except FileNotFoundError:
+        return JSONResponse(content={"error": "File not found!"}, status_code=404)
+    except AssertionError:
+        return JSONResponse(
+            content={"error": "There is no power usage data!"}, status_code=500
+        )
+
+    return None
 
 
 @app.get("/")
-async def root():
+async def root(request: Request, fields: Optional[str] = None):
+    """
+    Serve the dashboard payload. Pass e.g. `?fields=projected_bill,data.daily`
+    to only compute and receive the sections of interest.
+
+    Payloads of sections which only change with the data come with an ETag, so
+    polling clients can send If-None-Match and get a 304 until the next dataset.
+    """
+
     try:
-        data = data_handler.reload()
+        names = resolve_fields(fields)
+    except KeyError as e:
+        return JSONResponse(
+            content={"error": f"Unknown field: {e.args[0]}"}, status_code=400
+        )
+
+    etag = None
+    if any(SECTIONS[name].needs_data for name in names):
+        error = reload_data()
+        if error is not None:
+            return error
+
+        etag = payload.etag(names)
+        if etag is not None and request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+
+    try:
+        content = payload.build(names)
     except FileNotFoundError:
         return JSONResponse(content={"error": "File not found!"}, status_code=404)
     except AssertionError:
@@ -41,58 +142,371 @@ async def root():
             content={"error": "There is no power usage data!"}, status_code=500
         )
 
-    # We want to inform user on how current the data is -
-    db_last_modified = time.strftime(
-        "%B %d, %Y %I:%M:%S %p", time.localtime(data_handler.last_modified)
+    if not fields:
+        with open(f"{DB_FILE_PATH.parent}/powerplot.json", "w") as f:
+            json.dump(content, f, indent=4)
+
+    return JSONResponse(
+        content=content,
+        status_code=200,
+        headers={"ETag": etag} if etag is not None else None,
+    )
+
+
+@app.get("/weather")
+async def weather():
+    """
+    Weather-normalized usage: the degree-day regression, expected versus actual
+    daily usage and the temperature-adjusted bill projection.
+    """
+
+    error = reload_data()
+    if error is not None:
+        return error
+
+    model = data_handler.extension("degree_days")
+    if model is None or model.summary is None:
+        reason = model.reason if model is not None else "Not available."
+        return JSONResponse(content={"error": reason}, status_code=404)
+
+    return JSONResponse(content=model.summary, status_code=200)
+
+
+@app.get("/forecast")
+async def forecast():
+    """
+    Usage forecast for the next 24 hours and the rest of the month, with 90%
+    intervals, and the bill that comes to.
+    """
+
+    error = reload_data()
+    if error is not None:
+        return error
+
+    model = data_handler.extension("forecast")
+    if model.summary is None:
+        return JSONResponse(content={"error": model.reason}, status_code=404)
+
+    return JSONResponse(content=model.summary, status_code=200)
+
+
+@app.get("/anomalies")
+async def anomalies():
+    """
+    Intervals of unusually high or low usage for the hour of the week, the most
+    recent first.
+    """
+
+    error = reload_data()
+    if error is not None:
+        return error
+
+    detector = data_handler.extension("anomalies")
+    if detector.summary is None:
+        return JSONResponse(content={"error": detector.reason}, status_code=404)
+
+    return JSONResponse(content=detector.summary, status_code=200)
+
+
+@app.get("/quality")
+async def quality():
+    """
+    How complete the data is: coverage per month, incomplete days and gaps.
+    """
+
+    error = reload_data()
+    if error is not None:
+        return error
+
+    report = data_handler.extension("quality")
+    if report.summary is None:
+        return JSONResponse(content={"error": report.reason}, status_code=404)
+
+    return JSONResponse(content=report.summary, status_code=200)
+
+
+@app.get("/events")
+async def events():
+    """
+    When large loads switched on and off, the most recent first, and the clusters
+    of similar loads with what they used and cost.
+    """
+
+    error = reload_data()
+    if error is not None:
+        return error
+
+    detector = data_handler.extension("events")
+    if detector.summary is None:
+        return JSONResponse(content={"error": detector.reason}, status_code=404)
+
+    return JSONResponse(content=detector.summary, status_code=200)
+
+
+@app.get("/aggregate")
+async def aggregate(by: Optional[str] = None, stat: str = "mean"):
+    """
+    Hourly usage grouped by any of hour, dow (day of week), month and daytype
+    (weekday/weekend), e.g. `?by=dow,hour&stat=p95` for a weekly heatmap.
+    Statistics: sum, mean, p50, p95 and count (of hours).
+    """
+
+    from .cube import STATISTICS, parse_dimensions
+
+    try:
+        dimensions = parse_dimensions(by)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+
+    if stat not in STATISTICS:
+        return JSONResponse(
+            content={"error": f"Unknown statistic: {stat}"}, status_code=400
+        )
+
+    error = reload_data()
+    if error is not None:
+        return error
+
+    cube = data_handler.extension("cube")
+    return Response(
+        content=cube.lookup(dimensions, stat), media_type="application/json"
     )
-    db_last_modified_seconds_ago = int(time.time() - data_handler.last_modified)
-
-    # Some health indicators @ systemd services -
-    services_health = {}
-    services = ("pp-api", "pp-webapp", "pp-scraper")
-    for service in services:
-        services_health[service] = systemd_service_is_active(service)
-
-    content = {
-        "last_updated": db_last_modified,
-        "last_updated_seconds_ago": db_last_modified_seconds_ago,
-        "systemd": services_health,
-        "projected_bill": data.bill_breakdown(),
-        "base_usage": data.base_usage(),
-        "data": {
-            "hourly": PowerData.to_json(data.hourly()),
-            "monthly": PowerData.to_json(data.monthly()),
-            "daily": PowerData.to_json(data.daily()),
-        },
-        "statistics_and_trends": {
-            "day_breakdown": {
-                "past_24h": data.day_breakdown(last_num_hours=24),
-                "past_48h": data.day_breakdown(last_num_hours=48),
-                "past_7d": data.day_breakdown(last_num_hours=(24 * 7)),
-            },
-            "hourly_mean_trend": data.hourly_mean(),
-        },
+
+
+@app.get("/export")
+def export(
+    request: Request,
+    fmt: str = Query("csv", alias="format"),
+    resolution: str = "raw",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+):
+    """
+    Download the data: `?format=csv|ndjson|parquet&resolution=raw|hourly|daily|monthly
+    &start=2023-10-01&end=2023-12-31`, all optional. The end is exclusive, unless
+    it's a date: then that whole day is included.
+
+    The export is streamed as it's serialized. A Range request (e.g. resuming an
+    interrupted download) is served from a copy spooled to disk once per dataset,
+    as long as the data hasn't changed since (If-Range against the ETag).
+    """
+
+    from .export import Export, parse_range, read_range, spool
+
+    error = reload_data()
+    if error is not None:
+        return error
+
+    with data_handler.last_modified_lock:
+        data, version = data_handler.data, data_handler.version
+
+    try:
+        exported = Export(data, version, fmt, resolution, start, end)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return JSONResponse(
+                content={"error": "Parquet export requires pyarrow to be installed."},
+                status_code=501,
+            )
+
+    etag = f'"{exported.etag}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{exported.filename}"',
     }
 
-    with open(f"{DB_FILE_PATH.parent}/powerplot.json", "w") as f:
-        json.dump(content, f, indent=4)
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag):
+        path = spool(exported, DB_FILE_PATH.parent / "exports")
+        size = path.stat().st_size
+
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(
+                status_code=416, headers={"Content-Range": f"bytes */{size}"}
+            )
+
+        if byte_range is not None:
+            first, last = byte_range
+            return StreamingResponse(
+                read_range(path, first, last),
+                status_code=206,
+                media_type=exported.media_type,
+                headers={
+                    **headers,
+                    "Content-Range": f"bytes {first}-{last}/{size}",
+                    "Content-Length": str(last - first + 1),
+                },
+            )
+
+    return StreamingResponse(
+        iter(exported), media_type=exported.media_type, headers=headers
+    )
+
+
+def check_admin(request: Request) -> Optional[JSONResponse]:
+    """
+    The error response unless the request comes with the admin token.
+    """
+
+    from .profiling import allowed
+
+    if not ADMIN_TOKEN:
+        return JSONResponse(content={"detail": "Not Found"}, status_code=404)
+    if not allowed(request.headers.get("x-admin-token"), ADMIN_TOKEN):
+        return JSONResponse(content={"error": "Forbidden"}, status_code=403)
+
+    return None
+
+
+@app.get("/admin/profile")
+async def admin_profile(
+    request: Request,
+    path: str = "/",
+    mode: str = "sample",
+    fmt: str = Query("json", alias="format"),
+):
+    """
+    Make a request to `path` (e.g. `/?fields=projected_bill`) and profile it:
+    `mode=sample` (statistical) or `mode=trace` (every call, much slower). Returns
+    the profile as collapsed stacks, for a flamegraph, with a tracemalloc summary
+    of the allocations, or only the stacks with `format=collapsed`.
+    """
+
+    from .profiling import profiler
+
+    error = check_admin(request)
+    if error is not None:
+        return error
+
+    if profiler.busy:
+        return JSONResponse(
+            content={"error": "Already profiling a request."}, status_code=409
+        )
+
+    try:
+        profile = await profiler.run(app, path, mode)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+
+    if fmt == "collapsed":
+        return Response(content=profile["collapsed"], media_type="text/plain")
+
+    return JSONResponse(content=profile, status_code=200)
+
+
+@app.post("/admin/profile/next")
+async def admin_profile_next(request: Request, count: int = 1, mode: str = "sample"):
+    """
+    Profile the next `count` requests as they come in, see /admin/profiles. With
+    several workers, only the worker this request lands on does.
+    """
+
+    from .profiling import profiler
+
+    error = check_admin(request)
+    if error is not None:
+        return error
+
+    try:
+        profiler.arm(count, mode)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+
+    return JSONResponse(content={"armed": count, "mode": mode}, status_code=200)
+
+
+@app.get("/admin/profiles")
+async def admin_profiles(request: Request):
+    """
+    The profiles of the requests profiled since the last call, the most recent
+    first, and how many more are to come.
+    """
+
+    from .profiling import profiler
+
+    error = check_admin(request)
+    if error is not None:
+        return error
+
+    profiles = list(profiler.profiles)[::-1]
+    profiler.profiles.clear()
 
     return JSONResponse(
-        content=content,
-        status_code=200,
+        content={"profiles": profiles, "armed": profiler.armed}, status_code=200
     )
 
 
 def shutdown_server():
+    import uvicorn
+
     print("Shutting down the server...")
     uvicorn.server.should_exit = True
 
 
-def main(port: int = 8000):
+def warm_up():
+    """
+    Load the data in the background while the server starts, rather than on import
+    or on the first request.
+    """
+    try:
+        data_handler.reload()
+    except Exception as e:
+        print(f"Failed to load the data: {e}")
+
+
+def serve_workers(port: int, workers: int):
+    """
+    This process loads the data and publishes it to the workers, which only serve
+    it, see shared.py.
+    """
+
+    import uvicorn
+
+    publisher = SnapshotPublisher(data_handler, payload)
+    threading.Thread(target=publisher.run, daemon=True).start()
+
+    os.environ[WORKER_ENV] = str(publisher.directory)
+    uvicorn.run(
+        "powerplot_api.__main__:app", host="0.0.0.0", port=port, workers=workers
+    )
+
+
+def main(port: int = 8000, workers: int = 1):
+    import uvicorn
+
+    if workers > 1:
+        return serve_workers(port, workers)
+
     signal.signal(signal.SIGINT, lambda signum, frame: shutdown_server())
 
+    threading.Thread(target=warm_up, daemon=True).start()
+
+    try:
+        data_handler.listen()
+    except OSError as e:
+        print(f"Not listening for scraper notifications: {e}")
+
     uvicorn.run(app, host="0.0.0.0", port=port)
 
 
 if __name__ == "__main__":
-    main(port=8181)
+    parser = argparse.ArgumentParser(description="Serve the power usage data.")
+    parser.add_argument("--port", type=int, default=8181)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("POWERPLOT_API_WORKERS", 1)),
+        help="Worker processes to serve with, sharing one copy of the data.",
+    )
+    args = parser.parse_args()
+
+    main(port=args.port, workers=args.workers)
@@ -0,0 +1,205 @@
+import warnings
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .forecast import HOURS_PER_WEEK
+from .power_data import PowerData
+
+# Scales the MAD to the standard deviation, for normally distributed usage.
+MAD_SCALE = 1.4826
+
+
+class AnomalyDetector:
+    """
+    Flags hours whose usage is far off what's usual for that hour of the week: more
+    than THRESHOLD robust standard deviations (MAD based) from the median of the
+    last WINDOW_WEEKS weeks, and by at least MIN_DEVIATION_KWH.
+
+    The window is a ring buffer of WINDOW_WEEKS values per hour of the week, so
+    every hour is scored against the weeks before it, and a new dataset only costs
+    the hours since the previous one. Like UsageForecast, the last SETTLE_HOURS are
+    scored without being added to the window or the history for good, and a change
+    to older data (see PowerData.hourly_totals()) rebuilds everything. Hours missing
+    reads aren't scored at all.
+    """
+
+    WINDOW_WEEKS = 8
+    MIN_WEEKS = 3  # of history for an hour of the week before scoring it
+    THRESHOLD = 4.0
+    MIN_DEVIATION_KWH = 0.25
+    SETTLE_HOURS = 48
+    MAX_ANOMALIES = 1000  # settled anomalous hours kept, the most recent ones
+
+    def __init__(self):
+        self.reset()
+
+        self.summary: Optional[dict] = None
+        self.reason: Optional[str] = "No data yet."
+
+    def reset(self):
+        self.window = np.full((HOURS_PER_WEEK, self.WINDOW_WEEKS), np.nan)
+        self.position = np.zeros(HOURS_PER_WEEK, dtype=np.int64)
+
+        self.boundary: Optional[pd.Timestamp] = None  # last hour added for good
+        self.fingerprint = (0, 0.0)  # count and sum of the hours up to the boundary
+        self.anomalies: List[dict] = []
+
+    def statistics(self, how: np.ndarray):
+        """
+        The median, robust standard deviation and the number of weeks of history for
+        the given hours of the week.
+        """
+
+        window = self.window[how]
+        with warnings.catch_warnings():
+            # All-NaN rows, hours of the week without history; see the count.
+            warnings.simplefilter("ignore", RuntimeWarning)
+            median = np.nanmedian(window, axis=1)
+            mad = np.nanmedian(np.abs(window - median[:, None]), axis=1)
+
+        return median, MAD_SCALE * mad, np.count_nonzero(~np.isnan(window), axis=1)
+
+    def score(self, hourly: pd.Series, how: np.ndarray) -> List[dict]:
+        """
+        Score `hourly`, whose hours of the week are `how`, against the current
+        window, which is left as it is. None of the hours may share an hour of the
+        week.
+        """
+
+        values = hourly.to_numpy(dtype=np.float64)
+        median, sd, weeks = self.statistics(how)
+
+        deviation = values - median
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # A flat history (zero MAD) still needs MIN_DEVIATION_KWH to stand out.
+            z = deviation / np.maximum(sd, self.MIN_DEVIATION_KWH / self.THRESHOLD)
+
+        flagged = (
+            (weeks >= self.MIN_WEEKS)
+            & (np.abs(z) > self.THRESHOLD)
+            & (np.abs(deviation) >= self.MIN_DEVIATION_KWH)
+        )
+
+        return [
+            {
+                "time": hourly.index[i],
+                "kwh": round(float(values[i]), 3),
+                "expected_kwh": round(float(median[i]), 3),
+                "score": round(float(z[i]), 1),
+            }
+            for i in np.flatnonzero(flagged)
+        ]
+
+    def push(self, hourly: pd.Series, how: np.ndarray):
+        self.window[how, self.position[how] % self.WINDOW_WEEKS] = hourly.to_numpy()
+        self.position[how] += 1
+
+    @staticmethod
+    def weeks(hourly: pd.Series, how: np.ndarray):
+        """
+        Split `hourly`, whose hours of the week are `how`, into runs in which the
+        hour of the week only goes up (weeks, mostly), so that every hour of the
+        week occurs at most once in each; scoring a whole run before adding it to
+        the window is then the same as going hour by hour.
+        """
+
+        if hourly.empty:
+            return
+
+        starts = np.flatnonzero(np.r_[True, how[1:] <= how[:-1]])
+        for start, end in zip(starts, np.r_[starts[1:], len(hourly)]):
+            yield hourly.iloc[start:end], how[start:end]
+
+    def update(self, data: PowerData):
+        hourly = data.hourly_usage(complete=True)
+        if hourly.empty:
+            self.summary, self.reason = None, "No data."
+            return
+
+        last = hourly.index[-1]
+        boundary = last - pd.Timedelta(hours=self.SETTLE_HOURS)
+        settled = hourly.index.searchsorted(boundary, side="right")
+
+        unchanged = self.boundary is not None and self.boundary <= boundary
+        if unchanged:
+            count, total = data.hourly_totals(self.boundary)
+            unchanged = count == self.fingerprint[0] and np.isclose(
+                total, self.fingerprint[1]
+            )
+
+        if unchanged:
+            new = hourly.iloc[self.fingerprint[0] : settled]
+        else:
+            self.reset()
+            new = hourly.iloc[:settled]
+
+        for week, how in self.weeks(new, data.hour_of_week(new.index)):
+            self.anomalies.extend(self.score(week, how))
+            self.push(week, how)
+        del self.anomalies[: -self.MAX_ANOMALIES]
+
+        if not new.empty:
+            self.boundary = new.index[-1]
+            self.fingerprint = data.hourly_totals(self.boundary)
+
+        # The unsettled hours are only scored, they span less than a week.
+        unsettled = hourly.iloc[settled:]
+        provisional = self.score(unsettled, data.hour_of_week(unsettled.index))
+
+        self.summary, self.reason = self.summarize(self.anomalies, provisional), None
+
+    @staticmethod
+    def intervals(anomalies: List[dict]) -> List[dict]:
+        """
+        Runs of consecutive anomalous hours (in the same direction) as one interval
+        each, e.g. an AC that didn't turn off for an afternoon.
+        """
+
+        intervals = []
+        for anomaly in anomalies:
+            direction = "high" if anomaly["score"] > 0 else "low"
+            previous = intervals[-1] if intervals else None
+            if (
+                previous is not None
+                and previous["direction"] == direction
+                and anomaly["time"] - previous["last"] == pd.Timedelta(hours=1)
+            ):
+                interval = previous
+            else:
+                interval = {
+                    "start": anomaly["time"],
+                    "direction": direction,
+                    "hours": [],
+                }
+                intervals.append(interval)
+
+            interval["last"] = anomaly["time"]
+            interval["hours"].append(anomaly)
+
+        return [
+            {
+                "start": str(interval["start"]),
+                "end": str(interval["last"] + pd.Timedelta(hours=1)),
+                "direction": interval["direction"],
+                "kwh": round(sum(h["kwh"] for h in interval["hours"]), 2),
+                "excess_kwh": round(
+                    sum(h["kwh"] - h["expected_kwh"] for h in interval["hours"]), 2
+                ),
+                "peak_score": max((h["score"] for h in interval["hours"]), key=abs),
+            }
+            for interval in intervals
+        ]
+
+    def summarize(self, anomalies: List[dict], provisional: List[dict]) -> dict:
+        intervals = self.intervals(anomalies + provisional)
+        boundary = str(self.boundary + pd.Timedelta(hours=1)) if self.boundary else ""
+
+        return {
+            # The most recent first; the ones past the boundary may still change.
+            "intervals": intervals[::-1],
+            "settled_until": boundary,
+            "threshold": self.THRESHOLD,
+            "window_weeks": self.WINDOW_WEEKS,
+        }
@@ -0,0 +1,178 @@
+import json
+from itertools import combinations
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .power_data import PowerData
+
+# Group-by dimension -> number of values it takes.
+DIMENSIONS: Dict[str, int] = {
+    "hour": 24,  # hour of day, 0-23
+    "dow": 7,  # day of week, 0 is Monday
+    "month": 12,  # 1-12
+    "daytype": 2,  # "weekday" / "weekend"
+}
+
+STATISTICS = ("sum", "mean", "p50", "p95", "count")
+
+DAYTYPES = ("weekday", "weekend")
+
+
+def parse_dimensions(by: str) -> Tuple[str, ...]:
+    """
+    `?by=dow,hour` -> ("hour", "dow"): validated and in the canonical order.
+    Raises ValueError on an unknown or nonsensical combination.
+    """
+
+    names = {name.strip() for name in (by or "").split(",") if name.strip()}
+
+    unknown = names - set(DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Unknown dimension(s): {', '.join(sorted(unknown))}")
+
+    if {"dow", "daytype"} <= names:
+        raise ValueError("dow and daytype can't be combined, dow implies the daytype.")
+
+    return tuple(name for name in DIMENSIONS if name in names)
+
+
+def group_percentiles(
+    codes: np.ndarray, values: np.ndarray, counts: np.ndarray, q: float
+) -> np.ndarray:
+    """
+    The q-th quantile (linear interpolation) of the values in every group, in one
+    sort instead of a groupby.
+    """
+
+    if len(values) == 0:
+        return np.full(len(counts), np.nan)
+
+    sorted_values = values[np.lexsort((values, codes))]
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    # Empty groups point past their start, keep them in bounds; they're NaN anyway.
+    position = np.minimum(
+        starts + q * np.maximum(counts - 1, 0), len(values) - 1
+    ).astype(np.float64)
+    lo = np.floor(position).astype(np.int64)
+    hi = np.ceil(position).astype(np.int64)
+    result = sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (
+        position - lo
+    )
+
+    return np.where(counts > 0, result, np.nan)
+
+
+class LoadProfileCube:
+    """
+    Hourly usage aggregated by every valid combination of DIMENSIONS, for every
+    statistic in STATISTICS. Built with NumPy group reductions, and serialized, so
+    that `/aggregate` is a dictionary lookup.
+
+    The percentiles don't fold in new hours the way sums do, so the cube is rebuilt
+    from the whole history, off the hourly usage and calendar PowerData works out
+    once per dataset anyway. Only when the complete hours changed though: a reload
+    that only adds reads to the hour in progress, or only new weather, keeps it.
+
+    Hours without all their reads (gaps in the data, the hour in progress) are left
+    out rather than counted as (too) low usage.
+    """
+
+    def __init__(self):
+        # (dimensions, stat) -> the JSON response body
+        self.results: Dict[Tuple[Tuple[str, ...], str], bytes] = {}
+        self.fingerprint = (0, 0.0)  # count and sum of the hours it was built from
+
+    def update(self, data: PowerData):
+        hourly = data.hourly_usage(complete=True)
+        fingerprint = data.hourly_totals(hourly.index[-1]) if len(hourly) else (0, 0.0)
+        if (
+            self.results
+            and fingerprint[0] == self.fingerprint[0]
+            and np.isclose(fingerprint[1], self.fingerprint[1])
+        ):
+            return
+
+        values = hourly.to_numpy(dtype=np.float64)
+        calendar = data.buckets("h").calendar
+        positions = data.hour_positions(hourly.index)
+
+        dow = calendar.weekday[positions].astype(np.int64)
+        codes_by_dimension = {
+            "hour": calendar.hour[positions].astype(np.int64),
+            "dow": dow,
+            "month": calendar.month[positions].astype(np.int64) % 12,
+            "daytype": (dow >= 5).astype(np.int64),
+        }
+
+        results = {}
+        for r in range(len(DIMENSIONS) + 1):
+            for dimensions in combinations(DIMENSIONS, r):
+                if {"dow", "daytype"} <= set(dimensions):
+                    continue
+
+                for stat, records in self.aggregate(
+                    dimensions, codes_by_dimension, values
+                ).items():
+                    results[(dimensions, stat)] = json.dumps(
+                        {"by": list(dimensions), "stat": stat, "values": records}
+                    ).encode()
+
+        self.results = results
+        self.fingerprint = fingerprint
+
+    def aggregate(
+        self,
+        dimensions: Tuple[str, ...],
+        codes_by_dimension: Dict[str, np.ndarray],
+        values: np.ndarray,
+    ) -> Dict[str, List[dict]]:
+        shape = tuple(DIMENSIONS[d] for d in dimensions)
+        size = int(np.prod(shape))
+
+        if dimensions:
+            codes = np.ravel_multi_index(
+                [codes_by_dimension[d] for d in dimensions], shape
+            )
+        else:
+            codes = np.zeros(len(values), dtype=np.int64)
+
+        counts = np.bincount(codes, minlength=size)
+        sums = np.bincount(codes, weights=values, minlength=size)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            stats = {
+                "sum": sums,
+                "mean": sums / counts,
+                "p50": group_percentiles(codes, values, counts, 0.5),
+                "p95": group_percentiles(codes, values, counts, 0.95),
+                "count": counts,
+            }
+
+        # The group labels, for the groups which have any data.
+        present = np.flatnonzero(counts)
+        labels = np.unravel_index(present, shape) if dimensions else []
+        keys = []
+        for i in range(len(present)):
+            key = {}
+            for d, label in zip(dimensions, labels):
+                value = int(label[i])
+                if d == "month":
+                    value += 1
+                elif d == "daytype":
+                    value = DAYTYPES[value]
+                key[d] = value
+            keys.append(key)
+
+        return {
+            stat: [
+                {**key, "value": round(float(v), 3)}
+                for key, v in zip(keys, array[present])
+            ]
+            for stat, array in stats.items()
+        }
+
+    def lookup(self, dimensions: Tuple[str, ...], stat: str) -> bytes:
+        return self.results[(dimensions, stat)]
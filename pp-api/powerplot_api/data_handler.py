@@ -1,47 +1,163 @@
+import io
 import os
+import time
+import hashlib
 import pathlib
 import threading
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Tuple, Union
 
-from .power_data import PowerData
+from .notifications import PublishListener, read_manifest
 
-DB_FILE_PATH = pathlib.Path("~").expanduser() / pathlib.Path(
-    ".local/share/powerplot/conedison_7fe600bb69a4.csv"
+if TYPE_CHECKING:
+    from .power_data import PowerData
+
+# POWERPLOT_DB_FILE points the API at another db, e.g. a generated one to load test
+# against (see bins/pp-api-loadtest). Everything else lives next to the db.
+DB_FILE_PATH = pathlib.Path(
+    os.environ.get("POWERPLOT_DB_FILE")
+    or pathlib.Path("~").expanduser()
+    / ".local/share/powerplot/conedison_7fe600bb69a4.csv"
 )
 
+# Hourly temperatures for the hours the db spans, kept up to date by the scraper.
+WEATHER_FILE_PATH = DB_FILE_PATH.with_suffix(".weather.csv")
+
 
 class DataHandler:
     """
     Unfortunately, using a threading lock is essential for ensuring thread safety when
     updating shared resources (like data and last_modified) across multiple threads
     which FastAPI inherently employs.
+
+    Extensions are models derived from the data (e.g. the degree-day regression) which
+    are brought up to date whenever a new dataset is loaded, so that serving them is a
+    lookup. Register a factory, it's only called on the first load so that the
+    extensions' imports don't slow down the server start either.
     """
 
     def __init__(self):
-        self.data: PowerData = None
+        self.data: "PowerData" = None
+        self.version: Union[int, float] = None  # manifest version, or mtime without one
         self.last_modified: float = None  # epoch utc timestamp
+        self.weather_version: Optional[float] = None  # mtime of the weather file
+
+        self.extension_factories: Dict[str, Callable] = {}
+        self.extensions: Dict[str, object] = {}
+
+        # Payload sections computed by another process, see shared.py.
+        self.sections: Dict[str, object] = {}
 
         self.data_lock = threading.Lock()
         self.last_modified_lock = threading.Lock()
 
-        self.reload()
+        # Note that nothing is loaded until the first reload(), so that importing the
+        # API (and pandas along with it) doesn't hold up the server start.
+
+    def register(self, name: str, factory: Callable):
+        """
+        `factory()` returns an object with an `update(data: PowerData)` method.
+        """
+
+        self.extension_factories[name] = factory
+
+    def extension(self, name: str):
+        return self.extensions.get(name)
+
+    def update_extensions(self):
+        for name, factory in self.extension_factories.items():
+            if name not in self.extensions:
+                self.extensions[name] = factory()
+
+            try:
+                self.extensions[name].update(self.data)
+            except Exception as e:
+                print(f"Failed to update {name}: {e}")
+
+    def listen(self):
+        """
+        Reload as soon as the scraper publishes a new version, rather than on
+        the first request after it.
+        """
+
+        PublishListener(DB_FILE_PATH, on_publish=lambda manifest: self.reload()).start()
 
     def reload(self):
         """
-        If the file was modified since the last read, reload the db into a DataFrame.
-        Otherwise, return the DataFrame already in the memory.
+        If a new version of the db was published since the last read, reload it into
+        a DataFrame. Otherwise, return the DataFrame already in the memory.
         """
 
-        db_last_modified = os.path.getmtime(DB_FILE_PATH)
+        manifest = read_manifest(DB_FILE_PATH)
+        if manifest is None:
+            # Written by an older scraper, all we have to go by is the mtime.
+            version = os.path.getmtime(DB_FILE_PATH)
+        else:
+            version = manifest["version"]
+
+        try:
+            weather_version = os.path.getmtime(WEATHER_FILE_PATH)
+        except FileNotFoundError:
+            weather_version = None
 
         with self.last_modified_lock:
-            if self.data is None or db_last_modified != self.last_modified:
+            if (
+                self.data is None
+                or version != self.version
+                or weather_version != self.weather_version
+            ):
                 with self.data_lock:
-                    self.data = PowerData(DB_FILE_PATH)
+                    data, manifest = self.load(manifest)
+                    data.load_archive(DB_FILE_PATH)
+                    if data.df.empty:
+                        # Nothing to serve, see reload_data() in __main__.
+                        raise AssertionError(f"{DB_FILE_PATH} has no reads.")
+                    self.data = data
+
+                    if weather_version is not None:
+                        self.data.load_weather(WEATHER_FILE_PATH)
+
+                    self.update_extensions()
 
-                self.last_modified = db_last_modified
+                if manifest is None:
+                    self.version = self.last_modified = version
+                else:
+                    self.version = manifest["version"]
+                    self.last_modified = manifest["published_at"]
+                self.weather_version = weather_version
 
         return self.data
 
+    @staticmethod
+    def load(manifest: Optional[dict]) -> Tuple["PowerData", Optional[dict]]:
+        """
+        Read the db, making sure that what we read is what the manifest describes.
+
+        The scraper renames the new db into place before the new manifest, so a
+        mismatch means we caught it in between: read the manifest again and retry.
+        """
+
+        from .power_data import PowerData
+
+        if manifest is None:
+            return PowerData(DB_FILE_PATH), None
+
+        NUM_ATTEMPTS = 5
+        for attempt in range(NUM_ATTEMPTS):
+            with open(DB_FILE_PATH, "rb") as f:
+                raw = f.read()
+
+            if hashlib.sha256(raw).hexdigest() == manifest["sha256"]:
+                # Older scrapers don't say, PowerData falls back on US/Eastern.
+                return (
+                    PowerData(io.BytesIO(raw), timezone=manifest.get("timezone")),
+                    manifest,
+                )
+
+            time.sleep(0.05 * (attempt + 1))
+            manifest = read_manifest(DB_FILE_PATH) or manifest
+
+        raise AssertionError(f"{DB_FILE_PATH} does not match its manifest.")
+
 
 if __name__ == "__main__":
     handler = DataHandler()
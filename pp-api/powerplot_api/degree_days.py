@@ -0,0 +1,155 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .power_data import PowerData
+
+
+class DegreeDayModel:
+    """
+    Weather-normalized usage: daily kWh regressed on heating and cooling degree days,
+
+        kwh = base + kwh_per_hdd * HDD + kwh_per_cdd * CDD
+
+    The least squares fit is kept as running normal equations (XᵀX, Xᵀy), so a new
+    dataset only costs the days which were added or changed since the previous one;
+    everything served is computed once per dataset in update().
+    """
+
+    BASE_TEMPERATURE = 65.0  # °F, the usual degree-day base
+    MIN_DAYS = 14  # before the fit means anything
+    NUM_TRAILING_DAYS = 31
+    NUM_RECENT_DAYS = 7  # whose weather we expect for the rest of the month
+
+    def __init__(self):
+        self.days = pd.DataFrame(columns=["kwh", "hdd", "cdd"], dtype=np.float64)
+        self.xtx = np.zeros((3, 3))
+        self.xty = np.zeros(3)
+        self.yty = 0.0
+        self.n = 0
+
+        self.coefficients: Optional[np.ndarray] = None
+        self.summary: Optional[dict] = None
+        self.reason: Optional[str] = "No data yet."
+
+    def daily_features(self, data: PowerData) -> pd.DataFrame:
+        """
+        Daily kWh, HDD and CDD (degree-hours / 24) for the complete days with weather,
+        archived days included.
+        """
+
+        temperature = data.weather
+        degrees = (
+            pd.DataFrame(
+                {
+                    "hdd": (self.BASE_TEMPERATURE - temperature).clip(lower=0) / 24,
+                    "cdd": (temperature - self.BASE_TEMPERATURE).clip(lower=0) / 24,
+                    "hours": temperature.notna().astype(np.int64),
+                }
+            )
+            .resample("D")
+            .sum()
+        )
+
+        # Days with (nearly) all their reads, which leaves out the gaps in the data
+        # and the day in progress, and (nearly, think DST) a full day of weather.
+        kwh = data.complete(data.daily())["value"].rename("kwh")
+        daily = degrees.join(kwh, how="inner")
+        daily = daily[daily["hours"] >= 23]
+
+        daily.index = daily.index.date
+        return daily[["kwh", "hdd", "cdd"]]
+
+    def accumulate(self, days: pd.DataFrame, sign: float):
+        if days.empty:
+            return
+
+        X = np.column_stack(
+            [np.ones(len(days)), days["hdd"].to_numpy(), days["cdd"].to_numpy()]
+        )
+        y = days["kwh"].to_numpy()
+
+        self.xtx += sign * X.T @ X
+        self.xty += sign * X.T @ y
+        self.yty += sign * float(y @ y)
+        self.n += int(sign) * len(days)
+
+    def update(self, data: PowerData):
+        if data.weather is None:
+            self.summary, self.reason = None, "No weather data."
+            return
+
+        days = self.daily_features(data)
+
+        # Days which are gone or changed come out of the sums, new or changed ones go in.
+        old, new = self.days.align(days, join="outer")
+        changed = ~np.isclose(old.to_numpy(), new.to_numpy()).all(axis=1)
+        self.accumulate(old[changed].dropna(), -1)
+        self.accumulate(new[changed].dropna(), +1)
+        self.days = days
+
+        if self.n < self.MIN_DAYS:
+            self.coefficients = None
+            self.summary, self.reason = None, f"Fewer than {self.MIN_DAYS} days."
+            return
+
+        self.coefficients = np.linalg.lstsq(self.xtx, self.xty, rcond=None)[0]
+        self.summary, self.reason = self.summarize(data), None
+
+    def r_squared(self) -> float:
+        beta = self.coefficients
+        sse = self.yty - 2 * beta @ self.xty + beta @ self.xtx @ beta
+        sst = self.yty - self.xty[0] ** 2 / self.n
+        return float(1 - sse / sst) if sst > 0 else 0.0
+
+    def expected(self, hdd, cdd):
+        base, kwh_per_hdd, kwh_per_cdd = self.coefficients
+        return base + kwh_per_hdd * hdd + kwh_per_cdd * cdd
+
+    def projected_bill(self, data: PowerData) -> dict:
+        """
+        The month so far plus the rest of it at the usage the model expects for
+        the weather of the past week.
+        """
+
+        last = data.df.index[-1]
+        month_start = last.normalize().replace(day=1)
+        month_end = month_start + pd.offsets.MonthBegin(1)
+
+        month_to_date_kwh = data.df.loc[data.df.index >= month_start, "value"].sum()
+        remaining_days = (month_end - last) / pd.Timedelta(days=1)
+
+        recent = self.days.tail(self.NUM_RECENT_DAYS)
+        expected_daily_kwh = self.expected(recent["hdd"].mean(), recent["cdd"].mean())
+
+        return PowerData.bill(
+            month_to_date_kwh + remaining_days * max(expected_daily_kwh, 0)
+        )
+
+    def summarize(self, data: PowerData) -> dict:
+        base, kwh_per_hdd, kwh_per_cdd = self.coefficients
+
+        recent = self.days.tail(self.NUM_TRAILING_DAYS)
+        expected = self.expected(recent["hdd"], recent["cdd"])
+
+        return {
+            "base_temperature_f": self.BASE_TEMPERATURE,
+            "days": self.n,
+            "r2": round(self.r_squared(), 3),
+            "coefficients": {
+                "base_kwh_per_day": round(base, 3),
+                "kwh_per_hdd": round(kwh_per_hdd, 3),
+                "kwh_per_cdd": round(kwh_per_cdd, 3),
+            },
+            "expected_vs_actual": {
+                str(day): {
+                    "actual_kwh": round(row.kwh, 2),
+                    "expected_kwh": round(expected[day], 2),
+                    "hdd": round(row.hdd, 1),
+                    "cdd": round(row.cdd, 1),
+                }
+                for day, row in zip(recent.index, recent.itertuples())
+            },
+            "projected_bill": self.projected_bill(data),
+        }
@@ -0,0 +1,298 @@
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from .power_data import DAY_NS, HOUR_NS, PowerData
+
+
+class Edge(NamedTuple):
+    time: int  # UTC ns, of the read in which the step started
+    kw: float  # positive switching on, negative switching off
+    segment: int  # stretch of the data without gaps it's in
+
+
+class ApplianceEvents:
+    """
+    When large loads (AC, a dryer, an EV charger...) switch on and off, what each
+    of them used and cost, and the events grouped into clusters of similar loads.
+
+    The raw reads are turned into average power. Steps are found vectorized: the
+    read-to-read changes of at least MIN_RAMP_KW, with consecutive ones in the same
+    direction merged (a load switching on mid-read shows up over two reads), which
+    amount to at least MIN_STEP_KW. An event is a step up paired with the nearest
+    sized step down (within MATCH_TOLERANCE) in the next MAX_EVENT_HOURS, without a
+    gap in the data in between. Its energy is the step times how long it lasted.
+
+    Like AnomalyDetector, events are detected once: a new dataset is only scanned
+    from where the previous one was settled (SETTLE_HOURS before its end) on, with
+    the steps up still waiting for their step down carried over. The reads since
+    are scanned every time, but their events aren't kept. Hourly rollups (see
+    PowerData.load_archive()) are too coarse for this, so are left out, and a change
+    to the settled raw reads, rather than them being rolled up, rebuilds the index.
+    """
+
+    MIN_RAMP_KW = 0.25
+    MIN_STEP_KW = 1.0
+    MATCH_TOLERANCE = 0.35  # of the step up
+    MAX_EVENT_HOURS = 12
+    SETTLE_HOURS = 48
+    CLUSTER_GAP = 0.2  # relative difference in step size that splits clusters
+    MAX_EVENTS = 200  # listed, the most recent ones
+
+    def __init__(self):
+        self.reset()
+
+        self.summary: Optional[dict] = None
+        self.reason: Optional[str] = "No data yet."
+
+    def reset(self):
+        # The index: start, end (UTC ns) and step (kW) of every settled event.
+        self.starts = np.empty(0, dtype=np.int64)
+        self.ends = np.empty(0, dtype=np.int64)
+        self.kws = np.empty(0, dtype=np.float64)
+
+        self.resume: Optional[int] = None  # time of the read to scan from next
+        self.segment = 0  # of the read to scan from next
+        self.open: List[Edge] = []  # steps up before `resume` still unpaired
+        self.boundary: Optional[int] = None  # time of the last settled read
+        self.fingerprint: Optional[pd.DataFrame] = None  # count and sum per day
+
+    @classmethod
+    def edges(cls, times: np.ndarray, power: np.ndarray, interval: int, segment: int):
+        """
+        The steps between the reads (`times` in UTC ns, `power` in kW), numbering
+        the stretches between gaps on from `segment`. Also returns the index of the
+        read to resume from, where the last step might still go on, and the segment
+        there.
+        """
+
+        steps = np.diff(power)
+        gaps = np.diff(times) != interval
+        steps[gaps] = 0.0
+
+        direction = np.sign(steps) * (np.abs(steps) >= cls.MIN_RAMP_KW)
+        change = np.flatnonzero(np.diff(np.r_[0, direction, 0]))
+        starts, ends = change[:-1], change[1:]
+        runs = direction[starts] != 0
+        starts, ends = starts[runs], ends[runs]
+
+        cumulative = np.r_[0.0, np.cumsum(steps)]
+        kw = cumulative[ends] - cumulative[starts]
+        segments = segment + np.cumsum(gaps)[starts]
+
+        # A step running up to the last read may not be over yet.
+        resume = len(times) - 1
+        if len(ends) and ends[-1] == len(steps):
+            resume = int(starts[-1])
+            starts, kw, segments = starts[:-1], kw[:-1], segments[:-1]
+
+        big = np.abs(kw) >= cls.MIN_STEP_KW
+        edges = [
+            Edge(int(t), float(k), int(s))
+            for t, k, s in zip(times[starts[big] + 1], kw[big], segments[big])
+        ]
+        return edges, resume, segment + int(gaps[:resume].sum())
+
+    @classmethod
+    def pair(cls, edges: List[Edge], open: List[Edge]):
+        """
+        Pair the steps down with the steps up before them. Returns the events as
+        (start, end, kW) and the steps up left open.
+        """
+
+        open = list(open)
+        events = []
+        for edge in edges:
+            open = [
+                e
+                for e in open
+                if e.segment == edge.segment
+                and edge.time - e.time <= cls.MAX_EVENT_HOURS * HOUR_NS
+            ]
+
+            if edge.kw > 0:
+                open.append(edge)
+                continue
+
+            matches = [
+                e for e in open if abs(e.kw + edge.kw) <= cls.MATCH_TOLERANCE * e.kw
+            ]
+            if matches:
+                on = min(matches, key=lambda e: (abs(e.kw + edge.kw), -e.time))
+                open.remove(on)
+                events.append((on.time, edge.time, (on.kw - edge.kw) / 2))
+
+        return events, open
+
+    @staticmethod
+    def fingerprints(data: PowerData, first: int, last: int) -> pd.DataFrame:
+        """
+        The number and the sum of the reads per (UTC) day, from the one at `first` to
+        the one at `last` (UTC ns). Off PowerData.totals(), so without going over them.
+        """
+
+        days = np.arange(first // DAY_NS, last // DAY_NS + 1)
+        edges = np.r_[np.maximum(days * DAY_NS, first), last + 1]
+        counts, sums = (np.diff(totals) for totals in data.totals(edges))
+
+        present = counts > 0
+        return pd.DataFrame(
+            {"count": counts[present], "sum": sums[present]}, index=days[present]
+        )
+
+    def settled_unchanged(self, data: PowerData, times: np.ndarray) -> bool:
+        """
+        Whether the raw reads up to the boundary are what they were. Reads get
+        rolled up into the hourly archive though, so only the days after the first
+        one still raw are compared.
+        """
+
+        if self.boundary is None or times[0] > self.boundary:
+            return False
+
+        new = self.fingerprints(data, times[0], self.boundary)
+        old = self.fingerprint
+        if new.index[0] < old.index[0]:
+            # Reads were added before the ones we've seen, e.g. an import.
+            return False
+
+        new, old = new.iloc[1:], old[old.index > new.index[0]]
+        return (
+            new.index.equals(old.index)
+            and np.array_equal(new["count"].to_numpy(), old["count"].to_numpy())
+            and np.allclose(new["sum"].to_numpy(), old["sum"].to_numpy())
+        )
+
+    def update(self, data: PowerData):
+        raw = data.df["value"]
+        if data.archive_end is not None:
+            raw = raw.iloc[raw.index.searchsorted(data.archive_end) :]
+        if len(raw) < 2:
+            self.summary, self.reason = None, "Not enough 15-minute reads."
+            return
+
+        # Only ever sliced: the reads before where the scan resumes aren't looked at.
+        reads_per_hour = data.reads_per_hour()
+        interval = HOUR_NS // reads_per_hour
+        times = raw.index.asi8
+        values = raw.to_numpy(dtype=np.float64)
+
+        boundary = times[-1] - self.SETTLE_HOURS * HOUR_NS
+        if not self.settled_unchanged(data, times) or self.boundary > boundary:
+            self.reset()
+            self.resume = int(times[0])
+
+        # Scan what settled since the last time, from where that left off.
+        first = np.searchsorted(times, self.resume)
+        last = np.searchsorted(times, boundary, side="right")
+        if last - first >= 2:
+            edges, resume, segment = self.edges(
+                times[first:last],
+                values[first:last] * reads_per_hour,
+                interval,
+                self.segment,
+            )
+            events, self.open = self.pair(edges, self.open)
+            self.add(events)
+
+            self.resume, self.segment = int(times[first + resume]), segment
+            self.boundary = int(times[last - 1])
+            self.fingerprint = self.fingerprints(data, times[0], self.boundary)
+
+        # The rest, every time, without keeping anything.
+        first = np.searchsorted(times, self.resume)
+        edges, _, _ = self.edges(
+            times[first:], values[first:] * reads_per_hour, interval, self.segment
+        )
+        provisional, _ = self.pair(edges, self.open)
+
+        self.summary = self.summarize(data, provisional)
+        self.reason = None
+
+    def add(self, events: list):
+        if not events:
+            return
+
+        starts, ends, kws = zip(*events)
+        self.starts = np.r_[self.starts, starts]
+        self.ends = np.r_[self.ends, ends]
+        self.kws = np.r_[self.kws, kws]
+
+    @classmethod
+    def clusters(cls, kws: np.ndarray) -> np.ndarray:
+        """
+        Group the events by the size of their step: sorted, a cluster ends where the
+        next step is more than CLUSTER_GAP bigger. Numbered from the smallest load.
+        """
+
+        if not len(kws):
+            return np.empty(0, dtype=np.int64)
+
+        order = np.argsort(kws)
+        splits = np.diff(np.log(kws[order])) > np.log1p(cls.CLUSTER_GAP)
+        labels = np.empty(len(kws), dtype=np.int64)
+        labels[order] = np.r_[0, np.cumsum(splits)]
+        return labels
+
+    def summarize(self, data: PowerData, provisional: list) -> dict:
+        starts, ends, kws = self.starts, self.ends, self.kws
+        if provisional:
+            new_starts, new_ends, new_kws = map(np.asarray, zip(*provisional))
+            starts = np.r_[starts, new_starts]
+            ends = np.r_[ends, new_ends]
+            kws = np.r_[kws, new_kws]
+
+        tz = data.df.index.tz
+        hours = (ends - starts) / HOUR_NS
+        kwh = kws * hours
+        labels = self.clusters(kws)
+
+        events = pd.DataFrame(
+            {
+                "start": pd.to_datetime(starts, utc=True).tz_convert(tz),
+                "end": pd.to_datetime(ends, utc=True).tz_convert(tz),
+                "kw": kws,
+                "hours": hours,
+                "kwh": kwh,
+                "cluster": labels,
+            }
+        ).sort_values("start")
+
+        clusters = [
+            {
+                "cluster": int(label),
+                "kw": round(float(group["kw"].median()), 2),
+                "events": len(group),
+                "median_hours": round(float(group["hours"].median()), 2),
+                "kwh": round(float(group["kwh"].sum()), 1),
+                "dollars": round(float(group["kwh"].sum()) * data.KWH_PRICE, 2),
+                "usual_start_hour": int(group["start"].dt.hour.mode().iloc[0]),
+                "last_seen": str(group["start"].iloc[-1]),
+            }
+            for label, group in events.groupby("cluster")
+        ]
+
+        listed = events.tail(self.MAX_EVENTS)[::-1]
+        boundary = self.boundary
+        return {
+            # The most recent first; the ones past settled_until may still change.
+            "events": [
+                {
+                    "start": str(event.start),
+                    "end": str(event.end),
+                    "kw": round(event.kw, 2),
+                    "hours": round(event.hours, 2),
+                    "kwh": round(event.kwh, 2),
+                    "dollars": round(event.kwh * data.KWH_PRICE, 2),
+                    "cluster": int(event.cluster),
+                }
+                for event in listed.itertuples()
+            ],
+            "clusters": clusters,
+            "settled_until": (
+                str(pd.Timestamp(boundary, tz="UTC").tz_convert(tz)) if boundary else ""
+            ),
+            "min_step_kw": self.MIN_STEP_KW,
+            "price_per_kwh": data.KWH_PRICE,
+        }
@@ -0,0 +1,223 @@
+import io
+import os
+import re
+import hashlib
+import pathlib
+import tempfile
+from typing import Iterator, Optional, Tuple
+
+import pandas as pd
+
+from .power_data import PowerData
+
+RESOLUTIONS = ("raw", "hourly", "daily", "monthly")
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+CHUNK_ROWS = 10_000
+CHUNK_BYTES = 64 * 1024
+
+
+class Export:
+    """
+    A range of the data at some resolution, serialized chunk by chunk.
+
+    The rows to export are a slice of what's already in memory; only CHUNK_ROWS of
+    them are ever serialized at a time, so the export never exists in memory as a
+    whole, whatever its size. The output is deterministic for a given dataset and
+    parameters, which is what lets downloads be resumed with a Range request (see
+    spool()).
+
+    The range is half-open, `start` <= datetime < `end`, except that an `end` which
+    is only a date includes that whole day: end=2023-12-31 exports through the last
+    read of December 31st, not its first one.
+    """
+
+    def __init__(
+        self,
+        data: PowerData,
+        version,
+        fmt: str = "csv",
+        resolution: str = "raw",
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format: {fmt}")
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution: {resolution}")
+
+        self.data = data
+        self.version = version
+        self.fmt = fmt
+        self.resolution = resolution
+
+        tz = data.df.index.tz
+        try:
+            self.start = pd.Timestamp(start, tz=tz) if start else None
+            self.end = pd.Timestamp(end, tz=tz) if end else None
+        except ValueError as e:
+            raise ValueError(f"Invalid date: {e}") from e
+
+        if end and re.fullmatch(r"\d{4}-\d{2}-\d{2}", end.strip()):
+            # The next local midnight, whatever the DST change in between.
+            self.end = pd.Timestamp(self.end.date() + pd.Timedelta(days=1), tz=tz)
+
+        key = f"{version}|{fmt}|{resolution}|{start}|{end}"
+        self.etag = hashlib.sha256(key.encode()).hexdigest()[:16]
+
+    @property
+    def media_type(self) -> str:
+        return FORMATS[self.fmt]
+
+    @property
+    def filename(self) -> str:
+        # The last day in the export, rather than the (exclusive) end.
+        last = self.end - pd.Timedelta(1) if self.end is not None else None
+        span = "_".join(
+            t.strftime("%Y%m%d") for t in (self.start, last) if t is not None
+        )
+        return f"powerplot_{self.resolution}{'_' + span if span else ''}.{self.fmt}"
+
+    def frame(self) -> pd.DataFrame:
+        if self.resolution == "raw":
+            df = self.data.df[["value"]]
+        else:
+            df = getattr(self.data, self.resolution)()[["value"]]
+
+        # Sorted, so the range is two binary searches; see the class for the ends.
+        first = df.index.searchsorted(self.start) if self.start is not None else 0
+        last = df.index.searchsorted(self.end) if self.end is not None else len(df)
+        return df.iloc[first:last]
+
+    def __iter__(self) -> Iterator[bytes]:
+        df = self.frame()
+        chunks = (df.iloc[i : i + CHUNK_ROWS] for i in range(0, len(df), CHUNK_ROWS))
+
+        if self.fmt == "csv":
+            yield b"datetime,value\n"
+            for chunk in chunks:
+                yield self.csv_lines(chunk)
+        elif self.fmt == "ndjson":
+            for chunk in chunks:
+                yield self.ndjson_lines(chunk)
+        else:
+            yield from self.parquet(chunks)
+
+    @staticmethod
+    def csv_lines(chunk: pd.DataFrame) -> bytes:
+        return chunk.to_csv(header=False).encode()
+
+    @staticmethod
+    def ndjson_lines(chunk: pd.DataFrame) -> bytes:
+        # Timestamps formatted the way the db and the CSV export have them.
+        timestamps = chunk.index.map(str)
+        values = chunk["value"].to_numpy().tolist()
+        return "".join(
+            f'{{"datetime": "{t}", "value": {v}}}\n' for t, v in zip(timestamps, values)
+        ).encode()
+
+    @staticmethod
+    def parquet(chunks) -> Iterator[bytes]:
+        """
+        One row group per chunk, handed over as soon as it's written.
+        """
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        sink = io.BytesIO()
+        schema = pa.schema(
+            [("datetime", pa.timestamp("ns", tz="UTC")), ("value", pa.float64())]
+        )
+
+        with pq.ParquetWriter(sink, schema) as writer:
+            for chunk in chunks:
+                writer.write_table(
+                    pa.table(
+                        {
+                            "datetime": chunk.index.tz_convert("UTC"),
+                            "value": chunk["value"].to_numpy(),
+                        },
+                        schema=schema,
+                    )
+                )
+                yield drain(sink)
+
+        # The footer.
+        yield drain(sink)
+
+
+def drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+def spool(export: Export, directory: pathlib.Path) -> pathlib.Path:
+    """
+    Write the export to `directory` once, so that byte ranges of it can be served.
+    Exports of other versions of the data are removed on the way; the ones of this
+    version stay, others may still be resuming them.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    prefix = f"{export.version}-"
+    path = directory / f"{prefix}{export.etag}.{export.fmt}"
+    if path.exists():
+        return path
+
+    # Concurrent requests for the same export each write their own copy.
+    with tempfile.NamedTemporaryFile(
+        dir=directory, prefix=f".{path.name}.", suffix=".tmp", delete=False
+    ) as f:
+        for chunk in export:
+            f.write(chunk)
+    os.replace(f.name, path)
+
+    for other in directory.iterdir():
+        if not other.name.startswith((prefix, ".")):
+            other.unlink(missing_ok=True)
+
+    return path
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    `bytes=start-end` -> (start, end), inclusive. None if it isn't a single range
+    we can serve. Raises ValueError if it's unsatisfiable.
+    """
+
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if match is None or match.groups() == ("", ""):
+        return None
+
+    first, last = match.groups()
+    if first == "":
+        # The last N bytes.
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+
+    if start >= size or start > end:
+        raise ValueError(f"Range not satisfiable: {header}")
+
+    return start, end
+
+
+def read_range(path: pathlib.Path, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
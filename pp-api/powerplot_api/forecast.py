@@ -0,0 +1,227 @@
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .power_data import LocalCalendar, PowerData
+
+HOURS_PER_WEEK = 7 * 24
+
+# z-score of the two-sided 90% interval
+Z_90 = 1.645
+
+
+class UsageForecast:
+    """
+    Short-horizon usage forecast: an hour-of-week profile plus a damped daily trend.
+
+    The profile is an exponentially weighted (DECAY per week) mean and variance of
+    the usage in each of the 168 hours of the week, kept as running sums. On a new
+    dataset only the hours since the previous one are folded in, unless something
+    older changed (a backfill, say, which PowerData.hourly_totals() gives away),
+    then it's rebuilt; the last SETTLE_HOURS are never folded in for good since the
+    scraper may still correct them.
+
+    The trend is a line through the last TREND_DAYS of daily residuals (actual minus
+    profile), damped by TREND_DAMPING per day ahead so that it doesn't run away
+    over the rest of the month.
+
+    Only hours with (nearly) all their reads count, see PowerData.complete(): the
+    one in progress would pass for low usage. The forecast starts from the first
+    hour after the last complete one, so that hour is forecast in full, while
+    month_to_date_kwh stops before it.
+    """
+
+    DECAY = 0.9
+    SETTLE_HOURS = 48
+    TREND_DAYS = 28
+    TREND_DAMPING = 0.9
+    MIN_WEEKS = 2  # of data before forecasting anything
+
+    def __init__(self):
+        self.boundary: Optional[pd.Timestamp] = None  # last hour folded in for good
+        self.fingerprint = (0, 0.0)  # count and sum of the hours up to the boundary
+        self.sums = np.zeros((3, HOURS_PER_WEEK))  # Σw, Σwy, Σwy² per hour of week
+
+        self.summary: Optional[dict] = None
+        self.reason: Optional[str] = "No data yet."
+
+    @classmethod
+    def fold(
+        cls, sums: np.ndarray, data: PowerData, hourly: pd.Series, reference
+    ) -> np.ndarray:
+        """
+        Add `hourly` to the running sums, weighted by how many weeks before
+        `reference` each hour is.
+        """
+
+        age_weeks = (reference - hourly.index) / pd.Timedelta(weeks=1)
+        weights = cls.DECAY ** np.asarray(age_weeks, dtype=np.float64)
+        y = hourly.to_numpy(dtype=np.float64)
+        how = data.hour_of_week(hourly.index)
+
+        return sums + np.stack(
+            [
+                np.bincount(how, weights=weights, minlength=HOURS_PER_WEEK),
+                np.bincount(how, weights=weights * y, minlength=HOURS_PER_WEEK),
+                np.bincount(how, weights=weights * y * y, minlength=HOURS_PER_WEEK),
+            ]
+        )
+
+    @classmethod
+    def decay(cls, sums: np.ndarray, since: pd.Timestamp, until: pd.Timestamp):
+        return sums * cls.DECAY ** ((until - since) / pd.Timedelta(weeks=1))
+
+    def update(self, data: PowerData):
+        hourly = data.hourly_usage(complete=True)
+
+        if hourly.empty or hourly.index[-1] - hourly.index[0] < pd.Timedelta(
+            weeks=self.MIN_WEEKS
+        ):
+            self.summary, self.reason = (
+                None,
+                f"Less than {self.MIN_WEEKS} weeks of data.",
+            )
+            return
+
+        last = hourly.index[-1]
+        boundary = last - pd.Timedelta(hours=self.SETTLE_HOURS)
+        settled = hourly.index.searchsorted(boundary, side="right")
+
+        unchanged = self.boundary is not None and self.boundary <= boundary
+        if unchanged:
+            count, total = data.hourly_totals(self.boundary)
+            unchanged = count == self.fingerprint[0] and np.isclose(
+                total, self.fingerprint[1]
+            )
+
+        if unchanged:
+            new = hourly.iloc[self.fingerprint[0] : settled]
+            self.sums = self.fold(
+                self.decay(self.sums, self.boundary, boundary), data, new, boundary
+            )
+        else:
+            self.sums = self.fold(
+                np.zeros_like(self.sums), data, hourly.iloc[:settled], boundary
+            )
+
+        self.boundary = boundary
+        self.fingerprint = data.hourly_totals(boundary)
+
+        # The unsettled hours count, just not for good.
+        sums = self.fold(
+            self.decay(self.sums, boundary, last), data, hourly.iloc[settled:], last
+        )
+
+        self.summary, self.reason = self.forecast(data, hourly, sums), None
+
+    @classmethod
+    def recent_days(cls, hourly: pd.Series) -> Tuple[pd.Series, pd.Series]:
+        """
+        The usage of the last TREND_DAYS complete days (23 hours or more) but the
+        latest one, and the hours since the first of them at least. Looks back only
+        as far as it takes to find them, doubling the span at a time.
+        """
+
+        days = cls.TREND_DAYS + 1
+        while True:
+            since = (hourly.index[-1] - pd.Timedelta(days=days)).normalize()
+            first = hourly.index.searchsorted(since)
+            recent = hourly.iloc[first:]
+            daily = recent.resample("D")
+            complete = daily.sum()[daily.count() >= 23]
+            if len(complete) > cls.TREND_DAYS or first == 0:
+                return recent, complete.iloc[:-1].tail(cls.TREND_DAYS)
+            days *= 2
+
+    @staticmethod
+    def by_hour(hours: pd.DatetimeIndex, values: np.ndarray) -> dict:
+        return PowerData.to_json(pd.DataFrame({"value": values.round(3)}, index=hours))
+
+    def forecast(self, data: PowerData, hourly: pd.Series, sums: np.ndarray) -> dict:
+        weights, weighted, weighted_squares = sums
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = weighted / weights
+            variance = np.maximum(weighted_squares / weights - mean**2, 0)
+
+        # Hours of the week we've never seen fall back on the overall mean.
+        overall = weighted.sum() / weights.sum()
+        mean = np.where(weights > 0, mean, overall)
+        variance = np.where(weights > 0, variance, np.nanmean(variance))
+
+        # The damped trend, from the daily residuals of the recent complete days.
+        recent, actual = self.recent_days(hourly)
+        profile = pd.Series(mean[data.hour_of_week(recent.index)], index=recent.index)
+        expected = profile.resample("D").sum().reindex(actual.index)
+        residuals = (actual - expected).to_numpy()
+
+        if len(residuals) >= 7:
+            x = np.arange(len(residuals)) - (len(residuals) - 1)
+            slope, intercept = np.polyfit(x, residuals, 1)
+            daily_sd = np.std(residuals - (intercept + slope * x), ddof=2)
+        else:
+            slope, intercept = 0.0, float(np.mean(residuals)) if len(residuals) else 0.0
+            daily_sd = float(np.sqrt(variance.sum() / 7))
+
+        last = hourly.index[-1]
+        first = last + pd.Timedelta(hours=1)  # the first incomplete hour
+        month_start = first.normalize().replace(day=1)
+        month_end = month_start + pd.offsets.MonthBegin(1)
+        horizon = pd.date_range(
+            first,
+            max(month_end, first + pd.Timedelta(hours=24)),
+            freq="h",
+            inclusive="left",
+        )
+
+        # The trend for the k-th day ahead: intercept + slope * (φ + φ² + ... + φᵏ).
+        days_ahead = np.asarray(
+            (horizon - last) / pd.Timedelta(days=1), dtype=np.float64
+        )
+        phi = self.TREND_DAMPING
+        damped = phi * (1 - phi**days_ahead) / (1 - phi)
+        trend = (intercept + slope * damped) / 24
+
+        how = LocalCalendar(horizon).hour_of_week()
+        predicted = np.maximum(mean[how] + trend, 0)
+        sd = np.sqrt(variance[how])
+        low, high = predicted - Z_90 * sd, predicted + Z_90 * sd
+
+        next_24h = slice(0, 24)
+        rest_of_month = horizon < month_end
+        total_24h = predicted[next_24h].sum()
+
+        # Up to where the forecast starts: the reads of the hour in progress are in it.
+        index = data.df.index
+        month_to_date = (
+            data.df["value"]
+            .iloc[index.searchsorted(month_start) : index.searchsorted(first)]
+            .sum()
+        )
+        remaining_days = rest_of_month.sum() / 24
+        remaining_kwh = predicted[rest_of_month].sum()
+        remaining_sd = daily_sd * np.sqrt(remaining_days)
+
+        return {
+            "generated_for": str(last),
+            "next_24h": {
+                "total_kwh": round(total_24h, 2),
+                "low_kwh": round(max(total_24h - Z_90 * daily_sd, 0), 2),
+                "high_kwh": round(total_24h + Z_90 * daily_sd, 2),
+                # All three keyed by the start of the hour.
+                "hourly": self.by_hour(horizon[next_24h], predicted[next_24h]),
+                "hourly_low": self.by_hour(
+                    horizon[next_24h], np.maximum(low[next_24h], 0)
+                ),
+                "hourly_high": self.by_hour(horizon[next_24h], high[next_24h]),
+            },
+            "rest_of_month": {
+                "days": round(remaining_days, 1),
+                "kwh": round(remaining_kwh, 1),
+                "low_kwh": round(max(remaining_kwh - Z_90 * remaining_sd, 0), 1),
+                "high_kwh": round(remaining_kwh + Z_90 * remaining_sd, 1),
+                "month_to_date_kwh": round(month_to_date, 1),
+                "projected_bill": PowerData.bill(month_to_date + remaining_kwh),
+            },
+            "trend_kwh_per_day": round(slope, 3),
+        }
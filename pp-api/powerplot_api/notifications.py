@@ -0,0 +1,78 @@
+import os
+import json
+import socket
+import pathlib
+import threading
+from typing import Callable, Optional
+
+# The scraper notifies us of new versions of the database on this socket,
+# see powerplot_scraper.publish.
+NOTIFY_SOCKET_NAME = "pp-api.sock"
+
+
+def manifest_path(db_path: pathlib.Path) -> pathlib.Path:
+    return db_path.with_suffix(".manifest.json")
+
+
+def read_manifest(db_path: pathlib.Path) -> Optional[dict]:
+    """
+    The manifest the scraper publishes alongside the database:
+
+    {
+        "version": 42,
+        "rows": 6257,
+        "last_timestamp": "2023-12-17T04:45:00+00:00",
+        "sha256": "...",
+        "published_at": 1702790000.0,
+        "timezone": "America/New_York"
+    }
+
+    None if the database was written by a scraper that predates the manifest.
+    """
+
+    try:
+        with open(manifest_path(db_path), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+class PublishListener(threading.Thread):
+    """
+    Listen for the scraper's notifications about new versions of `db_path` and
+    call `on_publish(manifest)` for each of them.
+    """
+
+    def __init__(self, db_path: pathlib.Path, on_publish: Callable[[dict], None]):
+        super().__init__(daemon=True)
+        self.db_path = db_path
+        self.on_publish = on_publish
+        self.socket_path = db_path.parent / NOTIFY_SOCKET_NAME
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+
+        # A socket left behind by a previous run would make bind() fail.
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(self.socket_path.parent, exist_ok=True)
+        self.sock.bind(str(self.socket_path))
+
+    def run(self):
+        while True:
+            message, _ = self.sock.recvfrom(4096)
+
+            try:
+                manifest = json.loads(message)
+            except json.JSONDecodeError:
+                continue
+
+            if manifest.get("db") != self.db_path.name:
+                continue
+
+            try:
+                self.on_publish(manifest)
+            except Exception as e:
+                print(f"Failed to reload on version {manifest.get('version')}: {e}")
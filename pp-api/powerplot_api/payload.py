@@ -0,0 +1,225 @@
+import time
+import hashlib
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Optional
+
+from .utils import systemd_service_is_active
+
+if TYPE_CHECKING:
+    from .power_data import PowerData
+
+
+class Section:
+    """
+    A single, lazily computed part of the payload served at `/`.
+
+    `needs_data` sections require the power data to be (re)loaded first,
+    `cached` sections are computed once per loaded dataset.
+    """
+
+    def __init__(self, name: str, fn: Callable, needs_data: bool, cached: bool):
+        self.name = name
+        self.fn = fn
+        self.needs_data = needs_data
+        self.cached = cached
+
+
+SECTIONS: Dict[str, Section] = {}  # name -> Section, in payload order
+
+
+def section(name: str, needs_data: bool = True, cached: bool = True):
+    """
+    Register a payload section under a dotted name, e.g. "data.daily".
+    The decorated function is given the DataHandler.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        SECTIONS[name] = Section(name, fn, needs_data=needs_data, cached=cached)
+        return fn
+
+    return decorator
+
+
+@section("last_updated", cached=False)
+def last_updated(data_handler) -> str:
+    # We want to inform user on how current the data is -
+    return time.strftime(
+        "%B %d, %Y %I:%M:%S %p", time.localtime(data_handler.last_modified)
+    )
+
+
+@section("last_updated_seconds_ago", cached=False)
+def last_updated_seconds_ago(data_handler) -> int:
+    return int(time.time() - data_handler.last_modified)
+
+
+@section("systemd", needs_data=False, cached=False)
+def systemd(data_handler) -> dict:
+    # Some health indicators @ systemd services -
+    services = ("pp-api", "pp-webapp", "pp-scraper")
+    return {service: systemd_service_is_active(service) for service in services}
+
+
+@section("projected_bill")
+def projected_bill(data_handler) -> dict:
+    return data_handler.data.bill_breakdown()
+
+
+@section("base_usage")
+def base_usage(data_handler) -> dict:
+    return data_handler.data.base_usage()
+
+
+@section("data.hourly")
+def data_hourly(data_handler) -> dict:
+    return data_handler.data.to_json(data_handler.data.hourly())
+
+
+@section("data.monthly")
+def data_monthly(data_handler) -> dict:
+    return data_handler.data.to_json(data_handler.data.monthly())
+
+
+@section("data.daily")
+def data_daily(data_handler) -> dict:
+    return data_handler.data.to_json(data_handler.data.daily())
+
+
+@section("statistics_and_trends.day_breakdown.past_24h")
+def day_breakdown_past_24h(data_handler) -> dict:
+    return data_handler.data.day_breakdown(last_num_hours=24)
+
+
+@section("statistics_and_trends.day_breakdown.past_48h")
+def day_breakdown_past_48h(data_handler) -> dict:
+    return data_handler.data.day_breakdown(last_num_hours=48)
+
+
+@section("statistics_and_trends.day_breakdown.past_7d")
+def day_breakdown_past_7d(data_handler) -> dict:
+    return data_handler.data.day_breakdown(last_num_hours=(24 * 7))
+
+
+@section("statistics_and_trends.hourly_mean_trend")
+def hourly_mean_trend(data_handler) -> dict:
+    return data_handler.data.hourly_mean()
+
+
+@section("weather_normalized")
+def weather_normalized(data_handler) -> Optional[dict]:
+    # Computed when the data was loaded, see degree_days.py.
+    model = data_handler.extension("degree_days")
+    return model.summary if model is not None else None
+
+
+@section("forecast")
+def forecast(data_handler) -> Optional[dict]:
+    # Computed when the data was loaded, see forecast.py.
+    model = data_handler.extension("forecast")
+    return model.summary if model is not None else None
+
+
+@section("anomalies")
+def anomalies(data_handler) -> Optional[dict]:
+    # Detected when the data was loaded, see anomalies.py.
+    detector = data_handler.extension("anomalies")
+    return detector.summary if detector is not None else None
+
+
+@section("data_quality")
+def data_quality(data_handler) -> Optional[dict]:
+    # Summarized when the data was loaded, see quality.py.
+    report = data_handler.extension("quality")
+    return report.summary if report is not None else None
+
+
+@section("appliance_events")
+def appliance_events(data_handler) -> Optional[dict]:
+    # Detected when the data was loaded, see events.py.
+    detector = data_handler.extension("events")
+    return detector.summary if detector is not None else None
+
+
+def resolve_fields(fields: Optional[str]) -> list:
+    """
+    Turn a `?fields=projected_bill,data.daily` query parameter into a list of
+    section names. A prefix selects every section below it, i.e. "data" selects
+    "data.hourly", "data.monthly" and "data.daily". No fields select everything.
+    """
+
+    if not fields:
+        return list(SECTIONS)
+
+    selected = set()
+    for field in (f.strip() for f in fields.split(",")):
+        if not field:
+            continue
+
+        matches = [
+            name for name in SECTIONS if name == field or name.startswith(field + ".")
+        ]
+        if not matches:
+            raise KeyError(field)
+
+        selected.update(matches)
+
+    # Keep the order in which the sections were registered.
+    return [name for name in SECTIONS if name in selected]
+
+
+class Payload:
+    """
+    Builds the payload from the requested sections only, caching the results of
+    the expensive ones until the DataHandler loads a new dataset.
+    """
+
+    def __init__(self, data_handler):
+        self.data_handler = data_handler
+        self.cache: dict = {}
+        self.cached_data: "PowerData" = None
+
+    def etag(self, names: Iterable[str]) -> Optional[str]:
+        """
+        An ETag for the payload of `names` as of the loaded dataset. None if any of
+        them changes without the data changing (e.g. last_updated_seconds_ago), the
+        payload can't be validated then.
+        """
+
+        names = list(names)
+        if not all(SECTIONS[name].cached for name in names):
+            return None
+
+        data_handler = self.data_handler
+        with data_handler.last_modified_lock:
+            key = f"{data_handler.version}|{data_handler.weather_version}|{names}"
+
+        return f'"{hashlib.sha256(key.encode()).hexdigest()[:16]}"'
+
+    def build(self, names: Iterable[str]) -> dict:
+        names = list(names)
+
+        if any(SECTIONS[name].needs_data for name in names):
+            data = self.data_handler.reload()
+
+            if data is not self.cached_data:
+                self.cache = dict(self.data_handler.sections)
+                self.cached_data = data
+
+        content = {}
+        for name in names:
+            s = SECTIONS[name]
+
+            if s.cached and name in self.cache:
+                value = self.cache[name]
+            else:
+                value = s.fn(self.data_handler)
+                if s.cached:
+                    self.cache[name] = value
+
+            # "a.b.c" -> content["a"]["b"]["c"]
+            *parents, leaf = name.split(".")
+            current = content
+            for key in parents:
+                current = current.setdefault(key, {})
+            current[leaf] = value
+
+        return content
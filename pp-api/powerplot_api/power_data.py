@@ -1,8 +1,104 @@
 import pathlib
-import pandas as pd
 import numpy as np
-import pytz
+import pandas as pd
 import argparse
+from typing import NamedTuple, Optional, Tuple
+
+# For a db published by a scraper which doesn't tell its timezone yet.
+DEFAULT_TIMEZONE = "US/Eastern"
+
+HOUR_NS = 3600 * 10**9
+DAY_NS = 24 * HOUR_NS
+
+TIMES_OF_DAY = ["night", "morning", "afternoon", "evening"]
+
+# Hour of the day -> index into TIMES_OF_DAY: hours (0, 6] are the night, (6, 12] the
+# morning and so on, the way pd.cut() bins them; midnight doesn't make it into any.
+TIME_OF_DAY_CODES = np.array([-1] + [0] * 6 + [1] * 6 + [2] * 6 + [3] * 5)
+
+
+class LocalCalendar:
+    """
+    The local calendar of a (tz-aware) DatetimeIndex, worked out once: compact
+    arrays of the local hour, weekday, day of the month, day key (days since the
+    epoch) and month key (months since the epoch) of every timestamp, and the start
+    of the local hour each one falls in.
+
+    Aggregating by hour, day or month is then a matter of integer keys (see keys()
+    and labels()) rather than DST-aware datetime arithmetic.
+    """
+
+    def __init__(self, index: pd.DatetimeIndex):
+        self.tz = index.tz
+
+        utc = index.asi8
+        wall = index.tz_localize(None).asi8  # local time, as if it were UTC
+        days = wall // DAY_NS
+
+        self.hour = ((wall // HOUR_NS) % 24).astype(np.int8)
+        self.weekday = ((days + 3) % 7).astype(np.int8)  # 1970-01-01 was a Thursday
+        self.day = days.astype(np.int32)
+        months = days.astype("datetime64[D]").astype("datetime64[M]")
+        self.month = months.astype(np.int32)
+        first_days = months.astype("datetime64[D]").astype(np.int64)
+        self.day_of_month = (days - first_days + 1).astype(np.int8)
+
+        # In UTC, so that the hour repeated when DST ends is two hours, not one.
+        self.hour_start = (wall // HOUR_NS) * HOUR_NS - (wall - utc)
+
+    def keys(self, frequency: str) -> np.ndarray:
+        """
+        Integer keys of the "h", "D" or "M" buckets, consecutive buckets' keys are
+        one `step(frequency)` apart.
+        """
+
+        return {"h": self.hour_start, "D": self.day, "M": self.month}[frequency]
+
+    def hour_of_week(self, positions=slice(None)) -> np.ndarray:
+        """
+        The hour of the week, 0 being Monday midnight to 1am, of the timestamps at
+        `positions`.
+        """
+
+        return self.weekday[positions].astype(np.int64) * 24 + self.hour[positions]
+
+    @staticmethod
+    def step(frequency: str) -> int:
+        return HOUR_NS if frequency == "h" else 1
+
+    def labels(self, frequency: str, first: int, num_buckets: int) -> pd.DatetimeIndex:
+        """
+        The labels resample() would give `num_buckets` buckets from the key `first`
+        on: the start of the hour or the day, the last day of the month.
+        """
+
+        offsets = np.arange(num_buckets)
+        if frequency == "h":
+            utc = pd.DatetimeIndex(first + offsets * HOUR_NS, tz="UTC")
+            return utc.tz_convert(self.tz)
+
+        if frequency == "D":
+            days = (first + offsets).astype("datetime64[D]")
+        else:
+            days = (first + offsets + 1).astype("datetime64[M]").astype(
+                "datetime64[D]"
+            ) - np.timedelta64(1, "D")
+
+        return pd.DatetimeIndex(days.astype("datetime64[ns]")).tz_localize(
+            self.tz, ambiguous=True, nonexistent="shift_forward"
+        )
+
+
+class Buckets(NamedTuple):
+    """
+    Where the rows of the data (and of the daily archive) go when aggregated by
+    some frequency, see PowerData.buckets().
+    """
+
+    index: pd.DatetimeIndex  # one label per bucket, as resample() has them
+    codes: np.ndarray  # the bucket of each row of PowerData.df
+    archive_codes: Optional[np.ndarray]  # ... of PowerData.daily_archive
+    calendar: LocalCalendar  # of the labels
 
 
 class PowerData:
@@ -11,12 +107,41 @@ class PowerData:
     DataFrame operations.
     """
 
-    def __init__(self, filepath: pathlib.Path):
+    # The bill projection, see bill_breakdown().
+    NUM_TRAILING_DAYS = 31
+    NUM_RECENT_DAYS = 7
+
+    # The share of its reads a bucket needs to count as complete, see coverage().
+    MIN_COVERAGE = 0.95
+
+    # What a kWh costs all in, for the estimates that don't go through bill().
+    KWH_PRICE = 0.354
+
+    def __init__(
+        self, filepath: Optional[pathlib.Path] = None, timezone: Optional[str] = None
+    ):
         """
-        Read and process the power data from a CSV file.
+        Read and process the power data from a CSV file, in the `timezone` the
+        scraper publishes with it (see DataHandler.load()). Without a file, it's
+        up to the caller to fill in the data, see from_arrays().
         """
 
+        self.timezone = timezone or DEFAULT_TIMEZONE
         self.df = None
+        self.weather = None  # hourly temperature (°F), see load_weather()
+        self.daily_archive = None  # days older than self.df, see load_archive()
+        self.archive_end = None  # rows before this are hourly rollups, ditto
+        self.coverage_index = {}  # frequency -> reads present/expected, see coverage()
+        self.calendar: Optional[LocalCalendar] = None  # of self.df, set on load
+        self.archive_calendar: Optional[LocalCalendar] = None  # of the daily archive
+        self.bucket_index = {}  # frequency -> Buckets, see buckets()
+        self.hourly_usage_index = {}  # complete -> the hours, see hourly_usage()
+        self.hourly_totals_index: Optional[np.ndarray] = None  # see hourly_totals()
+        self.totals_index: Optional[np.ndarray] = None  # see totals()
+        self.num_reads_per_hour: Optional[int] = None  # see reads_per_hour()
+
+        if filepath is None:
+            return
 
         try:
             df = pd.read_csv(filepath)
@@ -24,18 +149,327 @@ class PowerData:
             df["datetime"] = pd.to_datetime(df["datetime"], utc=True)
             df.set_index("datetime", inplace=True)
 
-            # TODO: Auto detect the time zone
-            df.index = df.index.tz_convert(pytz.timezone("US/Eastern"))
+            df.index = df.index.tz_convert(self.timezone)
             df.index.name = "time"
 
             df["value"] = df["value"].round(3)  # Let's lower the resolution a tad,
             df.sort_index(inplace=True)
             self.df = df
+            self.calendar = LocalCalendar(df.index)
         except FileNotFoundError as e:
             raise FileNotFoundError(f"File not found: {filepath}") from e
         except Exception as e:
             raise Exception(f"Error reading data from {filepath}: {e}") from e
 
+    def to_arrays(self) -> dict:
+        """
+        The data as plain arrays (timestamps as UTC nanoseconds), for from_arrays().
+        """
+
+        arrays = {
+            "index": self.df.index.asi8,
+            "value": self.df["value"].to_numpy(dtype=np.float64),
+        }
+        if self.daily_archive is not None:
+            arrays["daily_index"] = self.daily_archive.index.asi8
+            arrays["daily_value"] = self.daily_archive["value"].to_numpy(np.float64)
+        if self.weather is not None:
+            arrays["weather_index"] = self.weather.index.asi8
+            arrays["weather_value"] = self.weather.to_numpy(dtype=np.float64)
+        return arrays
+
+    @classmethod
+    def from_arrays(
+        cls, arrays: dict, timezone: str, archive_end: Optional[pd.Timestamp] = None
+    ) -> "PowerData":
+        """
+        The PowerData to_arrays() was given. The values aren't copied, so they can
+        be memory-mapped and shared between processes (see shared.py); only the
+        timestamps are, when converting them to the local time.
+        """
+
+        def frame(index: np.ndarray, values: np.ndarray) -> pd.DataFrame:
+            index = pd.DatetimeIndex(index, tz="UTC").tz_convert(timezone)
+            index.name = "time"
+            return pd.DataFrame(
+                values.reshape(-1, 1), index=index, columns=["value"], copy=False
+            )
+
+        data = cls(timezone=timezone)
+        data.df = frame(arrays["index"], arrays["value"])
+        data.calendar = LocalCalendar(data.df.index)
+        data.archive_end = archive_end
+
+        if "daily_index" in arrays:
+            data.daily_archive = frame(arrays["daily_index"], arrays["daily_value"])
+            data.archive_calendar = LocalCalendar(data.daily_archive.index)
+        if "weather_index" in arrays:
+            weather = frame(arrays["weather_index"], arrays["weather_value"])
+            data.weather = weather["value"].rename("temperature")
+
+        return data
+
+    def read_tier(self, filepath: pathlib.Path) -> pd.DataFrame:
+        df = pd.read_csv(filepath)
+        df["datetime"] = pd.to_datetime(df["datetime"], utc=True)
+        df.set_index("datetime", inplace=True)
+        df.index = df.index.tz_convert(self.df.index.tz)
+        df.index.name = self.df.index.name
+        df["value"] = df["value"].round(3)
+        return df.sort_index()
+
+    def load_archive(self, db_filepath: pathlib.Path):
+        """
+        The scraper rolls old reads up into hourly and daily tiers next to the db
+        (see powerplot_scraper.retention). Hourly rows go in front of the raw reads,
+        so everything hourly and coarser sees them; daily rows only count towards
+        daily() and monthly().
+
+        Each tier is only read up to where the finer one starts, so rows that made it
+        into two tiers (an interrupted compaction) aren't counted twice. The raw db
+        may be empty (older scrapers compacted everything away), then the data is
+        all archive.
+        """
+
+        try:
+            hourly = self.read_tier(db_filepath.with_suffix(".hourly.csv"))
+            if self.df.empty:
+                if not hourly.empty:
+                    self.archive_end = hourly.index[-1] + pd.Timedelta(hours=1)
+            else:
+                hourly = hourly[hourly.index < self.df.index[0]]
+                self.archive_end = self.df.index[0]
+            self.df = pd.concat([hourly, self.df]) if not self.df.empty else hourly
+        except FileNotFoundError:
+            pass
+
+        try:
+            daily = self.read_tier(db_filepath.with_suffix(".daily.csv"))
+            if not self.df.empty:
+                daily = daily[daily.index < self.df.index[0]]
+            self.daily_archive = daily
+            self.archive_calendar = LocalCalendar(self.daily_archive.index)
+        except FileNotFoundError:
+            pass
+
+        self.calendar = LocalCalendar(self.df.index)
+        self.coverage_index = {}
+        self.bucket_index = {}
+        self.hourly_usage_index = {}
+        self.hourly_totals_index = None
+        self.totals_index = None
+        self.num_reads_per_hour = None
+
+    def load_weather(self, filepath: pathlib.Path):
+        """
+        Read the hourly temperatures the scraper keeps next to the db. They're on
+        the same hourly grid as hourly(), so the two align by index.
+        """
+
+        df = pd.read_csv(filepath)
+        index = pd.DatetimeIndex(pd.to_datetime(df["datetime"], utc=True))
+        self.weather = pd.Series(
+            df["temperature"].to_numpy(), index=index.tz_convert(self.df.index.tz)
+        ).rename("temperature")
+        self.weather.index.name = self.df.index.name
+
+    def buckets(self, frequency: str) -> Buckets:
+        """
+        The "h", "D" or "M" buckets of the data, worked out once per dataset from the
+        local calendar. The daily archive only has days, so it only counts towards
+        daily and monthly buckets.
+        """
+
+        frequency = {"H": "h"}.get(frequency, frequency)
+        if frequency not in self.bucket_index:
+            step = LocalCalendar.step(frequency)
+            keys = self.calendar.keys(frequency)
+
+            archive_keys = None
+            if (
+                frequency != "h"
+                and self.archive_calendar is not None
+                and len(self.daily_archive)
+            ):
+                archive_keys = self.archive_calendar.keys(frequency)
+
+            first = keys[0] if archive_keys is None else min(keys[0], archive_keys[0])
+            num_buckets = int((keys[-1] - first) // step) + 1
+
+            index = self.calendar.labels(frequency, first, num_buckets)
+            index.name = self.df.index.name
+            self.bucket_index[frequency] = Buckets(
+                index=index,
+                codes=((keys - first) // step).astype(np.int64),
+                archive_codes=(
+                    None
+                    if archive_keys is None
+                    else ((archive_keys - first) // step).astype(np.int64)
+                ),
+                calendar=LocalCalendar(index),
+            )
+
+        return self.bucket_index[frequency]
+
+    def hourly_usage(self, complete: bool = False) -> pd.Series:
+        """
+        The usage of every hour which has any reads: unlike hourly(), gaps in the
+        data are left out rather than counted as zero usage. With `complete`, so are
+        the hours missing reads (see complete()), like the one in progress and the
+        ones at the edges of a gap, which would look like low usage.
+
+        Worked out once per dataset; the extensions all share it, so don't modify it.
+        """
+
+        if complete in self.hourly_usage_index:
+            return self.hourly_usage_index[complete]
+
+        buckets = self.buckets("h")
+        values = self.df["value"].to_numpy(dtype=np.float64)
+        counts = np.bincount(buckets.codes, minlength=len(buckets.index))
+        sums = np.bincount(buckets.codes, weights=values, minlength=len(buckets.index))
+
+        present = counts > 0
+        if complete:
+            coverage = self.coverage("h")["coverage"].reindex(
+                buckets.index, fill_value=0.0
+            )
+            present &= coverage.to_numpy() >= self.MIN_COVERAGE
+
+        hourly = pd.Series(sums[present], index=buckets.index[present], name="value")
+        self.hourly_usage_index[complete] = hourly
+        return hourly
+
+    def hourly_totals(self, until: pd.Timestamp) -> Tuple[int, float]:
+        """
+        The number and the sum of the complete hours (see hourly_usage()) up to
+        `until`, included: what the incremental models fingerprint the hours they've
+        settled with, to tell new data from changed data. Off running totals worked
+        out once per dataset, so it's a binary search rather than a scan.
+        """
+
+        hourly = self.hourly_usage(complete=True)
+        if self.hourly_totals_index is None:
+            self.hourly_totals_index = np.r_[0.0, np.cumsum(hourly.to_numpy())]
+
+        count = int(hourly.index.searchsorted(until, side="right"))
+        return count, float(self.hourly_totals_index[count])
+
+    def totals(self, until: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The number and the sum of the rows before each of `until` (UTC ns), off
+        running totals worked out once per dataset, like hourly_totals(): any range
+        of the data can be fingerprinted without going over it.
+        """
+
+        if self.totals_index is None:
+            values = np.nan_to_num(self.df["value"].to_numpy(dtype=np.float64))
+            self.totals_index = np.r_[0.0, np.cumsum(values)]
+
+        counts = np.searchsorted(self.df.index.asi8, until)
+        return counts, self.totals_index[counts]
+
+    def hour_positions(self, hours: pd.DatetimeIndex) -> np.ndarray:
+        """
+        Where some of the hourly buckets, e.g. the ones hourly_usage() returns, are
+        in buckets("h"), so their calendar can be looked up rather than worked out
+        again.
+        """
+
+        return (hours.asi8 - self.buckets("h").index.asi8[0]) // HOUR_NS
+
+    def hour_of_week(self, hours: pd.DatetimeIndex) -> np.ndarray:
+        """
+        The hour of the week (see LocalCalendar.hour_of_week()) of some of the
+        hourly buckets, see hour_positions().
+        """
+
+        return self.buckets("h").calendar.hour_of_week(self.hour_positions(hours))
+
+    def reads_per_hour(self) -> int:
+        """
+        How many reads an hour should have, going by the most common interval.
+        Worked out once per dataset.
+        """
+
+        if self.num_reads_per_hour is not None:
+            return self.num_reads_per_hour
+
+        raw = self.df.index
+        if self.archive_end is not None:
+            raw = raw[raw.searchsorted(self.archive_end) :]
+        if len(raw) < 2:
+            self.num_reads_per_hour = 1
+        else:
+            interval = pd.Timedelta(np.median(np.diff(raw.asi8)), unit="ns")
+            hour = pd.Timedelta(hours=1)
+            self.num_reads_per_hour = max(int(round(hour / interval)), 1)
+
+        return self.num_reads_per_hour
+
+    def coverage(self, frequency: str = "h") -> pd.DataFrame:
+        """
+        The reads present vs expected per hour ("h"), day ("D") or month ("M") in the
+        span of the data (local midnight to midnight), and their ratio, "coverage".
+        Built once per dataset, every aggregation after that is an index lookup.
+
+        Rolled-up hours and days (see load_archive()) count as complete.
+        """
+
+        frequency = {"H": "h"}.get(frequency, frequency)
+        if not self.coverage_index:
+            reads_per_hour = self.reads_per_hour()
+
+            buckets = self.buckets("h")
+            present = pd.Series(
+                np.bincount(
+                    buckets.codes[self.df["value"].notna().to_numpy()],
+                    minlength=len(buckets.index),
+                ).astype(np.float64),
+                index=buckets.index,
+            )
+            if self.archive_end is not None:
+                rolled_up = present.index < self.archive_end
+                present[rolled_up] = np.where(present[rolled_up] > 0, reads_per_hour, 0)
+
+            first = self.df.index[0]
+            if self.daily_archive is not None and not self.daily_archive.empty:
+                first = min(first, self.daily_archive.index[0])
+            hours = pd.date_range(
+                first.normalize(),
+                self.df.index[-1].normalize() + pd.Timedelta(days=1),
+                freq="h",
+                inclusive="left",
+            )
+
+            hourly = pd.DataFrame(
+                {
+                    "present": present.reindex(hours, fill_value=0).clip(
+                        upper=reads_per_hour
+                    ),
+                    "expected": float(reads_per_hour),
+                },
+                index=hours,
+            )
+            daily = hourly.resample("D").sum()
+            if self.daily_archive is not None:
+                archived = daily.index.isin(self.daily_archive.index)
+                daily.loc[archived, "present"] = daily.loc[archived, "expected"]
+            # By the calendar's month keys, labeled like buckets("M"); every month is
+            # there, `daily` has every day.
+            months = LocalCalendar(daily.index).keys("M")
+            monthly = daily.groupby(months - months[0]).sum()
+            monthly.index = LocalCalendar(daily.index).labels(
+                "M", int(months[0]), len(monthly)
+            )
+
+            for key, df in (("h", hourly), ("D", daily), ("M", monthly)):
+                df.index.name = self.df.index.name
+                df["coverage"] = (df["present"] / df["expected"]).round(3)
+                self.coverage_index[key] = df
+
+        return self.coverage_index[frequency]
+
     def __str__(self):
         return str(self.df)
 
@@ -52,12 +486,33 @@ class PowerData:
         """
         Aggregate data into chunks based on the specified frequencyuency.
         """
-        df = self.df.copy()
-        df = df.resample(frequency).sum()
-        # df.dropna(inplace=True)
-        df["value"] = df["value"].round(2)
+        buckets = self.buckets(frequency)
+        codes, values = buckets.codes, self.df["value"].to_numpy(dtype=np.float64)
+        if buckets.archive_codes is not None:
+            # The archive's days come first, as they do in the data.
+            codes = np.concatenate([buckets.archive_codes, codes])
+            values = np.concatenate(
+                [self.daily_archive["value"].to_numpy(dtype=np.float64), values]
+            )
+
+        # Summed by pandas like resample() would (compensated, skipping NaN), so the
+        # rounding comes out the same to the last digit.
+        sums = pd.Series(values).groupby(codes).sum()
+        sums = sums.reindex(range(len(buckets.index)), fill_value=0.0)
+        df = pd.DataFrame({"value": sums.to_numpy().round(2)}, index=buckets.index)
+
+        # Missing reads sum up to zero, so that's how much of each bucket was there.
+        coverage = self.coverage(frequency)["coverage"]
+        df["coverage"] = coverage.reindex(df.index, fill_value=0.0)
         return df
 
+    def complete(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Only the buckets of an aggregation which have (nearly) all their reads.
+        """
+
+        return df[df["coverage"] >= self.MIN_COVERAGE]
+
     def hourly(self) -> pd.DataFrame:
         """
         Aggregate data into whole hours and return as JSON.
@@ -70,9 +525,8 @@ class PowerData:
         """
 
         df = self.resample("D")
-        df["month"] = df.index.to_period("M")
-        df["cumulative_sum"] = df.groupby("month")["value"].cumsum()
-        df.drop(columns=["month"], inplace=True)
+        month = self.buckets("D").calendar.month
+        df["cumulative_sum"] = df.groupby(month)["value"].cumsum()
         return df
 
     def monthly(self) -> pd.DataFrame:
@@ -85,29 +539,29 @@ class PowerData:
         return df
 
     def day_breakdown(self, last_num_hours: int = 0) -> dict:
-        df = self.hourly().copy()
-        df = df.tail(last_num_hours) if last_num_hours > 0 else df
-        df["time_of_day"] = pd.cut(
-            df.index.hour,
-            bins=[0, 6, 12, 18, 24],
-            labels=["night", "morning", "afternoon", "evening"],
+        df = self.hourly()
+        df["time_of_day"] = pd.Categorical.from_codes(
+            TIME_OF_DAY_CODES[self.buckets("h").calendar.hour], categories=TIMES_OF_DAY
         )
+        df = df.tail(last_num_hours) if last_num_hours > 0 else df
+        df = self.complete(df)
         result = df.groupby("time_of_day", observed=False)["value"].mean().round(2)
-        return result.to_dict()
+        # A time of day without a single complete hour has no mean.
+        return result.astype(object).where(result.notna(), None).to_dict()
 
     def base_usage(self):
-        df = self.hourly().copy()
+        df = self.complete(self.hourly())
 
         # the value that occurs the most must be the base
         # "fridge only" usage, so no matter what we would pay this amount
         hist = df["value"].value_counts(bins=100, sort=True)
         base_kwh = hist.index[0].mid
-        base_dollars = base_kwh * 31 * 24 * 0.354 + 18
+        base_dollars = base_kwh * 31 * 24 * self.KWH_PRICE + 18
         return {"kwh": base_kwh, "dollars": base_dollars}
 
     def hourly_mean(self):
         df = self.hourly().copy()
-        df = df.tail(7 * 24)
+        df = self.complete(df.tail(7 * 24))
         hourly_average_week = df["value"].mean().round(2)
         df = df.tail(24)
         hourly_average_day = df["value"].mean().round(2)
@@ -125,24 +579,20 @@ class PowerData:
         """ """
 
         df_monthly = self.monthly()
-        df_daily = self.daily()
-        df_daily = df_daily[
-            df_daily["value"] >= 2
-        ]  # Drop days with missing data or otherwise clearly incomplete days...
+        # Drop days with missing data, including the latest day if it's partial...
+        df_daily = self.complete(self.daily())
 
         # Extrapolate the usage based on the current day of the month.
-        last_data_day = self.df.index[-1].day
-        NUM_TRAILING_DAYS = 31
+        last_data_day = int(self.calendar.day_of_month[-1])
+        NUM_TRAILING_DAYS = self.NUM_TRAILING_DAYS
+        NUM_RECENT_DAYS = self.NUM_RECENT_DAYS
 
-        # Note that the latest day is always excluded as the data is likely to be partial.
-        average_daily_usage_kwh = (
-            df_daily.tail(NUM_TRAILING_DAYS + 1).head(NUM_TRAILING_DAYS)["value"].mean()
-        )
+        average_daily_usage_kwh = df_daily.tail(NUM_TRAILING_DAYS)["value"].mean()
 
         # Let's weigh usage over the last 7 days a little more, so that the bill prediction is
         # a little more dynamic based on the recent trends. This weighing should diminish as
         # the month goes on, however.
-        recent_average_daily_usage_kwh = df_daily.tail(7 + 1).head(7)["value"].mean()
+        recent_average_daily_usage_kwh = df_daily.tail(NUM_RECENT_DAYS)["value"].mean()
         
         weighed_daily_usage_kwh = (
             recent_average_daily_usage_kwh * (NUM_TRAILING_DAYS - last_data_day)
@@ -150,7 +600,78 @@ class PowerData:
         )
 
         extrapolated_usage_kwh = weighed_daily_usage_kwh
-      
+
+        return self.bill(extrapolated_usage_kwh)
+
+    def bill_backtest(self) -> pd.DataFrame:
+        """
+        How far off bill_breakdown() would have been, had it run at the end of every
+        day in the history, against what the month actually came to.
+
+        Rather than re-running it on the data truncated at every day (quadratic),
+        the trailing averages it takes are computed for all days at once from the
+        cumulative sum of the daily series. Only complete months are scored.
+
+        Returns the error by day of the month: the mean error (kWh, positive is an
+        overestimate), the mean absolute percentage error and the number of days.
+        """
+
+        df_daily = self.daily()
+        daily = df_daily["value"]
+        calendar = self.buckets("D").calendar
+
+        # What bill_breakdown() sees: the complete days.
+        complete = self.complete(df_daily)["value"]
+        cumulative = np.concatenate([[0.0], complete.cumsum().to_numpy()])
+
+        # As of (the end of) each day, how many of those days there are.
+        end = np.searchsorted(complete.index, daily.index, side="right")
+
+        def trailing_mean(num_days: int) -> np.ndarray:
+            start = np.maximum(end - num_days, 0)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return (cumulative[end] - cumulative[start]) / (end - start)
+
+        day = calendar.day_of_month.astype(np.int64)
+        projected = (
+            trailing_mean(self.NUM_RECENT_DAYS) * (self.NUM_TRAILING_DAYS - day)
+            + trailing_mean(self.NUM_TRAILING_DAYS) * day
+        )
+
+        months = calendar.month
+        actual = daily.groupby(months).transform("sum").to_numpy()
+        month_coverage = (
+            df_daily["coverage"].groupby(months).transform("min").to_numpy()
+        )
+
+        # The first and the last month are partial, so are those with gaps.
+        scored = (
+            (months > months[0])
+            & (months < months[-1])
+            & (month_coverage >= self.MIN_COVERAGE)
+            & ~np.isnan(projected)
+        )
+
+        df = pd.DataFrame(
+            {
+                "day": day[scored],
+                "error_kwh": (projected - actual)[scored],
+                "abs_pct_error": (np.abs(projected - actual) / actual * 100)[scored],
+            }
+        )
+        result = df.groupby("day").agg(
+            mean_error_kwh=("error_kwh", "mean"),
+            mape=("abs_pct_error", "mean"),
+            days=("error_kwh", "size"),
+        )
+        return result.round(2)
+
+    @staticmethod
+    def bill(extrapolated_usage_kwh: float) -> dict:
+        """
+        What a month of `extrapolated_usage_kwh` comes down to, in dollars.
+        """
+
         # These charges are supplier dependent most likely.
         # Introduce the notion of supplier to the API once new integrations are added.
         if "coned" == "coned":
@@ -197,9 +718,23 @@ if __name__ == "__main__":
         type=pathlib.Path,
         help="Run algorithm on a capture. Viewer enabled by default.",
     )
+    parser.add_argument(
+        "--timezone",
+        default=None,
+        help=f"Timezone of the capture, {DEFAULT_TIMEZONE} by default.",
+    )
+    parser.add_argument(
+        "--backtest",
+        action="store_true",
+        help="Score the bill projection against every complete month in the capture.",
+    )
 
     args = parser.parse_args()
 
-    p = PowerData(args.csv_data_filepath)
+    p = PowerData(args.csv_data_filepath, timezone=args.timezone)
+    p.load_archive(args.csv_data_filepath)
 
-    p.bill_breakdown()
+    if args.backtest:
+        print(p.bill_backtest().to_string())
+    else:
+        p.bill_breakdown()
@@ -0,0 +1,295 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import tracemalloc
+from collections import Counter, deque
+from typing import Optional
+
+MODES = ("sample", "trace")
+
+# Only stacks going through the endpoints (or the middleware) count in the sample
+# mode, the rest are idle threads, the event loop waiting for something to do and
+# the likes of the PublishListener.
+REQUEST_FILES = {__file__, os.path.join(os.path.dirname(__file__), "__main__.py")}
+
+SAMPLE_INTERVAL = 0.001  # seconds
+MAX_MEMORY_SITES = 20  # allocation sites listed, the biggest ones
+MAX_PROFILES = 20  # kept until fetched, the most recent ones
+
+
+def frame_label(code) -> str:
+    filename = "/".join(code.co_filename.rsplit("/", 2)[-2:])
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({filename}:{code.co_firstlineno})"
+
+
+def builtin_label(fn) -> str:
+    module = getattr(fn, "__module__", None) or "builtins"
+    return f"{module}.{getattr(fn, '__qualname__', repr(fn))}"
+
+
+def collapse(stacks: Counter) -> str:
+    """
+    The collapsed-stack format of flamegraph.pl, speedscope and co: one line per
+    stack, root first, frames separated by semicolons, then the weight.
+    """
+
+    return "".join(f"{stack} {weight}\n" for stack, weight in stacks.most_common())
+
+
+class StackSampler(threading.Thread):
+    """
+    Statistical: every SAMPLE_INTERVAL, the stack of every thread serving a
+    request. Sees the threadpool running the `def` endpoints too, and whatever
+    other requests run at the same time.
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.stacks = Counter()
+        self.num_samples = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self.stopped.wait(SAMPLE_INTERVAL):
+            self.num_samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+
+                labels = []
+                serving = False
+                while frame is not None:
+                    labels.append(frame_label(frame.f_code))
+                    serving = serving or frame.f_code.co_filename in REQUEST_FILES
+                    frame = frame.f_back
+
+                if serving:
+                    self.stacks[";".join(reversed(labels))] += 1
+
+    def __enter__(self):
+        # The sampler needs the GIL to take a sample, don't let the request hog it.
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(SAMPLE_INTERVAL / 2)
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.join()
+        sys.setswitchinterval(self.switch_interval)
+
+
+class StackTracer:
+    """
+    Deterministic: every call and return (C functions included) in the thread it
+    is started on, with the time in between charged to the stack at the time, in
+    nanoseconds. Exact, but slows down what it traces several times over, and only
+    sees the event loop thread, i.e. the `async def` endpoints like `/`.
+    """
+
+    def __init__(self):
+        self.stacks = Counter()
+        self.keys = []  # the stack so far as "root;...;frame", per depth
+        self.last = 0
+
+    def charge(self, now: int):
+        if self.keys:
+            self.stacks[self.keys[-1]] += now - self.last
+        self.last = now
+
+    def callback(self, frame, event, arg):
+        now = time.perf_counter_ns()
+        self.charge(now)
+
+        if event == "call":
+            label = frame_label(frame.f_code)
+        elif event == "c_call":
+            label = builtin_label(arg)
+        elif self.keys:
+            # A return, possibly from a frame entered before we started.
+            self.keys.pop()
+            return
+        else:
+            return
+
+        self.keys.append(f"{self.keys[-1]};{label}" if self.keys else label)
+
+    def __enter__(self):
+        self.last = time.perf_counter_ns()
+        sys.setprofile(self.callback)
+        return self
+
+    def __exit__(self, *exc):
+        sys.setprofile(None)
+        self.charge(time.perf_counter_ns())
+
+
+class Profiler:
+    """
+    Profiles requests, one at a time: right away (run()) or the next few to come
+    in (arm(), see ProfilingMiddleware). Nothing is profiled, and the middleware
+    isn't even installed, unless POWERPLOT_ADMIN_TOKEN is set, see __main__.
+    """
+
+    def __init__(self):
+        self.armed = 0  # requests left to profile
+        self.mode = "sample"
+        self.busy = False
+        self.profiles = deque(maxlen=MAX_PROFILES)
+
+    def arm(self, count: int, mode: str):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode: {mode}")
+
+        self.armed, self.mode = count, mode
+
+    async def profile(self, app, scope, receive, send, mode: str) -> dict:
+        self.busy = True
+        response = {"status": None, "bytes": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        tracing_memory = tracemalloc.is_tracing()
+        if tracing_memory:
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+
+        profiler = StackSampler() if mode == "sample" else StackTracer()
+        start = time.perf_counter()
+        try:
+            with profiler:
+                await app(scope, receive, send_wrapper)
+        finally:
+            seconds = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            if not tracing_memory:
+                tracemalloc.stop()
+            self.busy = False
+
+        path = scope["path"]
+        if scope.get("query_string"):
+            path += "?" + scope["query_string"].decode()
+
+        profile = {
+            "path": path,
+            "mode": mode,
+            "status": response["status"],
+            "bytes": response["bytes"],
+            "seconds": round(seconds, 4),
+            "unit": "samples" if mode == "sample" else "nanoseconds",
+            "collapsed": collapse(profiler.stacks),
+            "memory": {
+                "peak_kb": round(peak / 1024, 1),
+                "retained_kb": round(current / 1024, 1),
+                "retained_by": [
+                    {
+                        "where": str(stat.traceback),
+                        "kb": round(stat.size / 1024, 1),
+                        "blocks": stat.count,
+                    }
+                    for stat in snapshot.filter_traces(
+                        [
+                            tracemalloc.Filter(False, tracemalloc.__file__),
+                            # The tracer's own stacks.
+                            tracemalloc.Filter(False, __file__),
+                        ]
+                    ).statistics("lineno")[:MAX_MEMORY_SITES]
+                ],
+            },
+        }
+        if mode == "sample":
+            profile["samples"] = profiler.num_samples
+
+        return profile
+
+    async def run(self, app, path: str, mode: str) -> dict:
+        """
+        Profile a GET of `path` (with its query string), made to `app` in-process.
+        """
+
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode: {mode}")
+
+        path, _, query = path.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [(b"host", b"localhost")],
+            "client": ("127.0.0.1", 0),
+            "server": ("127.0.0.1", 0),
+            "powerplot.profiled": True,
+        }
+
+        received = False
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            # Nobody disconnects, the response is read to the end.
+            await asyncio.Event().wait()
+
+        async def send(message):
+            pass
+
+        return await self.profile(app, scope, receive, send, mode)
+
+
+profiler = Profiler()
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the next requests once the profiler is armed, and keeps the profiles
+    for /admin/profiles. Plain ASGI, so when not armed a request costs one check.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            not profiler.armed
+            or profiler.busy
+            or scope["type"] != "http"
+            or scope["path"].startswith("/admin")
+            or "powerplot.profiled" in scope
+        ):
+            return await self.app(scope, receive, send)
+
+        profiler.armed -= 1
+        profiler.profiles.append(
+            await profiler.profile(
+                self.app,
+                {**scope, "powerplot.profiled": True},
+                receive,
+                send,
+                profiler.mode,
+            )
+        )
+
+
+def allowed(token: Optional[str], admin_token: Optional[str]) -> bool:
+    import hmac
+
+    return bool(admin_token) and hmac.compare_digest(token or "", admin_token)
@@ -0,0 +1,142 @@
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .power_data import PowerData
+
+
+class DataQuality:
+    """
+    How complete the data is: the coverage (reads present vs expected, see
+    PowerData.coverage()) per month, the incomplete days and the gaps, i.e. runs of
+    hours missing some or all of their reads. Summarized once per dataset.
+
+    Like the other extensions, the hourly counters (reads present and expected, the
+    gaps) are kept for the hours up to a boundary SETTLE_HOURS back, so a new
+    dataset only goes over the hours since. Reads added before the boundary (a
+    backfill), or rolled up (which makes hours complete), rebuild them.
+    """
+
+    MAX_GAPS = 100  # the most recent ones
+    MAX_DAYS = 100  # incomplete days listed, the most recent ones
+    SETTLE_HOURS = 48
+
+    def __init__(self):
+        self.reset()
+
+        self.summary: Optional[dict] = None
+        self.reason: Optional[str] = "No data yet."
+
+    def reset(self):
+        self.boundary: Optional[pd.Timestamp] = None  # hours before it are settled
+        self.fingerprint = 0  # the number of rows before the boundary
+        self.present = 0.0  # reads in the settled hours
+        self.expected = 0.0  # ... and how many there should be
+        self.settled_gaps: List[dict] = []
+
+    @staticmethod
+    def gaps(hourly: pd.DataFrame) -> List[dict]:
+        """
+        The runs of incomplete hours, with their start and (exclusive) end.
+        """
+
+        incomplete = (hourly["present"] < hourly["expected"]).to_numpy()
+        if not incomplete.any():
+            return []
+
+        # Where runs of incomplete hours start and end.
+        edges = np.diff(np.r_[0, incomplete.astype(np.int8), 0])
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+
+        missing = np.cumsum(np.r_[0, (hourly["expected"] - hourly["present"])])
+        index = hourly.index
+
+        return [
+            {
+                "start": index[start],
+                "end": index[end - 1] + pd.Timedelta(hours=1),
+                "hours": int(end - start),
+                "missing_reads": int(missing[end] - missing[start]),
+            }
+            for start, end in zip(starts, ends)
+        ]
+
+    @staticmethod
+    def merge(gaps: List[dict], more: List[dict]) -> List[dict]:
+        """
+        `gaps` followed by `more`, the gap running over from one into the other as
+        one.
+        """
+
+        if gaps and more and gaps[-1]["end"] == more[0]["start"]:
+            joined = {
+                "start": gaps[-1]["start"],
+                "end": more[0]["end"],
+                "hours": gaps[-1]["hours"] + more[0]["hours"],
+                "missing_reads": gaps[-1]["missing_reads"] + more[0]["missing_reads"],
+            }
+            return gaps[:-1] + [joined] + more[1:]
+
+        return gaps + more
+
+    def update(self, data: PowerData):
+        hourly = data.coverage("h")
+        daily = data.coverage("D")
+        monthly = data.coverage("M")
+
+        # The hours in progress aren't gaps, they just haven't been read yet.
+        last = data.df.index[-1]
+        due = hourly.index.searchsorted(last.floor("h"))
+        boundary = last.floor("h") - pd.Timedelta(hours=self.SETTLE_HOURS)
+        settled = hourly.index.searchsorted(boundary)
+
+        (count,), _ = data.totals(np.array([boundary.value]))
+        unchanged = self.boundary is not None and self.boundary <= boundary
+        if unchanged:
+            (previous,), _ = data.totals(np.array([self.boundary.value]))
+            unchanged = previous == self.fingerprint
+
+        start = hourly.index.searchsorted(self.boundary) if unchanged else 0
+        if not unchanged:
+            self.reset()
+
+        new = hourly.iloc[start:settled]
+        self.present += float(new["present"].sum())
+        self.expected += float(new["expected"].sum())
+        self.settled_gaps = self.merge(self.settled_gaps, self.gaps(new))
+        del self.settled_gaps[: -self.MAX_GAPS]
+        self.boundary, self.fingerprint = boundary, int(count)
+
+        recent = hourly.iloc[settled:due]
+        present = self.present + float(recent["present"].sum())
+        expected = self.expected + float(recent["expected"].sum())
+        gaps = self.merge(self.settled_gaps, self.gaps(recent))
+
+        monthly = monthly.copy()
+        monthly.iloc[-1, :2] -= hourly.iloc[due:][["present", "expected"]].sum()
+        monthly["coverage"] = (monthly["present"] / monthly["expected"]).round(3)
+
+        incomplete_days = daily[daily["coverage"] < data.MIN_COVERAGE]
+        incomplete_days = incomplete_days[incomplete_days.index < last.normalize()]
+
+        self.summary = {
+            "reads_per_hour": data.reads_per_hour(),
+            "coverage": round(present / expected, 4) if expected else 0.0,
+            "monthly": {
+                month.strftime("%Y-%m"): coverage
+                for month, coverage in monthly["coverage"].items()
+            },
+            "incomplete_days": {
+                day.strftime("%Y-%m-%d"): coverage
+                for day, coverage in incomplete_days["coverage"]
+                .tail(self.MAX_DAYS)
+                .items()
+            },
+            "gaps": [
+                {**gap, "start": str(gap["start"]), "end": str(gap["end"])}
+                for gap in gaps[-self.MAX_GAPS :][::-1]
+            ],
+        }
+        self.reason = None
@@ -0,0 +1,198 @@
+import os
+import mmap
+import time
+import pickle
+import shutil
+import struct
+import pathlib
+import threading
+from typing import Optional
+
+from .data_handler import DataHandler, DB_FILE_PATH
+from .notifications import PublishListener
+from .payload import SECTIONS
+
+# Where the loader publishes the datasets for the workers.
+SHARED_DIR_PATH = DB_FILE_PATH.parent / "shared"
+
+# Set in the workers' environment, see __main__.
+WORKER_ENV = "POWERPLOT_API_SHARED_DIR"
+
+COUNTER_NAME = "counter"  # the number of the latest snapshot, a little-endian u64
+COUNTER = struct.Struct("<Q")
+
+
+def snapshot_path(directory: pathlib.Path, number: int) -> pathlib.Path:
+    return directory / f"snapshot-{number}"
+
+
+def open_counter(directory: pathlib.Path, writable: bool = False) -> mmap.mmap:
+    path = directory / COUNTER_NAME
+    if writable:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(fd).st_size < COUNTER.size:
+            os.ftruncate(fd, COUNTER.size)
+    else:
+        fd = os.open(path, os.O_RDONLY)
+
+    try:
+        return mmap.mmap(
+            fd,
+            COUNTER.size,
+            access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ,
+        )
+    finally:
+        os.close(fd)
+
+
+class SnapshotPublisher:
+    """
+    The loader of the multi-worker mode: the one process which reads the db and
+    brings the extensions and the cached payload sections up to date, like a
+    single worker would. Every new dataset is then published as a snapshot for the
+    workers (see SharedDataHandler):
+
+    - the arrays of the dataset as .npy files, which the workers memory-map, so
+      there's one copy of them in memory (the page cache) however many workers,
+    - the extensions and the payload sections in a pickle,
+
+    and the number of the snapshot is written to the counter last. Snapshots are
+    written to a temporary directory and renamed into place, so whatever number a
+    worker reads, that snapshot is complete.
+    """
+
+    POLL_SECONDS = 5  # for changes nobody told us about, as reload() would notice
+    KEEP = 3  # snapshots, for workers still attaching to a previous one
+
+    def __init__(self, data_handler: DataHandler, payload, directory=SHARED_DIR_PATH):
+        self.data_handler = data_handler
+        self.payload = payload
+        self.directory = directory
+
+        os.makedirs(directory, exist_ok=True)
+        self.counter = open_counter(directory, writable=True)
+        self.number = COUNTER.unpack(self.counter[:])[0]
+
+        self.published = None  # the PowerData last published
+        self.lock = threading.Lock()
+
+    def reload(self):
+        with self.lock:
+            data = self.data_handler.reload()
+            if data is not self.published:
+                self.publish(data)
+                self.published = data
+
+    def publish(self, data):
+        import numpy as np
+
+        # The sections cached per dataset are worth computing once, not per worker.
+        self.payload.build(
+            name for name, s in SECTIONS.items() if s.cached and s.needs_data
+        )
+
+        number = self.number + 1
+        path = snapshot_path(self.directory, number)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        for name, array in data.to_arrays().items():
+            np.save(tmp_path / f"{name}.npy", array)
+
+        with open(tmp_path / "state.pickle", "wb") as f:
+            pickle.dump(
+                {
+                    "timezone": data.timezone,
+                    "archive_end": data.archive_end,
+                    "version": self.data_handler.version,
+                    "last_modified": self.data_handler.last_modified,
+                    "weather_version": self.data_handler.weather_version,
+                    "extensions": self.data_handler.extensions,
+                    "sections": dict(self.payload.cache),
+                },
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+
+        os.replace(tmp_path, path)
+        self.counter[:] = COUNTER.pack(number)
+        self.number = number
+
+        for old in self.directory.glob("snapshot-*"):
+            if int(old.name.split("-")[1]) <= number - self.KEEP:
+                # Workers still mapping it keep their pages until they move on.
+                shutil.rmtree(old, ignore_errors=True)
+
+    def run(self):
+        """
+        Reload as soon as the scraper publishes, and every POLL_SECONDS anyway.
+        """
+
+        try:
+            PublishListener(DB_FILE_PATH, on_publish=lambda _: self.reload()).start()
+        except OSError as e:
+            print(f"Not listening for scraper notifications: {e}")
+
+        while True:
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"Failed to load the data: {e}")
+
+            time.sleep(self.POLL_SECONDS)
+
+
+class SharedDataHandler(DataHandler):
+    """
+    A worker's DataHandler in the multi-worker mode: rather than reading the db, it
+    attaches to the latest snapshot the loader published (see SnapshotPublisher).
+    Checking for a new one is reading the counter, which is memory-mapped.
+    """
+
+    def __init__(self, directory: pathlib.Path = SHARED_DIR_PATH):
+        super().__init__()
+        self.directory = directory
+        self.counter: Optional[mmap.mmap] = None
+        self.number = 0  # of the snapshot attached to
+
+    def listen(self):
+        # The loader does.
+        pass
+
+    def reload(self):
+        if self.counter is None:
+            try:
+                self.counter = open_counter(self.directory)
+            except FileNotFoundError as e:
+                raise FileNotFoundError("No dataset has been published yet.") from e
+
+        number = COUNTER.unpack(self.counter[:])[0]
+        if number == 0:
+            raise FileNotFoundError("No dataset has been published yet.")
+
+        with self.last_modified_lock:
+            if number != self.number:
+                with self.data_lock:
+                    self.attach(number)
+
+        return self.data
+
+    def attach(self, number: int):
+        import numpy as np
+        from .power_data import PowerData
+
+        path = snapshot_path(self.directory, number)
+        arrays = {p.stem: np.load(p, mmap_mode="r") for p in path.glob("*.npy")}
+        with open(path / "state.pickle", "rb") as f:
+            state = pickle.load(f)
+
+        self.data = PowerData.from_arrays(
+            arrays, timezone=state["timezone"], archive_end=state["archive_end"]
+        )
+        self.extensions = state["extensions"]
+        self.sections = state["sections"]
+        self.version = state["version"]
+        self.last_modified = state["last_modified"]
+        self.weather_version = state["weather_version"]
+        self.number = number
@@ -0,0 +1,51 @@
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+from powerplot_api.anomalies import AnomalyDetector
+from powerplot_api.power_data import PowerData
+
+TIMEZONE = "America/New_York"
+SAMPLE_PATH = pathlib.Path(__file__).parents[1] / "sample_data" / "sample.csv"
+
+
+def until(data: PowerData, end: pd.Timestamp) -> PowerData:
+    index = data.df.index
+    kept = index < end
+    return PowerData.from_arrays(
+        {"index": index.asi8[kept], "value": data.df["value"].to_numpy()[kept]},
+        TIMEZONE,
+    )
+
+
+def test_progressive_updates_match_a_full_build():
+    data = PowerData(SAMPLE_PATH, timezone=TIMEZONE)
+    first, last = data.df.index[0], data.df.index[-1]
+
+    detector = AnomalyDetector()
+    for end in pd.date_range(first + pd.Timedelta(weeks=4), last, freq="5D"):
+        detector.update(until(data, end))
+    detector.update(data)
+
+    built = AnomalyDetector()
+    built.update(data)
+
+    assert detector.summary == built.summary
+    assert detector.summary["intervals"]
+    assert np.array_equal(detector.window, built.window, equal_nan=True)
+
+
+def test_the_repeated_hour_at_the_end_of_dst_is_pushed_twice():
+    index = pd.date_range("2023-11-05", periods=25, freq="h", tz=TIMEZONE)
+    hourly = pd.Series(np.arange(25.0), index=index)
+    how = (index.dayofweek * 24 + index.hour).to_numpy()
+
+    detector = AnomalyDetector()
+    for week, week_how in detector.weeks(hourly, how):
+        detector.push(week, week_how)
+
+    # 1am comes around twice, the second time a week later as far as the window goes.
+    one_am = 6 * 24 + 1
+    assert detector.position[one_am] == 2
+    assert detector.window[one_am, :2].tolist() == [1.0, 2.0]
@@ -0,0 +1,43 @@
+import json
+import pathlib
+
+import pytest
+
+from powerplot_api.cube import LoadProfileCube
+from powerplot_api.power_data import PowerData
+
+TIMEZONE = "America/New_York"
+SAMPLE_PATH = pathlib.Path(__file__).parents[1] / "sample_data" / "sample.csv"
+
+
+def test_matches_a_groupby():
+    data = PowerData(SAMPLE_PATH, timezone=TIMEZONE)
+    cube = LoadProfileCube()
+    cube.update(data)
+
+    hourly = data.hourly_usage(complete=True)
+    grouped = hourly.groupby([hourly.index.dayofweek, hourly.index.hour])
+    for stat, expected in (("mean", grouped.mean()), ("p95", grouped.quantile(0.95))):
+        values = json.loads(cube.lookup(("hour", "dow"), stat))["values"]
+        # To within the rounding to 3 decimals.
+        assert {(v["dow"], v["hour"]): v["value"] for v in values} == pytest.approx(
+            dict(expected.items()), abs=0.001
+        )
+
+
+def test_new_reads_in_the_hour_in_progress_keep_the_cube():
+    data = PowerData(SAMPLE_PATH, timezone=TIMEZONE)
+    index = data.df.index
+    partial = index < index[-1].floor("h")
+    before = PowerData.from_arrays(
+        {"index": index.asi8[partial], "value": data.df["value"].to_numpy()[partial]},
+        TIMEZONE,
+    )
+
+    cube = LoadProfileCube()
+    cube.update(before)
+    results = cube.results
+
+    # The same complete hours, plus the reads of the one in progress.
+    cube.update(data)
+    assert cube.results is results
@@ -0,0 +1,52 @@
+import hashlib
+import json
+
+import pytest
+
+from powerplot_api import data_handler, notifications
+from powerplot_api.data_handler import DataHandler
+
+CSV = b"datetime,value\n2025-01-01 05:00:00+00:00,0.25\n2025-01-01 05:15:00+00:00,0.5\n"
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    db_path = tmp_path / "db.csv"
+    db_path.write_bytes(CSV)
+    monkeypatch.setattr(data_handler, "DB_FILE_PATH", db_path)
+    monkeypatch.setattr(data_handler.time, "sleep", lambda seconds: None)
+    return db_path
+
+
+def manifest(raw: bytes, version: int = 1) -> dict:
+    return {
+        "version": version,
+        "rows": raw.count(b"\n") - 1,
+        "sha256": hashlib.sha256(raw).hexdigest(),
+        "published_at": 1735707600.0,
+        "timezone": "America/New_York",
+    }
+
+
+def test_load_checks_the_db_against_its_manifest(db_path):
+    data, loaded = DataHandler.load(manifest(CSV))
+
+    assert loaded["version"] == 1
+    assert data.df["value"].tolist() == [0.25, 0.5]
+
+
+def test_load_rereads_the_manifest_published_in_between(db_path, monkeypatch):
+    # The manifest read before the new db was renamed into place.
+    stale = manifest(b"datetime,value\n", version=1)
+    newer = manifest(CSV, version=2)
+    notifications.manifest_path(db_path).write_text(json.dumps(newer))
+
+    data, loaded = DataHandler.load(stale)
+
+    assert loaded == newer
+    assert len(data.df) == 2
+
+
+def test_load_gives_up_on_a_db_that_never_matches(db_path):
+    with pytest.raises(AssertionError):
+        DataHandler.load(manifest(b"datetime,value\n"))
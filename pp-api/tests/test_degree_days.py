@@ -0,0 +1,28 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from powerplot_api.degree_days import DegreeDayModel
+from powerplot_api.power_data import PowerData
+
+TIMEZONE = "America/New_York"
+
+
+def test_fits_only_the_complete_days():
+    # 20 days of 0.1 kWh reads and a day in progress, the 6th day missing half.
+    index = pd.date_range("2025-01-01", "2025-01-21 12:00", freq="15min", tz=TIMEZONE)
+    index = index[(index < "2025-01-06 06:00") | (index >= "2025-01-06 18:00")]
+    data = PowerData.from_arrays(
+        {"index": index.asi8, "value": np.full(len(index), 0.1)}, TIMEZONE
+    )
+    hours = pd.date_range("2025-01-01", "2025-01-22", freq="h", tz=TIMEZONE)
+    data.weather = pd.Series(40.0, index=hours, name="temperature")
+
+    model = DegreeDayModel()
+    model.update(data)
+
+    days = [datetime.date(2025, 1, day) for day in range(1, 21) if day != 6]
+    assert model.days.index.tolist() == days
+    assert model.days["kwh"].tolist() == [9.6] * 19
+    assert model.days["hdd"].tolist() == [25.0] * 19
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from powerplot_api.events import ApplianceEvents
+from powerplot_api.power_data import PowerData
+
+TIMEZONE = "America/New_York"
+
+
+def reads(days: int = 20) -> pd.Series:
+    """
+    A 0.4 kW base load, with a 4.5 kW dryer running for an hour every evening.
+    """
+
+    index = pd.date_range("2025-03-01", periods=days * 96, freq="15min", tz=TIMEZONE)
+    values = pd.Series(0.1, index=index)
+    values[(index.hour == 19)] += 4.5 / 4
+    return values
+
+
+def power_data(values: pd.Series, archive_end=None) -> PowerData:
+    return PowerData.from_arrays(
+        {"index": values.index.asi8, "value": values.to_numpy()},
+        TIMEZONE,
+        archive_end=archive_end,
+    )
+
+
+def test_progressive_updates_match_a_full_build():
+    values = reads()
+    events = ApplianceEvents()
+    for end in pd.date_range(
+        values.index[0] + pd.Timedelta(days=3), values.index[-1], freq="17h"
+    ):
+        events.update(power_data(values[values.index < end]))
+    events.update(power_data(values))
+
+    built = ApplianceEvents()
+    built.update(power_data(values))
+
+    assert events.summary == built.summary
+    assert len(events.summary["events"]) == 20
+    assert [c["kw"] for c in events.summary["clusters"]] == [4.5]
+
+
+def test_changed_reads_rebuild_but_rollups_dont():
+    values = reads()
+    events = ApplianceEvents()
+    events.update(power_data(values))
+    starts = events.starts
+
+    # The first days rolled up into the archive: what's left raw is the same.
+    rolled_up = values.index >= values.index[0] + pd.Timedelta(days=2)
+    events.update(power_data(values[rolled_up], archive_end=values.index[rolled_up][0]))
+    assert events.starts is starts
+
+    # A settled read corrected by the scraper.
+    changed = values.copy()
+    changed.iloc[5 * 96] += 0.01
+    events.update(power_data(changed))
+    assert events.starts is not starts
+    assert np.array_equal(events.starts, starts)
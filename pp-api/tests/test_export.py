@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from powerplot_api import export
+from powerplot_api.export import Export, parse_range, read_range, spool
+from powerplot_api.power_data import PowerData
+
+TIMEZONE = "America/New_York"
+
+
+@pytest.fixture
+def data(tmp_path) -> PowerData:
+    index = pd.date_range("2025-03-01", "2025-03-04", freq="15min", tz=TIMEZONE)
+    df = pd.DataFrame({"value": 0.25}, index=index[:-1].tz_convert("UTC"))
+    df.index.name = "datetime"
+    df.to_csv(tmp_path / "db.csv")
+    return PowerData(tmp_path / "db.csv", timezone=TIMEZONE)
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-99", 1000) == (0, 99)
+    assert parse_range("bytes=900-", 1000) == (900, 999)
+    assert parse_range("bytes=-100", 1000) == (900, 999)
+    assert parse_range("bytes=990-2000", 1000) == (990, 999)
+
+    # Not a single range we serve: the whole file instead.
+    assert parse_range("bytes=-", 1000) is None
+    assert parse_range("bytes=0-1,5-9", 1000) is None
+
+    with pytest.raises(ValueError):
+        parse_range("bytes=1000-", 1000)
+    with pytest.raises(ValueError):
+        parse_range("bytes=10-5", 1000)
+
+
+def test_end_date_includes_the_whole_day(data):
+    exported = Export(data, 1, start="2025-03-02", end="2025-03-02")
+    frame = exported.frame()
+
+    assert len(frame) == 96
+    assert frame.index[0] == pd.Timestamp("2025-03-02", tz=TIMEZONE)
+    assert exported.filename == "powerplot_raw_20250302_20250302.csv"
+
+    # A time is exclusive.
+    assert len(Export(data, 1, end="2025-03-02 00:00").frame()) == 96
+
+
+def test_spooled_ranges_match_the_stream(data, tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "CHUNK_ROWS", 50)
+    exported = Export(data, 1, fmt="ndjson")
+    streamed = b"".join(exported)
+
+    # Concurrent requests spooling the same export don't trip over each other.
+    directory = tmp_path / "exports"
+    with ThreadPoolExecutor(4) as pool:
+        paths = set(pool.map(lambda _: spool(exported, directory), range(8)))
+
+    (path,) = paths
+    assert path.read_bytes() == streamed
+    assert [p.name for p in directory.iterdir()] == [path.name]
+    assert b"".join(read_range(path, 100, 199)) == streamed[100:200]
+
+    # A new version of the data replaces the old exports.
+    newer = spool(Export(data, 2, fmt="ndjson"), directory)
+    assert [p.name for p in directory.iterdir()] == [newer.name]
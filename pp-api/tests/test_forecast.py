@@ -0,0 +1,55 @@
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+from powerplot_api.forecast import UsageForecast
+from powerplot_api.power_data import PowerData
+
+TIMEZONE = "America/New_York"
+SAMPLE_PATH = pathlib.Path(__file__).parents[1] / "sample_data" / "sample.csv"
+
+
+def until(data: PowerData, end: pd.Timestamp) -> PowerData:
+    index = data.df.index
+    kept = index < end
+    return PowerData.from_arrays(
+        {"index": index.asi8[kept], "value": data.df["value"].to_numpy()[kept]},
+        TIMEZONE,
+    )
+
+
+def test_progressive_updates_match_a_full_fit():
+    data = PowerData(SAMPLE_PATH, timezone=TIMEZONE)
+    last = data.df.index[-1]
+
+    forecast = UsageForecast()
+    for end in pd.date_range(last - pd.Timedelta(days=5), last, freq="9h"):
+        forecast.update(until(data, end))
+    forecast.update(data)
+
+    fitted = UsageForecast()
+    fitted.update(data)
+
+    assert forecast.summary == fitted.summary
+    assert np.allclose(forecast.sums, fitted.sums)
+
+
+def test_a_changed_past_refits():
+    data = PowerData(SAMPLE_PATH, timezone=TIMEZONE)
+    forecast = UsageForecast()
+    forecast.update(data)
+
+    # A backfill corrects a week in the middle of the data.
+    changed = until(data, data.df.index[-1] + pd.Timedelta(1))
+    middle = changed.df.index[len(changed.df) // 2]
+    week = (changed.df.index >= middle) & (
+        changed.df.index < middle + pd.Timedelta(weeks=1)
+    )
+    changed.df.loc[week, "value"] *= 2
+    forecast.update(changed)
+
+    fitted = UsageForecast()
+    fitted.update(changed)
+
+    assert forecast.summary == fitted.summary
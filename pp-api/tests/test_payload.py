@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+from powerplot_api import payload
+from powerplot_api.payload import Payload, resolve_fields, section
+
+
+class DataHandler:
+    def __init__(self):
+        self.data = object()
+        self.version = 1.0
+        self.weather_version = None
+        self.sections = {}
+        self.last_modified_lock = threading.Lock()
+
+    def reload(self):
+        return self.data
+
+    def new_dataset(self):
+        self.data = object()
+        self.version += 1
+
+
+@pytest.fixture
+def calls(monkeypatch) -> list:
+    """
+    A payload of three sections, which record it when they're computed.
+    """
+
+    monkeypatch.setattr(payload, "SECTIONS", {})
+    calls = []
+
+    for name, cached in (("data.hourly", True), ("data.daily", True), ("now", False)):
+
+        def compute(data_handler, name=name):
+            calls.append(name)
+            return f"{name} of {data_handler.version}"
+
+        section(name, cached=cached)(compute)
+
+    return calls
+
+
+def test_resolve_fields(calls):
+    assert resolve_fields(None) == ["data.hourly", "data.daily", "now"]
+    assert resolve_fields("now, data") == ["data.hourly", "data.daily", "now"]
+    assert resolve_fields("data.daily") == ["data.daily"]
+
+    with pytest.raises(KeyError):
+        resolve_fields("data.monthly")
+
+
+def test_only_the_requested_sections_are_computed_once_per_dataset(calls):
+    data_handler = DataHandler()
+    builder = Payload(data_handler)
+
+    assert builder.build(["data.daily"]) == {"data": {"daily": "data.daily of 1.0"}}
+    builder.build(["data.daily", "now"])
+    builder.build(["data.daily", "now"])
+    assert calls == ["data.daily", "now", "now"]
+
+    data_handler.new_dataset()
+    assert builder.build(["data.daily"]) == {"data": {"daily": "data.daily of 2.0"}}
+    assert calls[-1] == "data.daily"
+
+
+def test_etag_changes_with_the_data_only(calls):
+    data_handler = DataHandler()
+    builder = Payload(data_handler)
+
+    etag = builder.etag(["data.daily"])
+    assert etag == builder.etag(["data.daily"])
+    assert etag != builder.etag(["data.hourly", "data.daily"])
+
+    # A section which changes by itself can't be validated.
+    assert builder.etag(["data.daily", "now"]) is None
+
+    data_handler.weather_version = 1.0
+    assert builder.etag(["data.daily"]) != etag
+    data_handler.new_dataset()
+    assert builder.etag(["data.daily"]) != etag
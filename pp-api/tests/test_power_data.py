@@ -0,0 +1,82 @@
+import pathlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from powerplot_api.power_data import PowerData
+
+TIMEZONE = "America/New_York"
+SAMPLE_PATH = pathlib.Path(__file__).parents[1] / "sample_data" / "sample.csv"
+
+
+def write_reads(path, start: str, periods: int, freq: str, value: float):
+    index = pd.date_range(start, periods=periods, freq=freq, tz=TIMEZONE)
+    df = pd.DataFrame({"value": value}, index=index.tz_convert("UTC"))
+    df.index.name = "datetime"
+    df.to_csv(path)
+
+
+def test_empty_raw_db_loads_from_the_archive(tmp_path):
+    db_path = tmp_path / "db.csv"
+    db_path.write_text("datetime,value\n")
+    write_reads(db_path.with_suffix(".hourly.csv"), "2025-03-05", 48, "h", 1.0)
+    write_reads(db_path.with_suffix(".daily.csv"), "2025-03-01", 4, "D", 24.0)
+
+    data = PowerData(db_path, timezone=TIMEZONE)
+    data.load_archive(db_path)
+
+    assert data.archive_end == pd.Timestamp("2025-03-07", tz=TIMEZONE)
+    assert data.daily()["value"].tolist() == [24.0] * 6
+    assert data.coverage("D")["coverage"].tolist() == [1.0] * 6
+
+
+def test_aggregates_match_a_plain_resample():
+    # What hourly(), daily() and monthly() were before the local calendar.
+    df = pd.read_csv(SAMPLE_PATH, index_col="datetime")
+    df.index = pd.to_datetime(df.index, utc=True).tz_convert(TIMEZONE)
+    df = df.sort_index()
+    df["value"] = df["value"].round(3)
+
+    data = PowerData(SAMPLE_PATH, timezone=TIMEZONE)
+    for aggregate, frequency in ((data.hourly, "h"), (data.daily, "D")):
+        expected = df["value"].resample(frequency).sum().round(2)
+        assert PowerData.to_json(aggregate()) == PowerData.to_json(expected.to_frame())
+
+    expected = df["value"].resample("ME").sum().round(2).round(0)
+    assert PowerData.to_json(data.monthly()) == PowerData.to_json(expected.to_frame())
+
+
+def test_backtest_matches_running_the_projection_every_day(tmp_path, monkeypatch):
+    # Four months without gaps, across the start of DST.
+    index = pd.date_range("2025-01-01", "2025-05-01", freq="15min", tz=TIMEZONE)
+    values = np.random.default_rng(0).uniform(0.0, 0.5, len(index) - 1).round(3)
+    df = pd.DataFrame({"value": values}, index=index[:-1].tz_convert("UTC"))
+    df.index.name = "datetime"
+    df.to_csv(tmp_path / "db.csv")
+
+    data = PowerData(tmp_path / "db.csv", timezone=TIMEZONE)
+    backtest = data.bill_backtest()
+
+    # The projection in kWh rather than dollars, on the data as of each day.
+    monkeypatch.setattr(PowerData, "bill", staticmethod(lambda kwh: kwh))
+    arrays = data.to_arrays()
+    daily = data.daily()["value"]
+    errors = {}
+
+    for day in daily.index:
+        if day.month in (1, 4):
+            # Only whole months are scored, the first and the last don't count.
+            continue
+        end = np.searchsorted(arrays["index"], (day + pd.DateOffset(days=1)).value)
+        truncated = PowerData.from_arrays(
+            {name: array[:end] for name, array in arrays.items()}, timezone=TIMEZONE
+        )
+        actual = daily[daily.index.month == day.month].sum()
+        errors.setdefault(day.day, []).append(truncated.bill_breakdown() - actual)
+
+    assert backtest.index.tolist() == list(range(1, 32))
+    assert backtest["days"].tolist() == [len(e) for e in errors.values()]
+    assert backtest["mean_error_kwh"].tolist() == pytest.approx(
+        [np.mean(e) for e in errors.values()], abs=0.005
+    )
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from powerplot_api.power_data import PowerData
+from powerplot_api.quality import DataQuality
+
+TIMEZONE = "America/New_York"
+
+
+def power_data(index: pd.DatetimeIndex) -> PowerData:
+    return PowerData.from_arrays(
+        {"index": index.asi8, "value": np.full(len(index), 0.1)}, TIMEZONE
+    )
+
+
+def reads(end: str) -> pd.DatetimeIndex:
+    index = pd.date_range("2025-03-01", end, freq="15min", tz=TIMEZONE)
+    # A six-hour outage on the 5th.
+    outage = (index >= "2025-03-05 10:00") & (index < "2025-03-05 16:00")
+    return index[~outage]
+
+
+def test_a_gap_across_the_boundary_is_one_gap():
+    quality = DataQuality()
+    # Settled up to 12:00 on the 5th, halfway through the outage.
+    quality.update(power_data(reads("2025-03-07 12:00")))
+    assert quality.settled_gaps[-1]["end"] == pd.Timestamp(
+        "2025-03-05 12:00", tz=TIMEZONE
+    )
+    quality.update(power_data(reads("2025-03-08 12:00")))
+
+    fresh = DataQuality()
+    fresh.update(power_data(reads("2025-03-08 12:00")))
+
+    assert quality.summary == fresh.summary
+    assert quality.summary["gaps"] == [
+        {
+            "start": "2025-03-05 10:00:00-05:00",
+            "end": "2025-03-05 16:00:00-05:00",
+            "hours": 6,
+            "missing_reads": 24,
+        }
+    ]
+
+
+def test_a_backfill_fills_a_settled_gap():
+    quality = DataQuality()
+    quality.update(power_data(reads("2025-03-10 12:00")))
+    assert quality.summary["gaps"]
+
+    backfilled = pd.date_range(
+        "2025-03-01", "2025-03-10 12:00", freq="15min", tz=TIMEZONE
+    )
+    quality.update(power_data(backfilled))
+    assert quality.summary["gaps"] == []
+    assert quality.summary["coverage"] == 1.0
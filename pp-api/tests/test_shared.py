@@ -0,0 +1,92 @@
+import os
+
+import pandas as pd
+import pytest
+
+from powerplot_api import data_handler, payload, shared
+from powerplot_api.data_handler import DataHandler
+from powerplot_api.payload import Payload, section
+from powerplot_api.power_data import PowerData
+from powerplot_api.shared import SharedDataHandler, SnapshotPublisher
+
+TIMEZONE = "America/New_York"
+
+
+class Total:
+    def __init__(self):
+        self.kwh = None
+
+    def update(self, data: PowerData):
+        self.kwh = data.df["value"].sum()
+
+
+def write_db(path, num_days: int):
+    index = pd.date_range(
+        "2025-03-01", periods=num_days * 96, freq="15min", tz=TIMEZONE
+    )
+    df = pd.DataFrame({"value": 0.25}, index=index.tz_convert("UTC"))
+    df.index.name = "datetime"
+    df.to_csv(path)
+    os.utime(path, (num_days, num_days))  # a new version for reload()
+
+
+@pytest.fixture
+def calls(tmp_path, monkeypatch) -> list:
+    """
+    A db, and a payload section recording when it's computed.
+    """
+
+    monkeypatch.setattr(data_handler, "DB_FILE_PATH", tmp_path / "db.csv")
+    monkeypatch.setattr(data_handler, "WEATHER_FILE_PATH", tmp_path / "weather.csv")
+    write_db(tmp_path / "db.csv", 2)
+
+    sections = {}
+    monkeypatch.setattr(payload, "SECTIONS", sections)
+    monkeypatch.setattr(shared, "SECTIONS", sections)
+    calls = []
+
+    @section("data.daily")
+    def daily(data_handler):
+        calls.append(data_handler)
+        return PowerData.to_json(data_handler.data.daily())
+
+    return calls
+
+
+def test_workers_attach_to_the_published_dataset(tmp_path, calls):
+    loader = DataHandler()
+    loader.register("total", Total)
+    publisher = SnapshotPublisher(loader, Payload(loader), tmp_path / "shared")
+
+    worker = SharedDataHandler(tmp_path / "shared")
+    with pytest.raises(FileNotFoundError):
+        worker.reload()
+
+    publisher.reload()
+    data = worker.reload()
+
+    assert PowerData.to_json(data.df) == PowerData.to_json(loader.data.df)
+    assert not data.df["value"].to_numpy().flags.writeable  # memory-mapped
+    assert worker.extension("total").kwh == 48.0
+    assert worker.version == loader.version
+
+    # The sections the loader computed are served as they are.
+    worker_payload = Payload(worker)
+    daily = worker_payload.build(["data.daily"])["data"]["daily"]
+    assert daily == PowerData.to_json(loader.data.daily())
+    assert calls == [loader]
+
+    # Nothing new, nothing to attach to.
+    publisher.reload()
+    assert worker.reload() is data
+
+    write_db(tmp_path / "db.csv", 3)
+    publisher.reload()
+    data = worker.reload()
+
+    assert len(data.df) == 3 * 96
+    assert worker.extension("total").kwh == 72.0
+    assert worker_payload.build(["data.daily"])["data"]["daily"] == PowerData.to_json(
+        data.daily()
+    )
+    assert calls == [loader, loader]
@@ -0,0 +1,18 @@
+import sys
+import json
+import subprocess
+
+# The data and the models are loaded on the first reload(), not at import.
+HEAVY_MODULES = ["pandas", "numpy", "pytz", "powerplot_api.power_data"]
+
+
+def test_entry_point_imports_lightly():
+    script = (
+        "import sys, json, powerplot_api.__main__; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    )
+
+    assert json.loads(result.stdout) == []
@@ -1,51 +1,20 @@
 import argparse
 import time
-import os
 from datetime import datetime, timedelta
 
-import pandas as pd
-
+# Keep the imports at the top light: a CLI invocation or a systemd restart on a Pi
+# shouldn't pay for pandas, aiohttp or the installation wizard before it needs them.
 from .provider import Provider
-from .provider_coned import ConEd
-from .config import config, get_db_name, DATA_DIR_PATH
-from .installation_wizard import main as installation_wizard
-
-try:
-    assert Provider(config["provider"]["provider_name"]) is not None
-except KeyError:
-    print("Configuration incomplete. Run installation wizard via TODO.")
-    exit(1)
-
-
-def append_to_db(data: pd.DataFrame):
-    DATA_FILE_PATH = DATA_DIR_PATH / get_db_name()
-
-    try:
-        db = pd.read_csv(DATA_FILE_PATH)
-        db["datetime"] = pd.to_datetime(db["datetime"])
-
-        merged_df = pd.concat([db, data])
-    except FileNotFoundError:
-        # This must be the very first write...
-        os.makedirs(DATA_DIR_PATH, exist_ok=True)
-        merged_df = data
-
-    # Drop duplicates and keep the last occurrence: new data overrides DB data.
-    merged_df = merged_df.drop_duplicates(subset="datetime", keep="last")
+from .scheduler import PollScheduler
 
-    merged_df.sort_values(by="datetime", inplace=True)
-    merged_df.set_index("datetime", inplace=True)
 
-    # Save the merged and sorted DataFrame to a new CSV file
-    merged_df.to_csv(DATA_FILE_PATH, index=True)
-    print(f"Saved the data to {DATA_FILE_PATH}")
-
-
-def get_power_consumption_data(provider_name: str, **kwargs):
+def connect_to_provider(provider_name: str, **kwargs):
     """
-    Wrapper for requesting power data from different energy providers.
+    Create a logged in client for the given energy provider.
     """
     if Provider(provider_name) == Provider.CONED:
+        from .provider_coned import ConEd
+
         required_keys = ["username", "password", "two_factor_auth_response"]
 
         for key in required_keys:
@@ -56,16 +25,221 @@ def get_power_consumption_data(provider_name: str, **kwargs):
             username=kwargs["username"],
             password=kwargs["password"],
             mfa=kwargs["two_factor_auth_response"],
+            base_url=kwargs.get("base_url"),
+            opower_url=kwargs.get("opower_url"),
         )
-        if not coned.login():
+
+        if kwargs.get("record_dir"):
+            from .mock_server import FixtureRecorder
+
+            coned.recorder = FixtureRecorder(
+                kwargs["record_dir"], secrets=[kwargs["username"], kwargs["password"]]
+            )
+
+        if not coned.connect():
             raise Exception("Failed to login.")
 
-        return coned.get_power_consumption_data()
+        return coned
     else:
         raise Exception("Unknown provider!")
 
 
-if __name__ == "__main__":
+def provider_options() -> dict:
+    """
+    Optional provider settings: "base_url" and "opower_url" to talk to something other
+    than the provider (e.g. `python -m powerplot_scraper.mock_server`), "record_dir"
+    to save the responses as fixtures for it.
+    """
+    from .config import config
+
+    return {
+        key: config.get(f"provider.{key}")
+        for key in ("base_url", "opower_url", "record_dir")
+    }
+
+
+def refresh_weather(db_path):
+    """
+    Keep the hourly temperatures next to the database current. Not worth failing
+    a poll over.
+    """
+    from .weather import update_weather
+
+    try:
+        update_weather(db_path)
+    except Exception as e:
+        print(f"Failed to update the weather: {e}")
+
+
+def get_scheduler(name: str) -> PollScheduler:
+    from .config import config, DATA_DIR_PATH
+
+    return PollScheduler(
+        state_path=DATA_DIR_PATH / f"scheduler_{name}.json",
+        base_interval=timedelta(hours=config.get("poll_frequency_hours", 6)),
+        min_interval=timedelta(minutes=config.get("poll_min_interval_minutes", 30)),
+    )
+
+
+def wait_for_next_poll(scheduler: PollScheduler):
+    next_poll_in = scheduler.next_delay().total_seconds()
+    next_poll_date = datetime.now() + timedelta(seconds=next_poll_in)
+
+    NUM_UPDATES = 4
+    for i in range(0, NUM_UPDATES):
+        print(
+            f"Next poll in {round((NUM_UPDATES-i)/NUM_UPDATES*next_poll_in/3600, 1)} hour(s) on {next_poll_date}."
+        )
+        time.sleep(next_poll_in / NUM_UPDATES)
+
+
+def get_power_consumption_data(provider_name: str, **kwargs):
+    """
+    Wrapper for requesting power data from different energy providers.
+    """
+    client = connect_to_provider(provider_name, **kwargs)
+    return client.get_power_consumption_data(since=kwargs.get("since"))
+
+
+def backfill(args: argparse.Namespace) -> bool:
+    import pandas as pd
+
+    from .config import config
+    from .backfill import Backfill
+
+    client = connect_to_provider(
+        provider_name=config["provider"]["provider_name"],
+        username=config["provider"]["credentials"]["username"],
+        password=config["provider"]["credentials"]["password"],
+        two_factor_auth_response=config["provider"]["credentials"][
+            "two_factor_auth_response"
+        ],
+        **provider_options(),
+    )
+    done = Backfill(
+        client,
+        start=pd.Timestamp(args.backfill[0], tz="UTC"),
+        end=pd.Timestamp(args.backfill[1], tz="UTC"),
+        chunk=pd.Timedelta(days=config.get("backfill.chunk_days", 7)),
+        workers=config.get("backfill.workers", 4),
+        rate=config.get("backfill.requests_per_second", 2.0),
+    ).run()
+
+    if done:
+        from .db import get_db_path
+
+        refresh_weather(get_db_path())
+
+    return done
+
+
+def import_green_button(args: argparse.Namespace) -> bool:
+    from .db import get_db_path
+    from .greenbutton import import_green_button
+
+    try:
+        num_reads = import_green_button(args.import_green_button)
+    except (OSError, ValueError, SyntaxError) as e:
+        # SyntaxError covers ElementTree's ParseError.
+        print(f"Failed to import {args.import_green_button}: {e}")
+        return False
+
+    if num_reads:
+        refresh_weather(get_db_path())
+
+    return True
+
+
+def poll_accounts(args: argparse.Namespace):
+    from .config import config
+    from . import multi_account
+
+    scheduler = get_scheduler("accounts")
+
+    while True:
+        print(f"Polling the data for {len(config['accounts'])} accounts...")
+        results = multi_account.poll(
+            config["accounts"],
+            limit_per_host=config.get("accounts_limit_per_host", 4),
+            no_merge=args.no_merge,
+        )
+
+        new_reads = [r for r in results.values() if not isinstance(r, Exception)]
+        if new_reads:
+            scheduler.record_poll(sum(new_reads))
+        else:
+            scheduler.record_failure()
+
+        if args.oneshot:
+            break
+
+        wait_for_next_poll(scheduler)
+
+
+def poll(args: argparse.Namespace):
+    import pandas as pd
+
+    from .config import config
+    from .db import append_to_db, get_db_path, read_last_timestamp
+
+    provider = Provider(config["provider"]["provider_name"])
+
+    scheduler = get_scheduler(get_db_path().stem)
+
+    while True:
+        print(f"Polling the data for provider {provider.value}...")
+        since = None if args.no_merge else read_last_timestamp(get_db_path())
+
+        try:
+            if provider == Provider.CONED:
+                data: pd.DataFrame = get_power_consumption_data(
+                    provider_name=config["provider"]["provider_name"],
+                    username=config["provider"]["credentials"]["username"],
+                    password=config["provider"]["credentials"]["password"],
+                    two_factor_auth_response=config["provider"]["credentials"][
+                        "two_factor_auth_response"
+                    ],
+                    since=since,
+                    **provider_options(),
+                )
+        except Exception as e:
+            if args.oneshot:
+                raise
+
+            print(f"Poll failed: {e}")
+            scheduler.record_failure()
+            wait_for_next_poll(scheduler)
+            continue
+
+        if data is None or data.empty:
+            if args.oneshot:
+                raise Exception("No data returned!")
+
+            print("No data returned!")
+            scheduler.record_poll(new_reads=0)
+            wait_for_next_poll(scheduler)
+            continue
+
+        new_reads = (
+            len(data) if since is None else int((data["datetime"] > since).sum())
+        )
+        print(f"Got {len(data)} reads, {new_reads} new.")
+        scheduler.record_poll(new_reads)
+
+        # Merge even without new reads: the ones we had may have been corrected.
+        if not args.no_merge:
+            print("Merging data...")
+            append_to_db(data)
+            if new_reads:
+                refresh_weather(get_db_path())
+
+        if args.oneshot:
+            break
+
+        wait_for_next_poll(scheduler)
+
+
+def main():
     parser = argparse.ArgumentParser()
 
     parser.add_argument(
@@ -86,47 +260,65 @@ if __name__ == "__main__":
         help="",
     )
 
+    parser.add_argument(
+        "--backfill",
+        nargs=2,
+        metavar=("START", "END"),
+        help="Fetch historical data from START up to, but not including, END "
+        "(YYYY-MM-DD, UTC) and quit. An interrupted backfill resumes when run again "
+        "with the same range.",
+    )
+
+    parser.add_argument(
+        "--import-green-button",
+        metavar="FILE",
+        help="Merge the reads of a Green Button (ESPI XML) download into the "
+        "database and quit. The file may be zipped or gzipped.",
+    )
+
+    parser.add_argument(
+        "--accounts",
+        action="store_true",
+        help='Poll all the accounts listed under "accounts" in the config concurrently.',
+    )
+
     args = parser.parse_args()
 
     if args.install:
+        from .installation_wizard import main as installation_wizard
+
         installation_wizard()
         exit(0)
 
-    provider = Provider(config["provider"]["provider_name"])
+    from .config import config
 
-    while True:
-        print(f"Polling the data for provider {provider.value}...")
-        if provider == Provider.CONED:
-            data: pd.DataFrame = get_power_consumption_data(
-                provider_name=config["provider"]["provider_name"],
-                username=config["provider"]["credentials"]["username"],
-                password=config["provider"]["credentials"]["password"],
-                two_factor_auth_response=config["provider"]["credentials"][
-                    "two_factor_auth_response"
-                ],
-            )
+    try:
+        if not config.get("accounts"):
+            assert Provider(config["provider"]["provider_name"]) is not None
+    except KeyError:
+        print("Configuration incomplete. Run installation wizard via TODO.")
+        exit(1)
 
-        if data is None or data.empty:
-            if not args.onesot:
-                print(
-                    "No date returned! Exiting, letting systemd restart in RestartSec."
-                )
+    has_provider = config.get("provider") is not None
+    if (args.backfill or args.import_green_button) and not has_provider:
+        print(
+            '--backfill and --import-green-button go into the "provider" account\'s '
+            "database, add one to the config."
+        )
+        exit(1)
 
-            raise Exception("No data returned!")
+    if args.backfill:
+        exit(0 if backfill(args) else 1)
 
-        if not args.no_merge:
-            print("Merging data...")
-            append_to_db(data)
+    if args.import_green_button:
+        exit(0 if import_green_button(args) else 1)
 
-        if args.oneshot:
-            break
+    # With only "accounts" configured, there's nothing else to poll.
+    if args.accounts or not has_provider:
+        poll_accounts(args)
+    else:
+        poll(args)
 
-        next_poll_in = config.get("poll_frequency_hours", 6) * 3600
-        next_poll_date = datetime.now() + timedelta(seconds=next_poll_in)
 
-        NUM_UPDATES = 4
-        for i in range(0, NUM_UPDATES):
-            print(
-                f"Next poll in {round(1/(i+1)*next_poll_in/3600, 1)} hour(s) on {next_poll_date}."
-            )
-            time.sleep(next_poll_in / NUM_UPDATES)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import shutil
+import pathlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Tuple
+
+import pandas as pd
+from requests.adapters import HTTPAdapter
+
+from .config import DATA_DIR_PATH
+from .db import append_to_db, get_db_path
+
+log = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Allow at most `rate` calls per second across all threads.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def split_range(
+    start: pd.Timestamp, end: pd.Timestamp, chunk: pd.Timedelta
+) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+    """
+    Split [start, end) into consecutive [chunk_start, chunk_end) ranges.
+    """
+
+    chunks = []
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + chunk, end)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+
+    return chunks
+
+
+class Backfill:
+    """
+    Fetch a historical range in chunks, concurrently, and merge it into the database.
+
+    Every finished chunk is checkpointed to disk (DATA_DIR/backfill/<run>/), so an
+    interrupted run picks up where it left off when started again with the same range.
+    The database is only written once, after all the chunks are in.
+    """
+
+    def __init__(
+        self,
+        client,
+        start: pd.Timestamp,
+        end: pd.Timestamp,
+        chunk: pd.Timedelta = pd.Timedelta(days=7),
+        workers: int = 4,
+        rate: float = 2.0,
+    ):
+        self.client = client
+        self.start = start
+        self.end = end
+        self.chunks = split_range(start, end, chunk)
+        self.workers = workers
+        self.rate_limiter = RateLimiter(rate)
+
+        run_name = (
+            f"{get_db_path().stem}_{start.strftime('%Y%m%d')}_{end.strftime('%Y%m%d')}"
+        )
+        self.checkpoint_dir: pathlib.Path = DATA_DIR_PATH / "backfill" / run_name
+
+        # Pool as many connections as there are workers, the default is 10 per host.
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.client.session.mount("https://", adapter)
+        self.client.session.mount("http://", adapter)
+
+    def checkpoint_path(self, chunk_start: pd.Timestamp) -> pathlib.Path:
+        return self.checkpoint_dir / f"{chunk_start.strftime('%Y%m%dT%H%M%S')}.csv"
+
+    def fetch_chunk(self, chunk_start: pd.Timestamp, chunk_end: pd.Timestamp):
+        self.rate_limiter.wait()
+        data = self.client.fetch_usage(start=chunk_start, end=chunk_end)
+
+        # Write to a temporary file first, a partial checkpoint must never be mistaken
+        # for a finished one.
+        path = self.checkpoint_path(chunk_start)
+        tmp_path = path.with_suffix(".tmp")
+        data[["datetime", "value"]].to_csv(tmp_path, index=False)
+        tmp_path.replace(path)
+
+        return len(data)
+
+    def run(self) -> bool:
+        """
+        Returns True if the whole range was fetched and merged.
+        """
+
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        self.client.resolve_meter()
+
+        pending = [
+            (chunk_start, chunk_end)
+            for chunk_start, chunk_end in self.chunks
+            if not self.checkpoint_path(chunk_start).exists()
+        ]
+        print(
+            f"Backfilling {self.start.date()} - {self.end.date()}: "
+            f"{len(self.chunks) - len(pending)}/{len(self.chunks)} chunks already done."
+        )
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(self.fetch_chunk, *chunk): chunk for chunk in pending
+            }
+            for future in as_completed(futures):
+                chunk_start, chunk_end = futures[future]
+                try:
+                    num_reads = future.result()
+                except Exception as e:
+                    failed += 1
+                    log.error(f"Chunk {chunk_start} - {chunk_end} failed: {e}")
+                else:
+                    print(f"Fetched {chunk_start} - {chunk_end}: {num_reads} reads.")
+
+        if failed:
+            print(
+                f"{failed} chunk(s) failed. Run the same backfill again to resume, "
+                f"finished chunks are kept in {self.checkpoint_dir}."
+            )
+            return False
+
+        frames = [
+            pd.read_csv(self.checkpoint_path(chunk_start))
+            for chunk_start, _ in self.chunks
+        ]
+        data = pd.concat(frames, ignore_index=True)
+
+        if not data.empty:
+            append_to_db(data)
+
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+        print(f"Backfill done: {len(data)} reads.")
+        return True
@@ -2,20 +2,16 @@ import pathlib
 import hashlib
 import json
 import os
-
-from jsonschema import validate, ValidationError
+from typing import Optional
 
 HOME_DIR: pathlib.Path = pathlib.Path("~").expanduser()
 
 # This is where the data AKA our simple .csv database is stored.
+# Note that the directories are created by whoever writes to them first, not on import.
 DATA_DIR_PATH: pathlib.Path = HOME_DIR / pathlib.Path(".local/share/powerplot")
-if not DATA_DIR_PATH.exists():
-    DATA_DIR_PATH.mkdir(parents=True, exist_ok=True)
 
 # Account credentials, preferences, etc.
 CONFIG_DIR_PATH: pathlib.Path = HOME_DIR / pathlib.Path(".config/powerplot")
-if not CONFIG_DIR_PATH.exists():
-    CONFIG_DIR_PATH.mkdir(parents=True, exist_ok=True)
 
 CONFIG_FILE_PATH: pathlib.Path = CONFIG_DIR_PATH / pathlib.Path("powerplot.json")
 
@@ -53,12 +49,20 @@ class Config:
         except json.JSONDecodeError as e:
             raise Exception("Corrupted config file, this is unhandled yet.") from e
 
-        with open(
-            pathlib.Path(__file__).parent.absolute()
-            / pathlib.Path("config_schema.json"),
-            "r",
-        ) as schema_file:
-            self.schema = json.load(schema_file)
+        self._schema = None
+
+    @property
+    def schema(self) -> dict:
+        # Only needed when the config is written to, don't load it on every start.
+        if self._schema is None:
+            with open(
+                pathlib.Path(__file__).parent.absolute()
+                / pathlib.Path("config_schema.json"),
+                "r",
+            ) as schema_file:
+                self._schema = json.load(schema_file)
+
+        return self._schema
 
     def save(self):
         with open(self.filepath, "w") as f:
@@ -82,6 +86,8 @@ class Config:
 
         current_dict[keys[-1]] = value
 
+        from jsonschema import validate, ValidationError
+
         try:
             validate(instance=current_dict, schema=self.schema)
         except ValidationError as e:
@@ -99,15 +105,54 @@ class Config:
         print(json.dumps(self.contents, indent=4))
 
 
-config = Config(CONFIG_FILE_PATH)  # from config import config
+def get_config() -> Config:
+    return Config(CONFIG_FILE_PATH)
+
+
+def __getattr__(name: str):
+    # `from .config import config` keeps working, but the config file is only
+    # read the first time someone actually asks for it.
+    if name == "config":
+        return get_config()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
+def get_timezone() -> str:
+    """
+    The local timezone of the power data: the one the installation wizard set up
+    with the location, or else the configured provider's.
+    """
 
-def get_db_name() -> pathlib.Path:
-    """ """
+    from .provider import Provider
+
+    config = get_config()
+    timezone = config.get("location.timezone")
+    if timezone:
+        return timezone
 
     try:
-        provider = config["provider"]["provider_name"].replace(" ", "").lower()
-        username = config["provider"]["credentials"]["username"]
+        return Provider(config.get("provider.provider_name")).timezone
+    except ValueError:
+        return Provider.CONED.timezone
+
+
+def get_db_name(
+    provider_name: Optional[str] = None, username: Optional[str] = None
+) -> pathlib.Path:
+    """
+    Database file name for an account, by default the configured "provider" one.
+    """
+
+    config = get_config()
+
+    try:
+        if provider_name is None:
+            provider_name = config["provider"]["provider_name"]
+        if username is None:
+            username = config["provider"]["credentials"]["username"]
+
+        provider = provider_name.replace(" ", "").lower()
 
         sha256 = hashlib.sha256()
         sha256.update(username.encode("utf-8"))
@@ -0,0 +1,82 @@
+import os
+import pathlib
+from typing import Optional
+
+import pandas as pd
+
+from .config import get_db_name, DATA_DIR_PATH
+from .publish import publish
+from .retention import RetentionPolicy
+
+
+def get_db_path(
+    provider_name: Optional[str] = None, username: Optional[str] = None
+) -> pathlib.Path:
+    return DATA_DIR_PATH / get_db_name(provider_name, username)
+
+
+def read_last_timestamp(filepath: pathlib.Path) -> Optional[pd.Timestamp]:
+    """
+    Read the latest timestamp in the database without loading the whole file.
+    The database is kept sorted, so that's the first column of the last line.
+    """
+
+    try:
+        with open(filepath, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - 4096))
+            tail = f.read().decode("utf-8", errors="ignore")
+    except FileNotFoundError:
+        return None
+
+    for line in reversed(tail.splitlines()):
+        line = line.strip()
+        if not line or line.startswith("datetime"):
+            continue
+
+        try:
+            return pd.Timestamp(line.split(",")[0]).tz_convert("UTC")
+        except ValueError:
+            return None
+
+    return None
+
+
+def append_to_db(
+    data: pd.DataFrame, filepath: Optional[pathlib.Path] = None, overwrite: bool = True
+):
+    """
+    Merge `data` into the db. Where both have a read, or the hourly archive has the
+    hour of it, `data`'s wins unless not `overwrite`, e.g. for historical imports.
+    """
+
+    DATA_FILE_PATH = filepath or get_db_path()
+
+    data = data.copy()
+    data["datetime"] = pd.to_datetime(data["datetime"], utc=True)
+
+    try:
+        db = pd.read_csv(DATA_FILE_PATH)
+        db["datetime"] = pd.to_datetime(db["datetime"], utc=True)
+
+        merged_df = pd.concat([db, data] if overwrite else [data, db])
+    except FileNotFoundError:
+        # This must be the very first write...
+        os.makedirs(DATA_DIR_PATH, exist_ok=True)
+        merged_df = data
+
+    # Drop duplicates and keep the last occurrence: new data overrides DB data,
+    # unless it went first.
+    merged_df = merged_df.drop_duplicates(subset="datetime", keep="last")
+
+    merged_df.sort_values(by="datetime", inplace=True)
+    merged_df.set_index("datetime", inplace=True)
+
+    # Roll what's past the raw retention up into the archive tiers.
+    retention = RetentionPolicy.from_config()
+    merged_df = retention.compact(merged_df, DATA_FILE_PATH, overwrite=overwrite)
+
+    # Save the merged and sorted DataFrame, atomically, and let pp-api know.
+    manifest = publish(merged_df, DATA_FILE_PATH, timezone=retention.timezone)
+    print(f"Saved the data to {DATA_FILE_PATH} (version {manifest['version']})")
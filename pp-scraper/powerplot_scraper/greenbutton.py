@@ -0,0 +1,249 @@
+import gzip
+import pathlib
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import IO, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# ESPI units of measure (uom) we can turn into kWh, with the factor to get there.
+ENERGY_UNITS = {72: 1e-3}  # Wh
+
+# flowDirection of the energy delivered to the customer, rather than exported.
+FORWARD = 1
+
+BATCH_SIZE = 100_000  # reads converted to arrays at a time
+
+
+def local_name(tag: str) -> str:
+    # "{http://naesb.org/espi}IntervalReading" -> "IntervalReading"
+    return tag.rsplit("}", 1)[-1]
+
+
+class ReadingType:
+    def __init__(self, element: ET.Element):
+        fields = {
+            local_name(child.tag): (child.text or "").strip() for child in element
+        }
+
+        self.uom = int(fields.get("uom") or 72)
+        self.multiplier = int(fields.get("powerOfTenMultiplier") or 0)
+        self.flow_direction = int(fields.get("flowDirection") or FORWARD)
+
+    @property
+    def scale(self) -> Optional[float]:
+        """
+        What the IntervalReading values are multiplied by for kWh, None if they
+        aren't energy delivered to the customer.
+        """
+
+        if self.uom not in ENERGY_UNITS or self.flow_direction != FORWARD:
+            return None
+
+        return ENERGY_UNITS[self.uom] * 10.0**self.multiplier
+
+
+class GreenButtonFile:
+    """
+    The interval data of a Green Button "Download My Data" file: an Atom feed of
+    ESPI entries (UsagePoints, MeterReadings, ReadingTypes and IntervalBlocks)
+    which can span years and hundreds of MB of XML.
+
+    The file is parsed incrementally and every entry (or IntervalReading, blocks can
+    be huge too) is dropped as soon as it's been read, so memory only grows with
+    the reads collected, which are handed over as arrays BATCH_SIZE at a time.
+
+    The ReadingType of an IntervalBlock is found through the links, the block's "up"
+    is its MeterReading, whose "related" is the ReadingType. Files which don't link
+    them get the last ReadingType before the block. Reads which aren't energy
+    delivered to the customer (e.g. exported to the grid) are skipped.
+    """
+
+    def __init__(self, path: pathlib.Path, batch_size: int = BATCH_SIZE):
+        self.path = pathlib.Path(path)
+        self.batch_size = batch_size
+
+        self.reading_types: Dict[str, ReadingType] = {}  # by self link
+        self.meter_readings: Dict[str, str] = {}  # self link -> ReadingType link
+        self.last_reading_type: Optional[ReadingType] = None
+
+        self.num_reads = 0
+        self.num_skipped = 0
+        self.durations = set()  # of the intervals read, in seconds
+
+    def open(self) -> IO[bytes]:
+        """
+        The XML, also from the .zip or .xml.gz it's often downloaded as.
+        """
+
+        if zipfile.is_zipfile(self.path):
+            archive = zipfile.ZipFile(self.path)
+            names = [n for n in archive.namelist() if n.lower().endswith(".xml")]
+            if not names:
+                raise ValueError(f"No XML file in {self.path}")
+            return archive.open(names[0])
+
+        if self.path.suffix == ".gz":
+            return gzip.open(self.path, "rb")
+
+        return open(self.path, "rb")
+
+    def scale_for(self, links: Dict[str, List[str]]) -> Optional[float]:
+        reading_type = None
+        for up in links.get("up", []):
+            meter_reading = up.rsplit("/IntervalBlock", 1)[0]
+            reading_type = self.reading_types.get(
+                self.meter_readings.get(meter_reading)
+            )
+            if reading_type is not None:
+                break
+
+        reading_type = reading_type or self.last_reading_type
+        if reading_type is None:
+            # Nothing says otherwise, assume the common case.
+            return ENERGY_UNITS[72]
+
+        return reading_type.scale
+
+    def batches(self) -> Iterator[pd.DataFrame]:
+        """
+        DataFrames of "datetime" (UTC) and "value" (kWh), in file order.
+        """
+
+        starts, durations, values = [], [], []
+        links: Dict[str, List[str]] = {}
+        scale: Optional[float] = None
+        root = None
+        parents = []
+
+        with self.open() as f:
+            for event, element in ET.iterparse(f, events=("start", "end")):
+                name = local_name(element.tag)
+
+                if event == "start":
+                    if root is None:
+                        root = element
+                    if name == "entry":
+                        links, scale = {}, None
+                    elif name == "IntervalBlock":
+                        scale = self.scale_for(links)
+                    parents.append(element)
+                    continue
+
+                parents.pop()
+
+                if name == "link":
+                    links.setdefault(element.get("rel"), []).append(element.get("href"))
+                elif name == "ReadingType":
+                    reading_type = ReadingType(element)
+                    for href in links.get("self", []):
+                        self.reading_types[href] = reading_type
+                    self.last_reading_type = reading_type
+                elif name == "MeterReading":
+                    related = [
+                        h for h in links.get("related", []) if "ReadingType" in h
+                    ]
+                    for href in links.get("self", []):
+                        if related:
+                            self.meter_readings[href] = related[0]
+                elif name == "IntervalReading":
+                    if scale is None:
+                        self.num_skipped += 1
+                    else:
+                        start, duration, value = self.read(element)
+                        if value is not None:
+                            starts.append(start)
+                            durations.append(duration)
+                            values.append(value * scale)
+
+                    # Done with it, don't let a year-long block pile up.
+                    parents[-1].remove(element)
+
+                    if len(starts) >= self.batch_size:
+                        yield self.batch(starts, durations, values)
+                        starts, durations, values = [], [], []
+                elif name == "entry":
+                    root.clear()
+
+        if starts:
+            yield self.batch(starts, durations, values)
+
+    @staticmethod
+    def read(element: ET.Element):
+        start = duration = value = None
+        for child in element:
+            child_name = local_name(child.tag)
+            if child_name == "timePeriod":
+                for field in child:
+                    if local_name(field.tag) == "start":
+                        start = int(field.text)
+                    elif local_name(field.tag) == "duration":
+                        duration = int(field.text)
+            elif child_name == "value":
+                value = int(child.text)
+
+        if start is None:
+            return None, None, None
+        return start, duration, value
+
+    def batch(self, starts: list, durations: list, values: list) -> pd.DataFrame:
+        self.num_reads += len(starts)
+        self.durations.update(d for d in set(durations) if d is not None)
+
+        return pd.DataFrame(
+            {
+                "datetime": pd.to_datetime(
+                    np.asarray(starts, dtype=np.int64), unit="s", utc=True
+                ),
+                "value": np.asarray(values, dtype=np.float64).round(4),
+            }
+        )
+
+
+def import_green_button(path: pathlib.Path, db_path: Optional[pathlib.Path] = None):
+    """
+    Merge the reads of a Green Button file into the database, batch by batch. The
+    reads the db (or its archive) already has are kept, the scraper's are at least
+    as recent as any export.
+
+    Each batch holds back its last hour for the next one, so that no hour is
+    merged in two parts: a partial hour doesn't replace an archived one.
+    """
+
+    from .config import get_timezone
+    from .db import append_to_db
+
+    green_button = GreenButtonFile(path)
+    timezone = get_timezone()
+    num_merged = 0
+    held_back = None
+
+    for batch in green_button.batches():
+        if held_back is not None:
+            batch = pd.concat([held_back, batch], ignore_index=True)
+
+        last_hour = batch["datetime"].max().tz_convert(timezone).floor("h")
+        last = batch["datetime"] >= last_hour
+        held_back = batch[last]
+
+        if not last.all():
+            append_to_db(batch[~last], filepath=db_path, overwrite=False)
+            num_merged += int((~last).sum())
+
+    if held_back is not None and not held_back.empty:
+        append_to_db(held_back, filepath=db_path, overwrite=False)
+        num_merged += len(held_back)
+
+    print(
+        f"Read {green_button.num_reads} reads from {path}"
+        + (f", skipped {green_button.num_skipped}" if green_button.num_skipped else "")
+        + "."
+    )
+    if green_button.durations - {900}:
+        print(
+            f"Warning: intervals of {sorted(int(d) for d in green_button.durations)} "
+            "seconds, pp-api expects 15-minute reads."
+        )
+
+    return num_merged
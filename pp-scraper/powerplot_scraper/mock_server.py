@@ -0,0 +1,519 @@
+"""
+A local stand-in for the ConEd and OPOWER endpoints the scraper talks to, so that the
+login flow, the usage calls and the merge pipeline can be exercised, load-tested and
+benchmarked without hitting coned.com.
+
+    python -m powerplot_scraper.mock_server --port 8765 --mfa 123456 --latency-ms 150
+
+then point the scraper at it in powerplot.json:
+
+    "provider": {
+        "provider_name": "Con Edison",
+        "base_url": "http://localhost:8765/sitecore/api/ssc",
+        "opower_url": "http://localhost:8765/ei/edge/apis",
+        ...
+    }
+
+Responses are synthesized by default. With --fixtures, the metadata, meters and usage
+responses recorded from the real thing (see FixtureRecorder, "provider.record_dir" in
+the config) are served instead; the login and token flow is always the mock's own.
+"""
+
+import re
+import json
+import math
+import time
+import uuid
+import base64
+import random
+import pathlib
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+BASE_PATH = "/sitecore/api/ssc"
+OPOWER_PATH = "/ei/edge/apis"
+
+SESSION_COOKIE = "mock_session"
+
+# URL path patterns of the endpoints ConEd uses, by the name their fixtures are saved under.
+ENDPOINTS: List[Tuple[str, re.Pattern]] = [
+    ("login", re.compile(r"/ConEdWeb-Foundation-Login-Areas-LoginAPI/User/0/Login$")),
+    (
+        "verify_factor",
+        re.compile(r"/ConEdWeb-Foundation-Login-Areas-LoginAPI/User/0/VerifyFactor$"),
+    ),
+    (
+        "token",
+        re.compile(
+            r"/ConEd-Cms-Services-Controllers-Opower/OpowerService/0/GetOPowerToken$"
+        ),
+    ),
+    ("auth_redirect", re.compile(r"/auth-redirect$")),
+    ("metadata", re.compile(r"/DataBrowser-v1/cws/metadata$")),
+    ("usage", re.compile(r"/cws/cned/accounts/[^/]+/meters/[^/]+/usage$")),
+    ("meters", re.compile(r"/cws/cned/accounts/[^/]+/meters$")),
+]
+
+
+def endpoint_name(path: str) -> Optional[str]:
+    for name, pattern in ENDPOINTS:
+        if pattern.search(path):
+            return name
+
+    return None
+
+
+class FixtureRecorder:
+    """
+    Save the responses of a real session as fixtures the mock server can replay,
+    one file per endpoint, e.g. <directory>/usage.json:
+
+    {
+        "status": 200,
+        "content_type": "application/json",
+        "body": "..."
+    }
+
+    Credentials, tokens, emails and anything that looks personal are scrubbed before
+    the response hits the disk.
+    """
+
+    JWT_PATTERN = re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]*")
+    EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+    SENSITIVE_KEYS = ("name", "address", "email", "phone", "premise", "customer")
+
+    def __init__(self, directory: pathlib.Path, secrets: List[str]):
+        self.directory = pathlib.Path(directory)
+        self.secrets = [s for s in secrets if s]
+
+    def scrub_text(self, text: str) -> str:
+        for secret in self.secrets:
+            text = text.replace(secret, "REDACTED")
+
+        text = self.JWT_PATTERN.sub("REDACTED", text)
+        return self.EMAIL_PATTERN.sub("redacted@example.com", text)
+
+    def scrub(self, value):
+        if isinstance(value, dict):
+            return {
+                k: (
+                    "REDACTED"
+                    if isinstance(v, str)
+                    and any(s in k.lower() for s in self.SENSITIVE_KEYS)
+                    else self.scrub(v)
+                )
+                for k, v in value.items()
+            }
+        if isinstance(value, list):
+            return [self.scrub(v) for v in value]
+        if isinstance(value, str):
+            return self.scrub_text(value)
+
+        return value
+
+    def record(self, url: str, status: int, content_type: str, body: str):
+        name = endpoint_name(urlparse(url).path)
+        if name is None:
+            return
+
+        try:
+            body = json.dumps(self.scrub(json.loads(body)))
+        except ValueError:
+            body = self.scrub_text(body)
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / f"{name}.json", "w") as f:
+            json.dump(
+                {"status": status, "content_type": content_type, "body": body},
+                f,
+                indent=4,
+            )
+
+
+class MockConEd:
+    """
+    The state and behavior of the stand-in: the accounts' credentials are whatever
+    the first login says they are, the rest is configurable.
+
+    - `mfa`: require two-factor auth with this code.
+    - `latency` (seconds) plus up to `jitter` more on every response.
+    - `error_rate`: fraction of requests failing with a 503.
+    - `token_ttl` (seconds): how long OPOWER tokens are accepted, after that it's 401.
+    - `days`, `read_minutes`: the default usage window and the read interval, i.e.
+      how big the usage payloads get.
+    - `fixtures`: directory of recorded responses to serve instead of synthesized ones.
+    """
+
+    def __init__(
+        self,
+        mfa: Optional[str] = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        token_ttl: float = 15 * 60,
+        days: int = 30,
+        read_minutes: int = 15,
+        fixtures: Optional[pathlib.Path] = None,
+        seed: Optional[int] = None,
+    ):
+        self.mfa = mfa
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.token_ttl = token_ttl
+        self.days = days
+        self.read_minutes = read_minutes
+        self.fixtures = pathlib.Path(fixtures) if fixtures else None
+        self.random = random.Random(seed)
+
+        self.lock = threading.Lock()
+        self.sessions: Dict[str, str] = {}  # session cookie -> username
+        self.pending_mfa: Dict[str, str] = {}  # session cookie -> username
+        self.tokens: Dict[str, float] = {}  # token -> expiry
+        self.stats: Dict[str, int] = {}
+
+    def count(self, name: str):
+        with self.lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+    def fixture(self, name: str) -> Optional[dict]:
+        if self.fixtures is None:
+            return None
+
+        try:
+            with open(self.fixtures / f"{name}.json", "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def issue_token(self) -> str:
+        expires_at = time.time() + self.token_ttl
+
+        def encode(part: dict) -> str:
+            return (
+                base64.urlsafe_b64encode(json.dumps(part).encode()).decode().rstrip("=")
+            )
+
+        token = ".".join(
+            [
+                encode({"alg": "none", "typ": "JWT"}),
+                encode({"exp": int(expires_at), "jti": uuid.uuid4().hex}),
+                "",
+            ]
+        )
+        with self.lock:
+            self.tokens[token] = expires_at
+
+        return token
+
+    def token_valid(self, authorization: Optional[str]) -> bool:
+        token = (authorization or "").replace("Bearer ", "")
+        with self.lock:
+            return self.tokens.get(token, 0) > time.time()
+
+    def usage(self, start: Optional[str], end: Optional[str]) -> dict:
+        """
+        15 minute reads (by default) with a daily cycle and some noise, deterministic
+        for a given timestamp so that overlapping polls agree.
+        """
+
+        step = timedelta(minutes=self.read_minutes)
+        now = datetime.now(timezone.utc)
+        # Like the real thing, the data lags a little behind.
+        end_dt = now - timedelta(hours=1)
+        if end:
+            end_dt = min(datetime.fromisoformat(end), end_dt)
+        start_dt = (
+            datetime.fromisoformat(start)
+            if start
+            else end_dt - timedelta(days=self.days)
+        )
+
+        # Align to the read interval.
+        epoch = int(start_dt.timestamp())
+        t = datetime.fromtimestamp(
+            epoch - epoch % int(step.total_seconds()), tz=timezone.utc
+        )
+
+        reads = []
+        while t < end_dt:
+            hour = t.hour + t.minute / 60
+            noise = random.Random(int(t.timestamp())).random()
+            value = (
+                0.05
+                + 0.1 * (1 + math.sin((hour - 14) / 24 * 2 * math.pi))
+                + 0.1 * noise
+            )
+            reads.append(
+                {
+                    "startTime": t.isoformat(),
+                    "endTime": (t + step).isoformat(),
+                    "value": round(value, 4),
+                    "providedCost": None,
+                }
+            )
+            t += step
+
+        return {"reads": reads, "unit": "KWH"}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    server: "MockServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def mock(self) -> MockConEd:
+        return self.server.mock
+
+    def session_id(self) -> Optional[str]:
+        for cookie in self.headers.get("Cookie", "").split(";"):
+            name, _, value = cookie.strip().partition("=")
+            if name == SESSION_COOKIE:
+                return value
+
+        return None
+
+    def respond(
+        self,
+        status: int,
+        body=None,
+        content_type: str = "application/json",
+        headers: Optional[dict] = None,
+    ):
+        if not isinstance(body, (str, bytes)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def replay(self, name: str) -> bool:
+        fixture = self.mock.fixture(name)
+        if fixture is None:
+            return False
+
+        self.respond(fixture["status"], fixture["body"], fixture["content_type"])
+        return True
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_POST(self):
+        self.handle_request()
+
+    def handle_request(self):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length", 0))
+        data = json.loads(self.rfile.read(length)) if length else {}
+
+        if url.path == "/_mock/stats":
+            return self.respond(200, self.mock.stats)
+
+        name = endpoint_name(url.path)
+        if name is None:
+            return self.respond(404, {"error": f"{url.path} is not mocked."})
+
+        self.mock.count(name)
+
+        if self.mock.latency or self.mock.jitter:
+            time.sleep(
+                self.mock.latency + self.mock.random.uniform(0, self.mock.jitter)
+            )
+
+        if self.mock.random.random() < self.mock.error_rate:
+            self.mock.count("errors")
+            return self.respond(503, {"error": "Service Unavailable"})
+
+        getattr(self, name)(data, query)
+
+    def login(self, data: dict, query: dict):
+        session_id = uuid.uuid4().hex
+        cookie = {"Set-Cookie": f"{SESSION_COOKIE}={session_id}; Path=/"}
+        redirect = f"{self.server.url}/auth-redirect"
+
+        if not data.get("LoginEmail") or not data.get("LoginPassword"):
+            return self.respond(
+                200, {"login": False, "loginErrorMsg": "Missing credentials"}
+            )
+
+        if self.mock.mfa:
+            with self.mock.lock:
+                self.mock.pending_mfa[session_id] = data["LoginEmail"]
+            body = {
+                "login": True,
+                "newDevice": True,
+                "noMfa": False,
+                "newDeviceText": "Enter the code we sent to: Verification code",
+            }
+        else:
+            with self.mock.lock:
+                self.mock.sessions[session_id] = data["LoginEmail"]
+            body = {"login": True, "authRedirectUrl": redirect}
+
+        self.respond(200, body, headers=cookie)
+
+    def verify_factor(self, data: dict, query: dict):
+        session_id = self.session_id()
+        with self.mock.lock:
+            username = self.mock.pending_mfa.get(session_id)
+            if username is None or data.get("MFACode") != self.mock.mfa:
+                body = {"code": ""}
+            else:
+                del self.mock.pending_mfa[session_id]
+                self.mock.sessions[session_id] = username
+                body = {
+                    "code": uuid.uuid4().hex,
+                    "authRedirectUrl": f"{self.server.url}/auth-redirect",
+                }
+
+        self.respond(200, body)
+
+    def auth_redirect(self, data: dict, query: dict):
+        if self.session_id() not in self.mock.sessions:
+            return self.respond(401, {"error": "Not logged in"})
+
+        self.respond(200, "<html></html>", "text/html")
+
+    def token(self, data: dict, query: dict):
+        if self.session_id() not in self.mock.sessions:
+            return self.respond(401, {"error": "Not logged in"})
+
+        self.respond(200, f'"{self.mock.issue_token()}"', "text/plain")
+
+    def authorized(self) -> bool:
+        if self.mock.token_valid(self.headers.get("authorization")):
+            return True
+
+        self.respond(401, {"error": "Invalid or expired token"})
+        return False
+
+    def metadata(self, data: dict, query: dict):
+        if not self.authorized() or self.replay("metadata"):
+            return
+
+        self.respond(
+            200,
+            {
+                "fuelTypeServicePoint": {
+                    "ELECTRICITY": [{"accountUuid": "mock-account-uuid"}]
+                }
+            },
+        )
+
+    def meters(self, data: dict, query: dict):
+        if not self.authorized() or self.replay("meters"):
+            return
+
+        self.respond(200, {"meters_ids": ["mock-meter-id"]})
+
+    def usage(self, data: dict, query: dict):
+        if not self.authorized() or self.replay("usage"):
+            return
+
+        self.respond(200, self.mock.usage(query.get("startDate"), query.get("endDate")))
+
+
+class MockServer(ThreadingHTTPServer):
+    """
+    Runs in the background when used as a context manager:
+
+        with MockServer(MockConEd(mfa="123456")) as server:
+            coned = ConEd(..., base_url=server.base_url, opower_url=server.opower_url)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, mock: MockConEd, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), MockHandler)
+        self.mock = mock
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        # By a hostname: aiohttp's cookie jar ignores cookies set by bare IP addresses.
+        host, port = self.server_address[:2]
+        if host in ("127.0.0.1", "0.0.0.0"):
+            host = "localhost"
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self) -> str:
+        return self.url + BASE_PATH
+
+    @property
+    def opower_url(self) -> str:
+        return self.url + OPOWER_PATH
+
+    def __enter__(self) -> "MockServer":
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local stand-in for the ConEd and OPOWER endpoints."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--mfa", help="Require two-factor auth with this code.")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Fraction of requests failing."
+    )
+    parser.add_argument(
+        "--token-ttl", type=float, default=15 * 60, help="OPOWER token lifetime (s)."
+    )
+    parser.add_argument(
+        "--days", type=int, default=30, help="Default usage window (days)."
+    )
+    parser.add_argument("--read-minutes", type=int, default=15)
+    parser.add_argument("--fixtures", type=pathlib.Path, help="Recorded responses.")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    mock = MockConEd(
+        mfa=args.mfa,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate,
+        token_ttl=args.token_ttl,
+        days=args.days,
+        read_minutes=args.read_minutes,
+        fixtures=args.fixtures,
+        seed=args.seed,
+    )
+    server = MockServer(mock, args.host, args.port)
+
+    print(f"base_url:   {server.base_url}")
+    print(f"opower_url: {server.opower_url}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from typing import List
+
+import aiohttp
+
+from .provider import Provider
+from .provider_coned_async import AsyncConEd
+from .db import append_to_db, get_db_path, read_last_timestamp
+from .weather import update_weather
+
+log = logging.getLogger(__name__)
+
+
+async def poll_account(
+    account: dict, connector: aiohttp.BaseConnector, no_merge: bool = False
+) -> int:
+    """
+    Poll a single account and merge the data into the account's own database.
+    Returns the number of new reads, i.e. the ones we didn't have yet.
+    """
+
+    provider_name = account["provider_name"]
+    credentials = account["credentials"]
+
+    if Provider(provider_name) != Provider.CONED:
+        raise Exception("Unknown provider!")
+
+    db_path = get_db_path(provider_name, credentials["username"])
+
+    client = AsyncConEd(
+        username=credentials["username"],
+        password=credentials["password"],
+        mfa=credentials.get("two_factor_auth_response"),
+        connector=connector,
+        base_url=account.get("base_url"),
+        opower_url=account.get("opower_url"),
+    )
+    try:
+        if not await client.connect():
+            raise Exception(f"{client.username}: failed to login.")
+
+        since = None if no_merge else read_last_timestamp(db_path)
+        data = await client.get_power_consumption_data(since=since)
+    finally:
+        await client.close()
+
+    new_reads = len(data) if since is None else int((data["datetime"] > since).sum())
+
+    # Merge even without new reads: the ones we had may have been corrected.
+    if not no_merge and not data.empty:
+        # pandas would block the event loop, merge in a worker thread.
+        await asyncio.to_thread(append_to_db, data, db_path)
+
+    if not no_merge and new_reads:
+        try:
+            await asyncio.to_thread(update_weather, db_path, account.get("location"))
+        except Exception as e:
+            log.warning(f"{client.username}: failed to update the weather: {e}")
+
+    return new_reads
+
+
+async def poll_accounts(
+    accounts: List[dict], limit_per_host: int = 4, no_merge: bool = False
+) -> dict:
+    """
+    Poll all the accounts concurrently over one shared connection pool, at most
+    `limit_per_host` connections to any one host at a time.
+
+    Returns {username: number of new reads or the exception raised}.
+    """
+
+    connector = aiohttp.TCPConnector(limit_per_host=limit_per_host)
+    try:
+        results = await asyncio.gather(
+            *(poll_account(account, connector, no_merge) for account in accounts),
+            return_exceptions=True,
+        )
+    finally:
+        await connector.close()
+
+    return {
+        account["credentials"]["username"]: result
+        for account, result in zip(accounts, results)
+    }
+
+
+def poll(accounts: List[dict], limit_per_host: int = 4, no_merge: bool = False) -> dict:
+    results = asyncio.run(poll_accounts(accounts, limit_per_host, no_merge))
+
+    for username, result in results.items():
+        if isinstance(result, Exception):
+            print(f"{username}: poll failed: {result}")
+        else:
+            print(f"{username}: {result} new reads.")
+
+    return results
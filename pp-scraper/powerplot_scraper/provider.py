@@ -8,6 +8,14 @@ class Provider(Enum):
 
     CONED = "Con Edison"
 
+    @property
+    def timezone(self) -> str:
+        """
+        Where the provider's customers are, i.e. the timezone their reads are in.
+        """
+
+        return {Provider.CONED: "America/New_York"}[self]
+
     @classmethod
     def values(cls):
         return [v.value for v in cls]
@@ -2,51 +2,125 @@
 import os
 import time
 import json
+import base64
 import pathlib
 import logging
+import threading
 
-from typing import Union, Optional
+from typing import TYPE_CHECKING, List, Union, Optional
 import requests
+import numpy as np
 import pandas as pd
 
-from .utils import Prompt
+from .utils import Prompt, JSONArrayStream
+
+if TYPE_CHECKING:
+    # cryptography is only imported once a session is read or written.
+    from cryptography.fernet import Fernet
 
 log = logging.getLogger(__name__)
-log.setLevel("DEBUG")
 
 
-class ConEd:
+class UsageReads:
+    """
+    Collects usage reads into compact timestamp (UTC, ns) and value arrays.
+
+    Timestamps are parsed in vectorized batches, so at no point do we keep more
+    than BATCH_SIZE reads around as Python objects.
+    """
+
+    BATCH_SIZE = 4096
+
+    def __init__(self):
+        self.start_times: List[str] = []
+        self.values: List[float] = []
+        self.timestamp_parts: List[np.ndarray] = []
+        self.value_parts: List[np.ndarray] = []
+
+    def add(self, read: dict):
+        value = read.get("value")
+        if value is None:
+            return
+
+        self.start_times.append(read["startTime"])
+        self.values.append(value)
+
+        if len(self.values) >= self.BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.values:
+            return
+
+        self.timestamp_parts.append(
+            pd.to_datetime(self.start_times, utc=True).asi8.copy()
+        )
+        self.value_parts.append(np.asarray(self.values, dtype=np.float64))
+        self.start_times, self.values = [], []
+
+    def to_frame(
+        self,
+        start: Optional[pd.Timestamp] = None,
+        end: Optional[pd.Timestamp] = None,
+    ) -> pd.DataFrame:
+        """
+        DataFrame of "value" and "datetime" (UTC), trimmed to [start, end).
+        """
+
+        self.flush()
+
+        timestamps = np.concatenate(self.timestamp_parts or [np.empty(0, np.int64)])
+        values = np.concatenate(self.value_parts or [np.empty(0, np.float64)])
+
+        # Don't rely on the server honoring the range.
+        mask = np.ones(len(timestamps), dtype=bool)
+        if start is not None:
+            mask &= timestamps >= start.value
+        if end is not None:
+            mask &= timestamps < end.value
+
+        return pd.DataFrame(
+            {
+                "value": values[mask],
+                "datetime": pd.to_datetime(timestamps[mask], unit="ns", utc=True),
+            }
+        )
+
+
+class ConEdAccount:
+    """
+    What a ConEd client knows about an account: the meter ID and account UUID
+    (cached), the persisted session and where to find the usage. Without any HTTP
+    client of its own, so that ConEd and AsyncConEd can both build on it.
+    """
+
     cache_file_path = pathlib.Path("~").expanduser() / pathlib.Path(
         ".config/powerplot/provider_conedison.json"
     )
+    session_file_path = pathlib.Path("~").expanduser() / pathlib.Path(
+        ".config/powerplot/provider_conedison_session.json"
+    )
 
-    @classmethod
-    def wizard(cls):
-        username = Prompt.input("Enter your username:")
-        password = Prompt.input("Enter your password:")
-        coned = cls(username, password, use_cached_credentials=False)
+    HEADERS = {
+        "Accept": "*/*",
+        "Connection": "keep-alive",
+        "Content-Type": "application/json",
+        "Origin": "https://www.coned.com",
+        "Referer": "https://www.coned.com/",
+    }
 
-        try:
-            coned.login()
-        except Exception as e:
-            print(str(e))
-            return None
+    BASE_URL = "https://www.coned.com/sitecore/api/ssc"
+    OPOWER_URL = "https://cned.opower.com/ei/edge/apis"
 
-        print("Logged in successfully. Trying to access power usage data...")
+    RETURN_URL = "%2Fen%2Faccounts-billing%2Fmy-account%2Fenergy-use%3Ftab1%3DsectionRealTimeData-2"
 
-        try:
-            coned.get_power_consumption_data()
-        except Exception as e:
-            print(str(e))
-            return None
+    # How long we trust a persisted session if the OPOWER token doesn't say otherwise.
+    SESSION_TTL_SECONDS = 15 * 60
 
-        print("All good! Your account is configured.")
-
-        return {
-            "username": coned.username,
-            "password": coned.password,
-            "two_factor_auth_response": coned.mfa,
-        }
+    # Incremental polls re-fetch this much before the latest stored read...
+    INCREMENTAL_OVERLAP = pd.Timedelta(hours=2)
+    # ...unless that read is older than this, then we ask for the wide window instead.
+    INCREMENTAL_MAX_GAP = pd.Timedelta(days=2)
 
     def __init__(
         self,
@@ -54,28 +128,38 @@ class ConEd:
         password: str,
         mfa: Optional[str] = None,
         use_cached_credentials: bool = True,
+        base_url: Optional[str] = None,
+        opower_url: Optional[str] = None,
     ):
+        """
+        `base_url` and `opower_url` point the client somewhere other than ConEd and
+        OPOWER, e.g. the local stand-in in mock_server.py.
+        """
+
         self.meter_id = None
         self.account_uuid = None
-        self.data = None
         self.username = username
         self.password = password
         self.mfa = mfa
-        self.base_url = "https://www.coned.com/sitecore/api/ssc"
-        self.session = requests.Session()  # self.session.cookies
-        self.session.headers.update(
-            {
-                "Accept": "*/*",
-                "Connection": "keep-alive",
-                "Content-Type": "application/json",
-                "Origin": "https://www.coned.com",
-                "Referer": "https://www.coned.com/",
-            }
-        )
+        self.base_url = base_url or self.BASE_URL
+        self.opower_url = opower_url or self.OPOWER_URL
 
         if use_cached_credentials:
             self.load_cache()
 
+    @property
+    def cache_key(self) -> str:
+        """
+        What the cache and the session are stored under: the username, plus the URLs
+        when they aren't ConEd's, so that a run against the mock server neither
+        overwrites the real cache nor sends the real token to the mock.
+        """
+
+        if (self.base_url, self.opower_url) == (self.BASE_URL, self.OPOWER_URL):
+            return self.username
+
+        return f"{self.username} {self.base_url} {self.opower_url}"
+
     def load_cache(self):
         """
         Cache stores information required to get the energy consumption data.
@@ -90,11 +174,11 @@ class ConEd:
         """
 
         try:
-            with open(ConEd.cache_file_path, "r") as f:
+            with open(ConEdAccount.cache_file_path, "r") as f:
                 contents = json.load(f)
 
-            self.meter_id = contents.get(self.username, {}).get("meter_id", None)
-            self.account_uuid = contents.get(self.username, {}).get(
+            self.meter_id = contents.get(self.cache_key, {}).get("meter_id", None)
+            self.account_uuid = contents.get(self.cache_key, {}).get(
                 "account_uuid", None
             )
         except FileNotFoundError:
@@ -103,30 +187,274 @@ class ConEd:
     def save_to_cache(self, key: str, value: Union[str, int]):
         log.info("Saving to cache...")
         try:
-            with open(ConEd.cache_file_path, "r") as f:
+            with open(ConEdAccount.cache_file_path, "r") as f:
                 contents = json.load(f)
         except (FileNotFoundError, json.JSONDecodeError):
             contents = {}
 
-        user_cache = contents.setdefault(self.username, {})
+        user_cache = contents.setdefault(self.cache_key, {})
         user_cache[key] = value
 
-        with open(ConEd.cache_file_path, "w+") as f:
+        os.makedirs(ConEdAccount.cache_file_path.parent, exist_ok=True)
+        with open(ConEdAccount.cache_file_path, "w+") as f:
             json.dump(contents, f, indent=4)
 
-    def request(self, url: str, data: dict = None):
-        log.debug(f"Making a request to {url}")
+    def _session_key(self, salt: bytes) -> "Fernet":
+        """
+        The persisted session is encrypted with a key derived from the account password.
+        """
+        from cryptography.fernet import Fernet
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+        kdf = PBKDF2HMAC(
+            algorithm=hashes.SHA256(), length=32, salt=salt, iterations=200_000
+        )
+        return Fernet(base64.urlsafe_b64encode(kdf.derive(self.password.encode())))
+
+    def write_session(self, token: str, cookies: List[dict]):
+        """
+        Encrypt and store the session next to the cache:
+
+        {
+            "johnsmith@gmail.com": {
+                "salt": "...",
+                "session": "<encrypted cookies, token and expiry>"
+            }
+        }
+        """
+
+        session = {
+            "token": token,
+            "cookies": cookies,
+            "expires_at": self._token_expiry(token),
+        }
+
+        salt = os.urandom(16)
+        encrypted = self._session_key(salt).encrypt(json.dumps(session).encode())
+
+        try:
+            with open(ConEdAccount.session_file_path, "r") as f:
+                contents = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            contents = {}
+
+        contents[self.cache_key] = {
+            "salt": base64.b64encode(salt).decode(),
+            "session": encrypted.decode(),
+        }
+
+        # Create the file readable by the owner only, it holds live credentials.
+        os.makedirs(ConEdAccount.session_file_path.parent, exist_ok=True)
+        fd = os.open(
+            ConEdAccount.session_file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600
+        )
+        with os.fdopen(fd, "w") as f:
+            json.dump(contents, f, indent=4)
+
+        log.info("Saved the session.")
+
+    def read_session(self) -> Optional[dict]:
+        """
+        Load a previously persisted session. Returns None if there's none,
+        it can't be decrypted, or it has expired.
+        """
+
+        from cryptography.fernet import InvalidToken
+
+        try:
+            with open(ConEdAccount.session_file_path, "r") as f:
+                entry = json.load(f)[self.cache_key]
+
+            salt = base64.b64decode(entry["salt"])
+            session = json.loads(
+                self._session_key(salt).decrypt(entry["session"].encode())
+            )
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, InvalidToken):
+            return None
+
+        if session.get("expires_at", 0) <= time.time():
+            log.info("The persisted session has expired.")
+            return None
+
+        return session
+
+    @classmethod
+    def _token_expiry(cls, token: str) -> float:
+        """
+        OPOWER tokens are JWTs; read the "exp" claim if present, otherwise fall
+        back to SESSION_TTL_SECONDS from now.
+        """
+
+        try:
+            claims = token.split(".")[1]
+            claims += "=" * (-len(claims) % 4)
+            return float(json.loads(base64.urlsafe_b64decode(claims))["exp"])
+        except (IndexError, ValueError, KeyError, TypeError):
+            return time.time() + cls.SESSION_TTL_SECONDS
+
+    @property
+    def meters_url(self) -> str:
+        return f"{self.opower_url}/cws-real-time-ami-v1/cws/cned/accounts/{self.account_uuid}/meters"
+
+    @property
+    def usage_url(self) -> str:
+        return f"{self.meters_url}/{self.meter_id}/usage"
+
+    @staticmethod
+    def usage_params(
+        start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]
+    ) -> dict:
+        params = {}
+        if start is not None:
+            params["startDate"] = start.isoformat()
+        if end is not None:
+            params["endDate"] = end.isoformat()
+        return params
+
+
+class ConEd(ConEdAccount):
+    @classmethod
+    def wizard(cls):
+        username = Prompt.input("Enter your username:")
+        password = Prompt.input("Enter your password:")
+        coned = cls(username, password, use_cached_credentials=False)
+
+        try:
+            coned.login()
+        except Exception as e:
+            print(str(e))
+            return None
+
+        print("Logged in successfully. Trying to access power usage data...")
 
+        try:
+            coned.get_power_consumption_data()
+        except Exception as e:
+            print(str(e))
+            return None
+
+        print("All good! Your account is configured.")
+
+        return {
+            "username": coned.username,
+            "password": coned.password,
+            "two_factor_auth_response": coned.mfa,
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.data = None
+        # When set (see mock_server.FixtureRecorder), every response is saved as a fixture.
+        self.recorder = None
+        self.session = requests.Session()  # self.session.cookies
+        self.session.headers.update(self.HEADERS)
+        # Backfill's workers share the client, only one of them logs in again at a time.
+        self.login_lock = threading.Lock()
+
+    def save_session(self):
+        """
+        Persist the session cookies and the OPOWER bearer token so that the next poll
+        can skip the login flow altogether.
+        """
+
+        token = self.session.headers.get("authorization", "").replace("Bearer ", "")
+        if not token:
+            return
+
+        cookies = [
+            {
+                "name": c.name,
+                "value": c.value,
+                "domain": c.domain,
+                "path": c.path,
+                "expires": c.expires,
+            }
+            for c in self.session.cookies
+        ]
+        self.write_session(token, cookies)
+
+    def restore_session(self) -> bool:
+        session = self.read_session()
+        if session is None:
+            return False
+
+        for c in session["cookies"]:
+            self.session.cookies.set(
+                c["name"],
+                c["value"],
+                domain=c["domain"],
+                path=c["path"],
+                expires=c["expires"],
+            )
+        self.session.headers["authorization"] = f"Bearer {session['token']}"
+
+        log.info("Restored the persisted session.")
+        return True
+
+    def connect(self) -> bool:
+        """
+        Reuse the persisted session if there is a valid one, log in otherwise.
+        """
+
+        return self.restore_session() or self.login()
+
+    def request(
+        self,
+        url: str,
+        data: dict = None,
+        params: dict = None,
+        reauthenticate: bool = True,
+        stream: bool = False,
+    ):
+        """
+        With `stream`, the body is left unread so that it can be consumed in chunks.
+        """
+
+        log.debug("Making a request to %s", url)
+
+        token = self.session.headers.get("authorization")
         if data:
-            response = self.session.post(url, json=data)
+            response = self.session.post(url, json=data, params=params, stream=stream)
         else:
-            response = self.session.get(url)
+            response = self.session.get(url, params=params, stream=stream)
+
+        if response.status_code == 401 and reauthenticate:
+            # The session (likely restored from disk) is no longer valid.
+            response.close()
+            with self.login_lock:
+                # Unless another thread has logged in again in the meantime.
+                if self.session.headers.get("authorization") == token:
+                    log.info("Got 401, logging in again...")
+                    self.session.cookies.clear()
+                    self.session.headers.pop("authorization", None)
+                    self.login()
+            return self.request(
+                url=url,
+                data=data,
+                params=params,
+                reauthenticate=False,
+                stream=stream,
+            )
 
-        log.debug(response)
-        if "application/json" in response.headers.get("Content-Type", ""):
-            log.debug(json.dumps(response.json(), indent=4))
-        else:
+        if self.recorder is not None and response.ok:
+            # Reading the body here is fine for streamed responses too,
+            # iter_content() then serves it from memory.
+            self.recorder.record(
+                url,
+                response.status_code,
+                response.headers.get("Content-Type", ""),
+                response.text,
+            )
+
+        # Pretty printing the whole body is expensive, only do it if someone's listening.
+        if log.isEnabledFor(logging.DEBUG):
             log.debug(response)
+            if stream:
+                log.debug("Streaming %s bytes.", response.headers.get("Content-Length"))
+            elif "application/json" in response.headers.get("Content-Type", ""):
+                log.debug(json.dumps(response.json(), indent=4))
 
         try:
             response.raise_for_status()
@@ -138,13 +466,13 @@ class ConEd:
     def login(self):
         log.info(f"\nLogging in {self.username}...")
         url = f"{self.base_url}/ConEdWeb-Foundation-Login-Areas-LoginAPI/User/0/Login"
-        return_url = "%2Fen%2Faccounts-billing%2Fmy-account%2Fenergy-use%3Ftab1%3DsectionRealTimeData-2"
+        return_url = self.RETURN_URL
         data = {
             "LoginEmail": self.username,
             "LoginPassword": self.password,
             "ReturnUrl": return_url,
         }
-        response_json = self.request(url=url, data=data).json()
+        response_json = self.request(url=url, data=data, reauthenticate=False).json()
 
         if not response_json.get("login"):
             print(response_json)
@@ -177,6 +505,7 @@ class ConEd:
                     "MFACode": self.mfa,
                     "ReturnUrl": return_url,
                 },
+                reauthenticate=False,
             ).json()
 
             if not response_json.get("code", ""):
@@ -187,27 +516,33 @@ class ConEd:
         # While this request returns no data of interest, it returns some essential cookies.
         if response_json.get("authRedirectUrl"):
             log.info("\nFetching token cookies...")
-            self.request(url=response_json["authRedirectUrl"])
+            self.request(url=response_json["authRedirectUrl"], reauthenticate=False)
             log.info("OK")
         else:
             raise KeyError('"authRedirectUrl" was not returned.')
 
         log.info("\nGetting the OPOWER token...")
         url = f"{self.base_url}/ConEd-Cms-Services-Controllers-Opower/OpowerService/0/GetOPowerToken"
-        response = self.request(url=url)
+        response = self.request(url=url, reauthenticate=False)
         token = response.text.strip('"')
         self.session.headers["authorization"] = f"Bearer {token}"
         log.info("OK. Updated the headers.")
 
+        self.save_session()
+
         return True
 
-    def get_power_consumption_data(self) -> bool:
+    def resolve_meter(self):
+        """
+        Make sure we know the account UUID and the meter ID, asking OPOWER if not cached.
+        """
+
         if not self.account_uuid:
             log.info("\nFetching account UUID...")
             # Get account metadata, we're interested in the account id specifically -
             # Cache that away...
             response = self.request(
-                url="https://cned.opower.com/ei/edge/apis/DataBrowser-v1/cws/metadata"
+                url=f"{self.opower_url}/DataBrowser-v1/cws/metadata"
             )
             accounts = (
                 response.json().get("fuelTypeServicePoint", {}).get("ELECTRICITY", [])
@@ -228,7 +563,7 @@ class ConEd:
         if not self.meter_id:
             log.info("\nFetching meter ID...")
             # Get the meter ID...
-            url = f"https://cned.opower.com/ei/edge/apis/cws-real-time-ami-v1/cws/cned/accounts/{self.account_uuid}/meters"
+            url = self.meters_url
             response = self.request(url=url)
             try:
                 self.meter_id = response.json().get("meters_ids", [])[-1]
@@ -243,15 +578,51 @@ class ConEd:
         assert self.meter_id
         assert self.account_uuid
 
-        # Finally, fetch the real time usage data...
-        url = f"https://cned.opower.com/ei/edge/apis/cws-real-time-ami-v1/cws/cned/accounts/{self.account_uuid}/meters/{self.meter_id}/usage"
-        response = self.request(url=url)
+    def fetch_usage(
+        self, start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None
+    ) -> pd.DataFrame:
+        """
+        Fetch the real time usage data between `start` and `end`. Without a range,
+        OPOWER returns its default (wide) window.
+        """
+
+        response = self.request(
+            url=self.usage_url,
+            params=self.usage_params(start, end) or None,
+            stream=True,
+        )
+
+        reads = UsageReads()
+        stream = JSONArrayStream("reads")
+        with response:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                for read in stream.feed(chunk):
+                    reads.add(read)
+        stream.close()
+
+        return reads.to_frame(start, end)
+
+    def get_power_consumption_data(
+        self, since: Optional[pd.Timestamp] = None
+    ) -> pd.DataFrame:
+        """
+        Fetch the real time usage data. If `since` (the latest timestamp we already have)
+        is recent, only ask for what's new plus a small overlap so that late corrections
+        to the last reads still make it in. Otherwise, fall back to the wide window.
+        """
+
+        self.resolve_meter()
+
+        start = None
+        if since is not None:
+            since = pd.Timestamp(since).tz_convert("UTC")
+            if pd.Timestamp.now(tz="UTC") - since <= self.INCREMENTAL_MAX_GAP:
+                start = since - self.INCREMENTAL_OVERLAP
+                log.info(f"Fetching usage since {start}...")
+            else:
+                log.info("The last stored read is too old, fetching the wide window.")
 
-        # Save to a dataframe -
-        self.data = pd.json_normalize(response.json(), record_path="reads")
-        self.data["datetime"] = pd.to_datetime(self.data["startTime"])
-        self.data.dropna(subset=["value"], inplace=True)
-        self.data.drop(columns=["startTime", "endTime"], inplace=True)
+        self.data = self.fetch_usage(start=start)
         return self.data
 
     @staticmethod
@@ -268,7 +639,7 @@ class ConEd:
         )
         file_path = pathlib.Path(target_dir) / pathlib.Path(file_name)
 
-        os.system(f"mkdir -p {target_dir}")
+        os.makedirs(target_dir, exist_ok=True)
 
         coned_instance.data.to_csv(file_path, index=False)
         log.info(file_path)
@@ -0,0 +1,243 @@
+# pylint: disable=C0103 W1203
+import asyncio
+import logging
+from http.cookies import SimpleCookie
+from typing import Awaitable, Callable, Optional
+
+import aiohttp
+import pandas as pd
+from yarl import URL
+
+from .provider_coned import ConEdAccount, UsageReads
+from .utils import JSONArrayStream
+
+log = logging.getLogger(__name__)
+
+
+class AsyncConEd:
+    """
+    asyncio flavor of ConEd, used to poll many accounts concurrently.
+
+    The account state (meter ID, account UUID, the persisted session) is shared with
+    ConEd through ConEdAccount; only the HTTP calls run on an aiohttp session.
+    Sessions of different accounts share a single connector, i.e. a single
+    connection pool, while each keeps its own cookie jar.
+
+    Reading and writing the persisted session (a PBKDF2 key derivation and file
+    I/O) runs in a worker thread, not to hold up the other accounts' polls.
+    """
+
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        connector: aiohttp.BaseConnector,
+        mfa: Optional[str] = None,
+        base_url: Optional[str] = None,
+        opower_url: Optional[str] = None,
+    ):
+        self.coned = ConEdAccount(
+            username, password, mfa, base_url=base_url, opower_url=opower_url
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            connector_owner=False,
+            cookie_jar=aiohttp.CookieJar(),
+            headers=ConEdAccount.HEADERS,
+        )
+
+    @property
+    def username(self) -> str:
+        return self.coned.username
+
+    async def close(self):
+        await self.session.close()
+
+    async def request(
+        self,
+        url: str,
+        data: dict = None,
+        params: dict = None,
+        reauthenticate: bool = True,
+        reader: Optional[Callable[[aiohttp.ClientResponse], Awaitable]] = None,
+    ):
+        """
+        Returns the decoded JSON (or text) body, or whatever `reader` makes of the
+        response if given one.
+        """
+
+        log.debug("Making a request to %s", url)
+
+        method = "POST" if data else "GET"
+        async with self.session.request(
+            method, url, json=data, params=params
+        ) as response:
+            if response.status == 401 and reauthenticate:
+                log.info(f"{self.username}: got 401, logging in again...")
+                self.session.cookie_jar.clear()
+                self.session.headers.pop("authorization", None)
+                await self.login()
+                return await self.request(
+                    url=url,
+                    data=data,
+                    params=params,
+                    reauthenticate=False,
+                    reader=reader,
+                )
+
+            response.raise_for_status()
+
+            if reader is not None:
+                return await reader(response)
+
+            if "application/json" in response.headers.get("Content-Type", ""):
+                return await response.json()
+
+            return await response.text()
+
+    async def restore_session(self) -> bool:
+        session = await asyncio.to_thread(self.coned.read_session)
+        if session is None:
+            return False
+
+        for c in session["cookies"]:
+            # With their domain set, or they'd only go back to that exact host.
+            cookie = SimpleCookie()
+            cookie[c["name"]] = c["value"]
+            cookie[c["name"]].update({"domain": c["domain"], "path": c["path"]})
+            self.session.cookie_jar.update_cookies(
+                cookie, response_url=URL(f"https://{c['domain'].lstrip('.')}/")
+            )
+        self.session.headers["authorization"] = f"Bearer {session['token']}"
+        return True
+
+    async def save_session(self):
+        token = self.session.headers.get("authorization", "").replace("Bearer ", "")
+        cookies = [
+            {
+                "name": c.key,
+                "value": c.value,
+                "domain": c["domain"],
+                "path": c["path"] or "/",
+                "expires": None,
+            }
+            for c in self.session.cookie_jar
+        ]
+        await asyncio.to_thread(self.coned.write_session, token, cookies)
+
+    async def connect(self) -> bool:
+        return await self.restore_session() or await self.login()
+
+    async def login(self) -> bool:
+        """
+        Same flow as ConEd.login, except that two-factor auth can't be prompted for:
+        the response must be in the account's configuration.
+        """
+
+        log.info(f"Logging in {self.username}...")
+        base_url = self.coned.base_url
+        response_json = await self.request(
+            url=f"{base_url}/ConEdWeb-Foundation-Login-Areas-LoginAPI/User/0/Login",
+            data={
+                "LoginEmail": self.coned.username,
+                "LoginPassword": self.coned.password,
+                "ReturnUrl": ConEdAccount.RETURN_URL,
+            },
+            reauthenticate=False,
+        )
+
+        if not response_json.get("login"):
+            raise Exception(
+                f"{self.username}: failed to login successfully: "
+                f'{response_json.get("loginErrorMsg", "your username or password are incorrect")}.'
+            )
+
+        if response_json.get("newDevice") and not response_json.get("noMfa"):
+            if not self.coned.mfa:
+                raise Exception(
+                    f"{self.username}: two-factor auth is required but no response is configured."
+                )
+
+            response_json = await self.request(
+                url=f"{base_url}/ConEdWeb-Foundation-Login-Areas-LoginAPI/User/0/VerifyFactor",
+                data={"MFACode": self.coned.mfa, "ReturnUrl": ConEdAccount.RETURN_URL},
+                reauthenticate=False,
+            )
+
+            if not response_json.get("code", ""):
+                raise Exception(f"{self.username}: failed to 2FA.")
+
+        # While this request returns no data of interest, it returns some essential cookies.
+        if not response_json.get("authRedirectUrl"):
+            raise KeyError('"authRedirectUrl" was not returned.')
+
+        await self.request(url=response_json["authRedirectUrl"], reauthenticate=False)
+
+        token = await self.request(
+            url=f"{base_url}/ConEd-Cms-Services-Controllers-Opower/OpowerService/0/GetOPowerToken",
+            reauthenticate=False,
+        )
+        token = str(token).strip('"')
+        self.session.headers["authorization"] = f"Bearer {token}"
+
+        await self.save_session()
+        return True
+
+    async def resolve_meter(self):
+        coned = self.coned
+
+        if not coned.account_uuid:
+            response_json = await self.request(
+                url=f"{coned.opower_url}/DataBrowser-v1/cws/metadata"
+            )
+            accounts = response_json.get("fuelTypeServicePoint", {}).get(
+                "ELECTRICITY", []
+            )
+            if not accounts or not accounts[0].get("accountUuid"):
+                raise Exception(
+                    f"{self.username}: unable to determine the account UUID."
+                )
+
+            coned.account_uuid = accounts[0]["accountUuid"]
+            coned.save_to_cache("account_uuid", coned.account_uuid)
+
+        if not coned.meter_id:
+            response_json = await self.request(url=coned.meters_url)
+            try:
+                coned.meter_id = response_json.get("meters_ids", [])[-1]
+            except IndexError:
+                raise Exception(f"{self.username}: no meter ids.")
+
+            coned.save_to_cache("meter_id", coned.meter_id)
+
+    async def fetch_usage(
+        self, start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None
+    ) -> pd.DataFrame:
+
+        async def read_usage(response: aiohttp.ClientResponse) -> pd.DataFrame:
+            reads = UsageReads()
+            stream = JSONArrayStream("reads")
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                for read in stream.feed(chunk):
+                    reads.add(read)
+            stream.close()
+            return reads.to_frame(start, end)
+
+        return await self.request(
+            url=self.coned.usage_url,
+            params=ConEdAccount.usage_params(start, end) or None,
+            reader=read_usage,
+        )
+
+    async def get_power_consumption_data(
+        self, since: Optional[pd.Timestamp] = None
+    ) -> pd.DataFrame:
+        await self.resolve_meter()
+
+        start = None
+        if since is not None:
+            since = pd.Timestamp(since).tz_convert("UTC")
+            if pd.Timestamp.now(tz="UTC") - since <= ConEdAccount.INCREMENTAL_MAX_GAP:
+                start = since - ConEdAccount.INCREMENTAL_OVERLAP
+
+        return await self.fetch_usage(start=start)
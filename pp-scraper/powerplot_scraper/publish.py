@@ -0,0 +1,108 @@
+import os
+import json
+import time
+import socket
+import hashlib
+import pathlib
+from typing import Optional
+
+import pandas as pd
+
+# pp-api listens on this socket (in the data directory) for new versions of the database.
+NOTIFY_SOCKET_NAME = "pp-api.sock"
+
+
+def manifest_path(db_path: pathlib.Path) -> pathlib.Path:
+    return db_path.with_suffix(".manifest.json")
+
+
+def read_manifest(db_path: pathlib.Path) -> Optional[dict]:
+    try:
+        with open(manifest_path(db_path), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def sha256sum(path: pathlib.Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def fsync_dir(directory: pathlib.Path):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_atomically(path: pathlib.Path, write) -> pathlib.Path:
+    """
+    Call `write(f)` on a temporary file next to `path`, make sure it hits the disk,
+    then rename it over `path`. Readers see either the old or the new file, whole.
+    """
+
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "w") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+    fsync_dir(path.parent)
+    return path
+
+
+def notify(db_path: pathlib.Path, manifest: dict):
+    """
+    Tell pp-api that a new version is out. Nobody listening is fine, it will pick
+    the new version up from the manifest on its next reload.
+    """
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        sock.sendto(
+            json.dumps({"db": db_path.name, **manifest}).encode(),
+            str(db_path.parent / NOTIFY_SOCKET_NAME),
+        )
+    except OSError:
+        pass
+    finally:
+        sock.close()
+
+
+def publish(
+    df: pd.DataFrame, db_path: pathlib.Path, timezone: Optional[str] = None
+) -> dict:
+    """
+    Publish a new version of the database:
+
+    1. write the CSV to a temporary file, fsync, rename it over the database,
+    2. write the manifest the same way - a monotonically increasing version, row count,
+       last timestamp and checksum of the CSV, which lets readers verify what they read,
+       and the local `timezone` of the data, which pp-api aggregates in,
+    3. notify pp-api.
+
+    `df` is indexed by "datetime" and sorted.
+    """
+
+    write_atomically(db_path, lambda f: df.to_csv(f, index=True))
+
+    previous = read_manifest(db_path) or {}
+    manifest = {
+        "version": previous.get("version", 0) + 1,
+        "rows": len(df),
+        "last_timestamp": df.index[-1].isoformat() if len(df) else None,
+        "sha256": sha256sum(db_path),
+        "published_at": time.time(),
+    }
+    if timezone:
+        manifest["timezone"] = timezone
+    write_atomically(manifest_path(db_path), lambda f: json.dump(manifest, f, indent=4))
+
+    notify(db_path, manifest)
+    return manifest
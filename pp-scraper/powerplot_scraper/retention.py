@@ -0,0 +1,162 @@
+import pathlib
+
+import pandas as pd
+
+from .config import get_config, get_timezone
+from .publish import write_atomically
+
+# pp-api's default too, for a db without a timezone in its manifest.
+DEFAULT_TIMEZONE = "US/Eastern"
+
+
+def tier_path(db_path: pathlib.Path, tier: str) -> pathlib.Path:
+    """
+    The archive tiers live next to the db, e.g. conedison_1a2b3c.hourly.csv.
+    """
+
+    return db_path.with_suffix(f".{tier}.csv")
+
+
+def read_tier(path: pathlib.Path) -> pd.DataFrame:
+    try:
+        df = pd.read_csv(path)
+    except FileNotFoundError:
+        return pd.DataFrame(
+            {"value": []}, index=pd.DatetimeIndex([], tz="UTC", name="datetime")
+        )
+
+    df["datetime"] = pd.to_datetime(df["datetime"], utc=True)
+    return df.set_index("datetime")
+
+
+def rollup(df: pd.DataFrame, frequency: str, timezone: str) -> pd.DataFrame:
+    """
+    Sum the reads into `frequency` buckets of local time, keeping only the buckets
+    which had any reads.
+    """
+
+    local = df["value"].tz_convert(timezone)
+    grouped = local.resample(frequency)
+    rolled = grouped.sum()[grouped.count() > 0].to_frame()
+    rolled.index = rolled.index.tz_convert("UTC")
+    rolled.index.name = "datetime"
+    return rolled
+
+
+def complete_hours(df: pd.DataFrame, timezone: str) -> pd.Index:
+    """
+    The (UTC) hours of local time in which `df` has all the reads, going by its
+    most common interval between reads.
+    """
+
+    if len(df) < 2:
+        return pd.DatetimeIndex([], tz="UTC")
+
+    interval = pd.Series(df.index).diff().median()
+    reads_per_hour = max(round(pd.Timedelta(hours=1) / interval), 1)
+
+    counts = df["value"].tz_convert(timezone).resample("h").count()
+    complete = counts[counts >= reads_per_hour].index.tz_convert("UTC")
+    complete.name = "datetime"
+    return complete
+
+
+def merge(tier: pd.DataFrame, rows: pd.DataFrame, keep: str) -> pd.DataFrame:
+    if rows.empty:
+        return tier
+
+    merged = pd.concat([tier, rows])
+    return merged[~merged.index.duplicated(keep=keep)].sort_index()
+
+
+def write_tier(path: pathlib.Path, tier: pd.DataFrame, original: pd.DataFrame):
+    if not tier.equals(original):
+        write_atomically(path, lambda f: tier.to_csv(f, index=True))
+
+
+class RetentionPolicy:
+    """
+    Keeps the raw (15 minute) db bounded: reads older than `raw_days` are rolled up
+    into the hourly tier, hourly rows older than `hourly_days` into the daily tier.
+    Both tiers are CSVs of "datetime" (UTC) and "value" (kWh) next to the db, and
+    each only ever holds what's older than the start of the finer one; pp-api reads
+    all three as one dataset.
+
+    Cutoffs fall on local midnights (in the timezone published with the db, which
+    pp-api aggregates in), so no hour or day is ever split across tiers.
+    """
+
+    def __init__(
+        self, raw_days: int = 90, hourly_days: int = 730, timezone: str = None
+    ):
+        self.raw_days = raw_days
+        self.hourly_days = hourly_days
+        self.timezone = timezone or DEFAULT_TIMEZONE
+
+    @classmethod
+    def from_config(cls) -> "RetentionPolicy":
+        config = get_config()
+        return cls(
+            raw_days=config.get("retention.raw_days", 90),
+            hourly_days=config.get("retention.hourly_days", 730),
+            timezone=get_timezone(),
+        )
+
+    def cutoff(self, days: int) -> pd.Timestamp:
+        now = pd.Timestamp.now(tz=self.timezone)
+        return (now - pd.Timedelta(days=days)).normalize().tz_convert("UTC")
+
+    def compact(
+        self, df: pd.DataFrame, db_path: pathlib.Path, overwrite: bool = True
+    ) -> pd.DataFrame:
+        """
+        Move what's too old out of `df` (the merged db, indexed by UTC "datetime")
+        into the tiers. Returns what stays in the raw db. Unless `overwrite`, hours
+        already in the hourly tier are kept as they are (see append_to_db()).
+
+        The tiers are written first: if we're interrupted before the db is, the same
+        rows are in two tiers for a while, and readers prefer the finer one.
+
+        The newest day of reads always stays raw, however old it is (an import of
+        old history, say): pp-api needs some raw reads to go by.
+        """
+
+        if not self.raw_days or df.empty:
+            return df
+
+        newest_day = df.index[-1].tz_convert(self.timezone).normalize()
+        old = df.index < min(self.cutoff(self.raw_days), newest_day.tz_convert("UTC"))
+        raw = df[~old]
+
+        hourly_path = tier_path(db_path, "hourly")
+        daily_path = tier_path(db_path, "daily")
+        original_hourly = read_tier(hourly_path)
+        original_daily = read_tier(daily_path)
+
+        # Raw reads fetched again (e.g. by a backfill) replace their hourly rollups,
+        # but only whole hours of them: a chunk starting or ending mid-hour would
+        # replace a complete hour with part of it. Partial hours only fill in hours
+        # the tier doesn't have.
+        rolled = rollup(df[old], "h", self.timezone)
+        whole = rolled.index.isin(complete_hours(df, self.timezone))
+        hourly = merge(original_hourly, rolled[whole], "last" if overwrite else "first")
+        hourly = merge(hourly, rolled[~whole], "first")
+        daily = original_daily
+
+        if self.hourly_days:
+            old_hours = hourly.index < self.cutoff(max(self.hourly_days, self.raw_days))
+
+            # Days in the daily tier are settled, only days we don't have go in.
+            daily = merge(daily, rollup(hourly[old_hours], "D", self.timezone), "first")
+            hourly = hourly[~old_hours]
+
+        # Whatever a finer tier covers is left over from an interrupted compaction.
+        if not raw.empty:
+            hourly = hourly[hourly.index < raw.index[0]]
+            daily = daily[daily.index < raw.index[0]]
+        if not hourly.empty:
+            daily = daily[daily.index < hourly.index[0]]
+
+        write_tier(daily_path, daily, original_daily)
+        write_tier(hourly_path, hourly, original_hourly)
+        return raw
@@ -0,0 +1,165 @@
+import json
+import random
+import pathlib
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+
+class PollScheduler:
+    """
+    Decides when to poll next, based on when the utility has published new data so far.
+
+    Every poll that brings in new reads tells us the data was published somewhere
+    between the previous poll and this one; that window is spread over an hour-of-day
+    histogram, which slowly forgets old observations. The hours holding most of the
+    weight are "hot": we poll every `min_interval` during them, and sleep until the
+    next one otherwise (never longer than `base_interval`).
+
+    Empty polls (no reads newer than the ones we had, corrections don't count) in a
+    row during the hot hours back off: the delay grows exponentially from
+    `min_interval`, up to `base_interval`. Outside of them an empty poll doesn't
+    change the schedule. Failed polls back off from `min_interval` up to
+    `max_backoff`. Both with jitter, so that several scrapers don't end up polling
+    in lockstep.
+
+    The state is kept in a JSON file so that restarts don't forget what we've learned.
+    """
+
+    DECAY = 0.97  # per observation
+    HOT_FRACTION = 0.5  # of the busiest hour's weight
+    MIN_OBSERVATIONS = 3.0  # total weight before we trust the histogram
+
+    def __init__(
+        self,
+        state_path: pathlib.Path,
+        base_interval: timedelta = timedelta(hours=6),
+        min_interval: timedelta = timedelta(minutes=30),
+        max_backoff: timedelta = timedelta(hours=6),
+    ):
+        self.state_path = state_path
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_backoff = max_backoff
+
+        self.arrivals: List[float] = [0.0] * 24
+        self.last_poll: Optional[datetime] = None
+        self.empty_polls = 0
+        self.failed_polls = 0
+
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.state_path, "r") as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+
+        self.arrivals = state.get("arrivals", self.arrivals)
+        self.empty_polls = state.get("empty_polls", 0)
+        self.failed_polls = state.get("failed_polls", 0)
+        if state.get("last_poll"):
+            self.last_poll = datetime.fromisoformat(state["last_poll"])
+
+    def save(self):
+        state = {
+            "arrivals": [round(a, 4) for a in self.arrivals],
+            "last_poll": self.last_poll.isoformat() if self.last_poll else None,
+            "empty_polls": self.empty_polls,
+            "failed_polls": self.failed_polls,
+        }
+
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=4)
+        tmp_path.replace(self.state_path)
+
+    def record_poll(self, new_reads: int, now: Optional[datetime] = None):
+        """
+        Record a successful poll which brought in `new_reads` reads newer than the
+        ones we had. Reads we had, corrected or not, don't make a poll any less empty.
+        """
+
+        now = now or datetime.now()
+
+        if new_reads > 0:
+            self.record_arrival(self.last_poll, now)
+            self.empty_polls = 0
+        elif now.hour in self.hot_hours():
+            self.empty_polls += 1
+        else:
+            # Only the ones in a row while we expect data count.
+            self.empty_polls = 0
+
+        self.failed_polls = 0
+        self.last_poll = now
+        self.save()
+
+    def record_failure(self, now: Optional[datetime] = None):
+        self.failed_polls += 1
+        self.last_poll = now or datetime.now()
+        self.save()
+
+    def record_arrival(self, since: Optional[datetime], until: datetime):
+        """
+        New data was published somewhere in (since, until]; spread one observation
+        over the hours of that window.
+        """
+
+        self.arrivals = [a * self.DECAY for a in self.arrivals]
+
+        if since is None or since >= until or until - since > timedelta(days=1):
+            since = until - self.min_interval
+
+        hours = []
+        t = since.replace(minute=0, second=0, microsecond=0)
+        while t < until:
+            hours.append(t.hour)
+            t += timedelta(hours=1)
+
+        for hour in hours:
+            self.arrivals[hour] += 1.0 / len(hours)
+
+    def hot_hours(self) -> List[int]:
+        if sum(self.arrivals) < self.MIN_OBSERVATIONS:
+            return []
+
+        threshold = max(self.arrivals) * self.HOT_FRACTION
+        return [hour for hour, a in enumerate(self.arrivals) if a >= threshold]
+
+    def backoff(self, num_polls: int, cap: timedelta) -> timedelta:
+        """
+        `min_interval` doubled for every poll after the first, plus up to a quarter
+        of jitter, capped at `cap`.
+        """
+
+        backoff = self.min_interval * 2 ** min(num_polls - 1, 32)
+        return min(cap, backoff * random.uniform(1.0, 1.25))
+
+    def next_delay(self, now: Optional[datetime] = None) -> timedelta:
+        now = now or datetime.now()
+        hot = self.hot_hours()
+
+        if now.hour in hot:
+            delay = self.min_interval
+        elif hot:
+            # Sleep until the top of the next hot hour.
+            next_hot = min((h - now.hour) % 24 for h in hot)
+            top_of_hour = now.replace(minute=0, second=0, microsecond=0)
+            delay = min(
+                self.base_interval, top_of_hour + timedelta(hours=next_hot) - now
+            )
+        else:
+            delay = self.base_interval
+
+        if self.failed_polls:
+            backoff = self.backoff(self.failed_polls, self.max_backoff)
+            delay = max(delay, backoff)
+        elif self.empty_polls and now.hour in hot:
+            # Not published yet: wait a little longer every time.
+            delay = self.backoff(self.empty_polls, self.base_interval)
+
+        # A little jitter on top, and never hammer the provider.
+        delay *= random.uniform(0.95, 1.05)
+        return max(delay, self.min_interval / 2)
@@ -1 +1,2 @@
 from .prompt import Prompt
+from .json_stream import JSONArrayStream
@@ -0,0 +1,77 @@
+import re
+import json
+import codecs
+from typing import List
+
+
+class JSONArrayStream:
+    """
+    Incrementally decode the items of one array in a JSON document, e.g. the "reads"
+    in {"reads": [{...}, {...}], ...}, as the document arrives chunk by chunk.
+
+    Only the current chunk and the item being decoded are ever held in memory,
+    whatever the size of the document. Feed it chunks of bytes, it returns the
+    items completed so far:
+
+        stream = JSONArrayStream("reads")
+        for chunk in response.iter_content(chunk_size=65536):
+            for item in stream.feed(chunk):
+                ...
+        stream.close()
+
+    The array is located by its key, the first `"key": [` in the document wins.
+    """
+
+    def __init__(self, key: str):
+        self.start_pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self.key = key
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.in_array = False
+        self.done = False
+
+    def feed(self, chunk: bytes) -> List[dict]:
+        if self.done:
+            return []
+
+        self.buffer += self.text_decoder.decode(chunk)
+
+        if not self.in_array:
+            match = self.start_pattern.search(self.buffer)
+            if not match:
+                # Keep just enough to match the key split across two chunks.
+                self.buffer = self.buffer[-(len(self.key) + 64) :]
+                return []
+
+            self.buffer = self.buffer[match.end() :]
+            self.in_array = True
+
+        items = []
+        buffer, index = self.buffer, 0
+        while True:
+            # Skip the whitespace and the commas between the items.
+            while index < len(buffer) and buffer[index] in " \t\r\n,":
+                index += 1
+
+            if index == len(buffer):
+                break
+
+            if buffer[index] == "]":
+                self.done = True
+                break
+
+            try:
+                item, index = self.decoder.raw_decode(buffer, index)
+            except json.JSONDecodeError:
+                # The item is incomplete, wait for the next chunk.
+                break
+
+            items.append(item)
+
+        self.buffer = "" if self.done else buffer[index:]
+        return items
+
+    def close(self):
+        if not self.done:
+            raise ValueError(f'The "{self.key}" array is missing or truncated.')
@@ -1,74 +1,244 @@
-from typing import Union
-import datetime
+import os
+import pathlib
+import argparse
+from typing import List, Optional, Tuple
 
 import requests
-import timezonefinder
-import pytz
-import geocoder
+import numpy as np
+import pandas as pd
 
+from .config import DATA_DIR_PATH, get_config
+from .publish import notify, read_manifest, write_atomically
+from .retention import tier_path
 
-def get_geo_location():
-    g = geocoder.ip("me")
-    city = g.current_result
-    latitude, longitude = g.latlng
+# Hourly temperatures are cached here, one file per location.
+WEATHER_DIR_PATH: pathlib.Path = DATA_DIR_PATH / pathlib.Path("weather")
+
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+
+# The archive lags a few days behind, anything more recent comes from the forecast API.
+ARCHIVE_DELAY = pd.Timedelta(days=5)
 
-    tf = timezonefinder.TimezoneFinder()
+# Recent hours may still be revised (forecast -> observation), don't trust them as final.
+REFRESH_WINDOW = pd.Timedelta(days=2)
 
-    # Lookup the timezone for the given latitude and longitude
-    timezone = tf.timezone_at(lat=latitude, lng=longitude)
 
-    return (latitude, longitude, timezone)
+def get_location() -> dict:
+    """
+    The location set up by the installation wizard, or a guess based on our IP:
 
+    {"city": "...", "timezone": "America/New_York", "latitude": 40.7, "longitude": -74.0}
+    """
 
-def get_hourly_weather_data(latitude: float, longitude: float, timezone: str):
-    print(timezone)
-    print(latitude)
-    print(longitude)
+    location = get_config().get("location")
+    if location:
+        return location
 
-    base_url = "https://api.open-meteo.com/v1/forecast"
-    params = {
+    import geocoder
+    from timezonefinder import TimezoneFinder
+
+    g = geocoder.ip("me")
+    latitude, longitude = g.latlng
+
+    return {
+        "city": str(g.current_result),
+        "timezone": TimezoneFinder().timezone_at(lat=latitude, lng=longitude),
         "latitude": latitude,
         "longitude": longitude,
-        "hourly": "temperature_2m",
-        "timeformat": "unixtime",
-        "timezone": timezone,
-        "start_date": "2023-10-13",
-        "end_date": "2023-12-22",
-        "format": "json",
-        "temperature_unit": "fahrenheit",
     }
 
-    response = requests.get(base_url, params=params)
-    try:
-        response.raise_for_status()
-    except Exception:
-        print(f"Request failed with status code {response.status_code}")
-    else:
-        data = response.json()
-        print(data)
-
-    local_timezone = pytz.timezone(timezone)
-    timestamps = data["hourly"]["time"]
-
-    formatted = []
-    for timestamp in timestamps:
-        # Convert the Unix timestamp to a datetime object
-        utc_datetime = datetime.datetime.utcfromtimestamp(timestamp).replace(
-            tzinfo=pytz.utc
+
+def missing_ranges(
+    hours: pd.DatetimeIndex, cached: pd.DatetimeIndex
+) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+    """
+    The runs of consecutive `hours` which aren't `cached`, as [first, last] pairs.
+    """
+
+    missing = hours.difference(cached)
+    if missing.empty:
+        return []
+
+    # A new run starts wherever the gap to the previous missing hour isn't an hour.
+    breaks = np.flatnonzero(np.diff(missing.asi8) != pd.Timedelta(hours=1).value)
+    starts = np.concatenate([[0], breaks + 1])
+    ends = np.concatenate([breaks, [len(missing) - 1]])
+
+    return [(missing[s], missing[e]) for s, e in zip(starts, ends)]
+
+
+class WeatherCache:
+    """
+    Hourly temperatures (°F) for a location, kept on disk and only fetched from
+    open-meteo for the hours we don't have yet.
+
+    The cache is a CSV of "datetime" (UTC, on the hour) and "temperature", sorted;
+    the same hourly UTC grid the power data resamples to, so joining the two is a
+    plain index alignment.
+    """
+
+    def __init__(self, latitude: float, longitude: float):
+        self.latitude = round(latitude, 2)
+        self.longitude = round(longitude, 2)
+        self.path = WEATHER_DIR_PATH / f"{self.latitude}_{self.longitude}.csv"
+        self.session = requests.Session()
+        self.temperatures = self.load()
+
+    def load(self) -> pd.Series:
+        try:
+            df = pd.read_csv(self.path)
+        except FileNotFoundError:
+            return pd.Series(
+                dtype=np.float64,
+                index=pd.DatetimeIndex([], tz="UTC", name="datetime"),
+                name="temperature",
+            )
+
+        index = pd.DatetimeIndex(pd.to_datetime(df["datetime"], utc=True))
+        return pd.Series(
+            df["temperature"].to_numpy(np.float64), index=index, name="temperature"
+        )
+
+    def save(self):
+        os.makedirs(self.path.parent, exist_ok=True)
+        write_atomically(
+            self.path, lambda f: self.temperatures.to_frame().to_csv(f, index=True)
+        )
+
+    def fetch(self, first: pd.Timestamp, last: pd.Timestamp) -> pd.Series:
+        """
+        Temperatures for the days spanning [first, last] (UTC), from the archive for
+        what's old enough to be there and from the forecast API for the rest.
+        """
+
+        archive_until = (pd.Timestamp.now(tz="UTC") - ARCHIVE_DELAY).floor("D")
+
+        ranges = []
+        if first < archive_until:
+            ranges.append((ARCHIVE_URL, first, min(last, archive_until)))
+        if last >= archive_until:
+            ranges.append((FORECAST_URL, max(first, archive_until), last))
+
+        parts = []
+        for url, start, end in ranges:
+            response = self.session.get(
+                url,
+                params={
+                    "latitude": self.latitude,
+                    "longitude": self.longitude,
+                    "hourly": "temperature_2m",
+                    "timeformat": "unixtime",
+                    "timezone": "GMT",
+                    "start_date": start.strftime("%Y-%m-%d"),
+                    "end_date": end.strftime("%Y-%m-%d"),
+                    "temperature_unit": "fahrenheit",
+                },
+                timeout=30,
+            )
+            response.raise_for_status()
+            hourly = response.json()["hourly"]
+
+            parts.append(
+                pd.Series(
+                    np.asarray(hourly["temperature_2m"], dtype=np.float64),
+                    index=pd.DatetimeIndex(
+                        pd.to_datetime(hourly["time"], unit="s", utc=True),
+                        name="datetime",
+                    ),
+                    name="temperature",
+                )
+            )
+
+        # Hours without a value yet come back as nulls; leave them missing.
+        return pd.concat(parts).dropna() if parts else self.temperatures.iloc[:0]
+
+    def update(self, start: pd.Timestamp, end: pd.Timestamp) -> pd.Series:
+        """
+        Make sure the cache covers [start, end) and return that range. Only the
+        missing hours (and the recent ones, which may still change) are fetched.
+        """
+
+        now = pd.Timestamp.now(tz="UTC")
+        hours = pd.date_range(
+            start.tz_convert("UTC").floor("h"),
+            min(end.tz_convert("UTC"), now),
+            freq="h",
+            inclusive="left",
+            name="datetime",
         )
 
-        # Convert to the local timezone
-        local_datetime = utc_datetime.astimezone(local_timezone)
+        cached = self.temperatures.index[self.temperatures.index < now - REFRESH_WINDOW]
+        ranges = missing_ranges(hours, cached)
+
+        if ranges:
+            fetched = pd.concat([self.fetch(first, last) for first, last in ranges])
+            fetched = fetched[fetched.index < now]
+
+            merged = pd.concat([self.temperatures, fetched])
+            self.temperatures = merged[
+                ~merged.index.duplicated(keep="last")
+            ].sort_index()
+            self.save()
+
+        return self.temperatures.reindex(hours)
+
+
+def update_weather(db_path: pathlib.Path, location: Optional[dict] = None):
+    """
+    Bring the weather next to a power database up to date: <db>.weather.csv holds the
+    hourly temperature for every hour the database spans, its archive tiers included.
+
+    Does nothing if no location is configured.
+    """
+
+    location = location or get_config().get("location")
+    if not location:
+        return
+
+    try:
+        db = pd.read_csv(db_path, usecols=["datetime"])
+    except FileNotFoundError:
+        return
+
+    if db.empty:
+        return
+
+    datetimes = pd.to_datetime(db["datetime"].iloc[[0, -1]], utc=True)
+    start = datetimes.iloc[0]
+
+    # Compaction moves the older reads out of the db, the tiers are sorted so their
+    # first row is as far back as they go.
+    for tier in ("hourly", "daily"):
+        try:
+            first = pd.read_csv(tier_path(db_path, tier), usecols=["datetime"], nrows=1)
+        except FileNotFoundError:
+            continue
+        if not first.empty:
+            start = min(start, pd.to_datetime(first["datetime"].iloc[0], utc=True))
 
-        # Format the local datetime as a string
-        formatted_datetime = local_datetime.strftime("%Y-%m-%d %H:%M:%S%z")
-        formatted.append(formatted_datetime)
+    cache = WeatherCache(location["latitude"], location["longitude"])
+    temperatures = cache.update(start, datetimes.iloc[-1] + pd.Timedelta(hours=1))
 
-    print(dict(zip(formatted_datetime, data["hourly"]["temperature_2m"])))
+    write_atomically(
+        db_path.with_suffix(".weather.csv"),
+        lambda f: temperatures.to_frame().to_csv(f, index=True),
+    )
 
+    # pp-api reloads when the weather changes too.
+    notify(db_path, read_manifest(db_path) or {})
 
-# print(list(zip(data["hourly"]["time"], data["hourly"]["temperature_2m"])))
 
 if __name__ == "__main__":
-    latitude, longitude, timezone = get_geo_location()
-    get_hourly_weather_data(latitude, longitude, timezone)
+    parser = argparse.ArgumentParser(description="Hourly temperatures, cached.")
+    parser.add_argument("start", help="YYYY-MM-DD")
+    parser.add_argument("end", help="YYYY-MM-DD")
+    args = parser.parse_args()
+
+    location = get_location()
+    cache = WeatherCache(location["latitude"], location["longitude"])
+    temperatures = cache.update(
+        pd.Timestamp(args.start, tz=location["timezone"]),
+        pd.Timestamp(args.end, tz=location["timezone"]),
+    )
+    print(temperatures.tz_convert(location["timezone"]).to_string())
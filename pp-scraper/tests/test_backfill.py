@@ -0,0 +1,53 @@
+import pandas as pd
+
+from powerplot_scraper import backfill
+from powerplot_scraper.backfill import Backfill
+from powerplot_scraper.mock_server import MockConEd, MockServer
+from powerplot_scraper.provider_coned import ConEd
+
+
+def test_resume_only_refetches_the_failed_chunks(tmp_path, monkeypatch):
+    merged = []
+    monkeypatch.setattr(backfill, "DATA_DIR_PATH", tmp_path)
+    monkeypatch.setattr(backfill, "get_db_path", lambda: tmp_path / "db.csv")
+    monkeypatch.setattr(backfill, "append_to_db", merged.append)
+
+    mock = MockConEd(seed=1)
+    with MockServer(mock) as server:
+        client = ConEd(
+            "backfill@example.com",
+            "password",
+            use_cached_credentials=False,
+            base_url=server.base_url,
+            opower_url=server.opower_url,
+        )
+        client.connect()
+        client.resolve_meter()
+
+        end = pd.Timestamp.now(tz="UTC").floor("D")
+        start = end - pd.Timedelta(days=20)
+
+        def run() -> bool:
+            return Backfill(
+                client, start, end, chunk=pd.Timedelta(days=2), workers=4, rate=0
+            ).run()
+
+        # Half the requests fail: some chunks get checkpointed, the rest don't.
+        mock.error_rate = 0.5
+        assert not run()
+        num_failed = mock.stats["errors"]
+        assert 0 < num_failed < 10
+        assert not merged
+
+        mock.error_rate = 0.0
+        fetched = mock.stats["usage"]
+        assert run()
+        assert mock.stats["usage"] - fetched == num_failed
+
+        # The same reads as fetching the whole range in one go.
+        expected = client.fetch_usage(start=start, end=end)
+
+    data = merged[0]
+    assert data["datetime"].is_unique
+    assert len(data) == len(expected)
+    assert data["value"].sum() == expected["value"].sum()
@@ -0,0 +1,109 @@
+import gzip
+
+import pandas as pd
+
+from powerplot_scraper.greenbutton import GreenButtonFile
+
+START = 1735707600  # 2025-01-01 00:00 in New York
+
+ENTRY = """
+  <entry>
+    <link rel="self" href="{self}"/>
+    {links}
+    <content>{content}</content>
+  </entry>"""
+
+
+def reading_type(uom: int, multiplier: int, flow_direction: int) -> str:
+    return (
+        "<ReadingType>"
+        f"<flowDirection>{flow_direction}</flowDirection>"
+        f"<powerOfTenMultiplier>{multiplier}</powerOfTenMultiplier>"
+        f"<uom>{uom}</uom>"
+        "</ReadingType>"
+    )
+
+
+def interval_block(values: list) -> str:
+    reads = "".join(
+        "<IntervalReading>"
+        f"<timePeriod><duration>900</duration><start>{START + i * 900}</start>"
+        f"</timePeriod><value>{value}</value>"
+        "</IntervalReading>"
+        for i, value in enumerate(values)
+    )
+    return f"<IntervalBlock>{reads}</IntervalBlock>"
+
+
+def meter(name: str, reading: str, values: list) -> list:
+    """
+    The ReadingType, MeterReading and IntervalBlock entries of one meter, linked
+    the way utilities export them.
+    """
+
+    usage_point = "/espi/1_1/resource/Subscription/1/UsagePoint/1"
+    meter_reading = f"{usage_point}/MeterReading/{name}"
+    reading_type_href = f"/espi/1_1/resource/ReadingType/{name}"
+
+    return [
+        ENTRY.format(self=reading_type_href, links="", content=reading),
+        ENTRY.format(
+            self=meter_reading,
+            links=f'<link rel="related" href="{reading_type_href}"/>'
+            f'<link rel="related" href="{meter_reading}/IntervalBlock"/>',
+            content="<MeterReading/>",
+        ),
+        ENTRY.format(
+            self=f"{meter_reading}/IntervalBlock/1",
+            links=f'<link rel="up" href="{meter_reading}/IntervalBlock"/>',
+            content=interval_block(values),
+        ),
+    ]
+
+
+def feed(*meters: list) -> str:
+    # All the ReadingTypes, then all the MeterReadings, then the blocks.
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:espi="http://naesb.org/espi">'
+        + "".join(entry for entries in zip(*meters) for entry in entries)
+        + "</feed>"
+    )
+
+
+def test_units_and_flow_direction(tmp_path):
+    # Delivered reads in daWh and exported ones in Wh, whose ReadingType is the
+    # last one before any block: the blocks have to be matched by their links.
+    xml = feed(
+        meter("delivered", reading_type(72, 1, 1), [25, 30, 0, 125]),
+        meter("received", reading_type(72, 0, 19), [400, 400]),
+    )
+    path = tmp_path / "usage.xml.gz"
+    path.write_bytes(gzip.compress(xml.encode()))
+
+    green_button = GreenButtonFile(path, batch_size=3)
+    batches = list(green_button.batches())
+    data = pd.concat(batches, ignore_index=True)
+
+    assert [len(b) for b in batches] == [3, 1]
+    assert data["value"].tolist() == [0.25, 0.3, 0.0, 1.25]
+    assert data["datetime"][0] == pd.Timestamp("2025-01-01 05:00", tz="UTC")
+    assert green_button.num_reads == 4
+    assert green_button.num_skipped == 2
+    assert green_button.durations == {900}
+
+
+def test_unknown_units_are_skipped(tmp_path):
+    # Wh of reactive energy (uom 73, VArh) aren't kWh of anything.
+    xml = feed(
+        meter("reactive", reading_type(73, 0, 1), [100, 100]),
+        meter("delivered", reading_type(72, -3, 1), [500_000]),
+    )
+    path = tmp_path / "usage.xml"
+    path.write_text(xml)
+
+    green_button = GreenButtonFile(path)
+    data = pd.concat(green_button.batches(), ignore_index=True)
+
+    assert data["value"].tolist() == [0.5]
+    assert green_button.num_skipped == 2
@@ -0,0 +1,40 @@
+import pandas as pd
+
+from powerplot_scraper.db import read_last_timestamp
+from powerplot_scraper.mock_server import MockConEd, MockServer
+from powerplot_scraper.provider_coned import ConEd
+
+
+def test_read_last_timestamp(tmp_path):
+    db_path = tmp_path / "db.csv"
+    assert read_last_timestamp(db_path) is None
+
+    db_path.write_text("datetime,value\n")
+    assert read_last_timestamp(db_path) is None
+
+    index = pd.date_range("2025-01-01", periods=1000, freq="15min", tz="UTC")
+    pd.DataFrame({"datetime": index, "value": 0.25}).to_csv(db_path, index=False)
+    assert read_last_timestamp(db_path) == index[-1]
+
+
+def test_polls_only_fetch_what_is_new():
+    with MockServer(MockConEd(days=30)) as server:
+        coned = ConEd(
+            "incremental@example.com",
+            "password",
+            use_cached_credentials=False,
+            base_url=server.base_url,
+            opower_url=server.opower_url,
+        )
+        coned.connect()
+
+        since = pd.Timestamp.now(tz="UTC").floor("15min") - pd.Timedelta(hours=3)
+        recent = coned.get_power_consumption_data(since=since)
+
+        # Too far back: the wide window, not a range starting at `since`.
+        stale = coned.get_power_consumption_data(since=since - pd.Timedelta(days=3))
+        wide = coned.get_power_consumption_data()
+
+    assert recent["datetime"].min() == since - ConEd.INCREMENTAL_OVERLAP
+    assert len(recent) <= 5 * 4
+    assert len(stale) >= 30 * 96 and len(wide) >= 30 * 96
@@ -0,0 +1,70 @@
+import pytest
+
+from powerplot_scraper.mock_server import FixtureRecorder, MockConEd, MockServer
+from powerplot_scraper.provider_coned import ConEd
+
+USERNAME = "record@example.com"
+PASSWORD = "hunter22"
+
+
+def client(server: MockServer, mfa: str = None) -> ConEd:
+    return ConEd(
+        USERNAME,
+        PASSWORD,
+        mfa=mfa,
+        use_cached_credentials=False,
+        base_url=server.base_url,
+        opower_url=server.opower_url,
+    )
+
+
+def test_mfa_login_and_expired_tokens():
+    mock = MockConEd(mfa="123456", seed=1)
+    with MockServer(mock) as server:
+        with pytest.raises(Exception, match="Failed to 2FA"):
+            client(server, mfa="000000").login()
+
+        coned = client(server, mfa="123456")
+        coned.login()
+        coned.resolve_meter()
+        assert coned.meter_id == "mock-meter-id"
+
+        # The token expires: the client logs in again and carries on.
+        mock.tokens.clear()
+        assert not coned.fetch_usage().empty
+
+    assert mock.stats["login"] == 3
+    assert mock.stats["verify_factor"] == 3
+    assert mock.stats["usage"] == 2
+
+
+def test_recorded_responses_replay_scrubbed(tmp_path):
+    with MockServer(MockConEd(days=2)) as server:
+        coned = client(server)
+        coned.recorder = FixtureRecorder(tmp_path, secrets=[PASSWORD])
+        coned.login()
+        coned.resolve_meter()
+        recorded = coned.fetch_usage()
+
+    fixtures = sorted(p.stem for p in tmp_path.iterdir())
+    assert fixtures == [
+        "auth_redirect",
+        "login",
+        "metadata",
+        "meters",
+        "token",
+        "usage",
+    ]
+    for path in tmp_path.iterdir():
+        text = path.read_text()
+        assert USERNAME not in text and PASSWORD not in text and "eyJ" not in text
+
+    # The recorded usage is served as it is, days later too.
+    with MockServer(MockConEd(days=30, fixtures=tmp_path)) as server:
+        coned = client(server)
+        coned.login()
+        coned.resolve_meter()
+        replayed = coned.fetch_usage()
+
+    assert len(recorded) >= 2 * 96
+    assert replayed.equals(recorded)
@@ -0,0 +1,73 @@
+import json
+import socket
+
+import pandas as pd
+import pytest
+
+from powerplot_scraper.publish import (
+    NOTIFY_SOCKET_NAME,
+    manifest_path,
+    publish,
+    read_manifest,
+    sha256sum,
+    write_atomically,
+)
+
+
+def reads(num_reads: int) -> pd.DataFrame:
+    index = pd.date_range(
+        "2025-01-01", periods=num_reads, freq="15min", tz="UTC", name="datetime"
+    )
+    return pd.DataFrame({"value": 0.25}, index=index)
+
+
+def test_publish_versions_and_notifies(tmp_path):
+    db_path = tmp_path / "db.csv"
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    listener.bind(str(tmp_path / NOTIFY_SOCKET_NAME))
+    listener.settimeout(1)
+
+    try:
+        first = publish(reads(4), db_path, timezone="America/New_York")
+        second = publish(reads(8), db_path)
+        notifications = [json.loads(listener.recv(4096)) for _ in range(2)]
+    finally:
+        listener.close()
+
+    assert (first["version"], second["version"]) == (1, 2)
+    assert read_manifest(db_path) == second
+    assert second["rows"] == 8
+    assert second["last_timestamp"] == "2025-01-01T01:45:00+00:00"
+    assert second["sha256"] == sha256sum(db_path)
+    assert "timezone" not in second
+    assert pd.read_csv(db_path)["value"].sum() == 2.0
+
+    assert [n["version"] for n in notifications] == [1, 2]
+    assert notifications[0]["db"] == "db.csv"
+
+    # Nothing but the db, its manifest and the socket is left behind.
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        ["db.csv", manifest_path(db_path).name, NOTIFY_SOCKET_NAME]
+    )
+
+
+def test_failed_write_keeps_the_published_file(tmp_path):
+    path = tmp_path / "db.csv"
+    path.write_text("published")
+
+    def write(f):
+        f.write("half")
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        write_atomically(path, write)
+
+    assert path.read_text() == "published"
+
+
+def test_unreadable_manifest(tmp_path):
+    db_path = tmp_path / "db.csv"
+    assert read_manifest(db_path) is None
+
+    manifest_path(db_path).write_text('{"version": ')
+    assert read_manifest(db_path) is None
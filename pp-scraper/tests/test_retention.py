@@ -0,0 +1,96 @@
+import pathlib
+
+import pandas as pd
+
+from powerplot_scraper.retention import RetentionPolicy, read_tier, tier_path
+
+TIMEZONE = "America/New_York"
+API_PATH = pathlib.Path(__file__).resolve().parents[2] / "pp-api"
+
+
+def reads(start: pd.Timestamp, num_reads: int, value: float) -> pd.DataFrame:
+    index = pd.date_range(start, periods=num_reads, freq="15min", name="datetime")
+    return pd.DataFrame({"value": value}, index=index.tz_convert("UTC"))
+
+
+def old_hour() -> pd.Timestamp:
+    # Past the raw window, well within the hourly one.
+    return (pd.Timestamp.now(tz=TIMEZONE) - pd.Timedelta(days=200)).floor("h")
+
+
+def recent_reads() -> pd.DataFrame:
+    return reads(pd.Timestamp.now(tz=TIMEZONE).floor("D"), 8, 0.1)
+
+
+def archive(db_path: pathlib.Path, hour: pd.Timestamp, kwh: float):
+    """
+    An hourly tier with just `hour` in it.
+    """
+
+    archived = pd.DataFrame(
+        {"value": [kwh]},
+        index=pd.DatetimeIndex([hour.tz_convert("UTC")], name="datetime"),
+    )
+    archived.to_csv(tier_path(db_path, "hourly"))
+
+
+def archived_kwh(db_path: pathlib.Path) -> list:
+    return read_tier(tier_path(db_path, "hourly"))["value"].tolist()
+
+
+def test_partial_hour_does_not_replace_its_rollup(tmp_path):
+    db_path = tmp_path / "db.csv"
+    policy = RetentionPolicy(raw_days=90, hourly_days=730, timezone=TIMEZONE)
+    hour = old_hour()
+    archive(db_path, hour, 1.0)
+
+    # A backfill chunk ending mid-hour: two of the hour's four reads.
+    policy.compact(pd.concat([reads(hour, 2, 9.0), recent_reads()]), db_path)
+    assert archived_kwh(db_path) == [1.0]
+
+    # The whole hour fetched again does replace it.
+    policy.compact(pd.concat([reads(hour, 4, 0.5), recent_reads()]), db_path)
+    assert archived_kwh(db_path) == [2.0]
+
+
+def test_partial_hour_fills_in_a_missing_hour(tmp_path):
+    db_path = tmp_path / "db.csv"
+    policy = RetentionPolicy(raw_days=90, hourly_days=730, timezone=TIMEZONE)
+
+    policy.compact(pd.concat([reads(old_hour(), 2, 0.25), recent_reads()]), db_path)
+
+    assert archived_kwh(db_path) == [0.5]
+
+
+def test_no_overwrite_keeps_the_archived_hour(tmp_path):
+    db_path = tmp_path / "db.csv"
+    policy = RetentionPolicy(raw_days=90, hourly_days=730, timezone=TIMEZONE)
+    hour = old_hour()
+    archive(db_path, hour, 1.0)
+
+    data = pd.concat([reads(hour, 4, 0.5), recent_reads()])
+    policy.compact(data, db_path, overwrite=False)
+
+    assert archived_kwh(db_path) == [1.0]
+
+
+def test_only_old_reads_keep_their_newest_day_raw(tmp_path, monkeypatch):
+    db_path = tmp_path / "db.csv"
+    policy = RetentionPolicy(raw_days=90, hourly_days=730, timezone=TIMEZONE)
+
+    # Ten days of history, all of it past the raw window, e.g. an import.
+    start = (pd.Timestamp.now(tz=TIMEZONE) - pd.Timedelta(days=300)).normalize()
+    raw = policy.compact(reads(start, 10 * 96, 0.25), db_path)
+
+    assert len(raw) == 96
+    assert raw.index[0] == (start + pd.Timedelta(days=9)).tz_convert("UTC")
+    assert len(archived_kwh(db_path)) == 9 * 24
+
+    # ... and pp-api can load what's published.
+    raw.to_csv(db_path)
+    monkeypatch.syspath_prepend(str(API_PATH))
+    from powerplot_api.power_data import PowerData
+
+    data = PowerData(db_path, timezone=TIMEZONE)
+    data.load_archive(db_path)
+    assert data.daily()["value"].tolist() == [24.0] * 10
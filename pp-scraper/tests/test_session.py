@@ -0,0 +1,50 @@
+import asyncio
+
+import aiohttp
+from yarl import URL
+
+from powerplot_scraper.provider_coned import ConEdAccount
+from powerplot_scraper.provider_coned_async import AsyncConEd
+
+COOKIE = {"name": "ASP.NET_SessionId", "value": "abc", "path": "/", "expires": None}
+
+
+def test_async_restore_keeps_the_cookie_domain(tmp_path, monkeypatch):
+    monkeypatch.setattr(ConEdAccount, "session_file_path", tmp_path / "session.json")
+    account = ConEdAccount("user@example.com", "password", use_cached_credentials=False)
+    account.write_session("token", [{**COOKIE, "domain": ".coned.com"}])
+
+    async def restore():
+        async with aiohttp.TCPConnector() as connector:
+            client = AsyncConEd("user@example.com", "password", connector)
+            try:
+                assert await client.restore_session()
+                jar = client.session.cookie_jar
+                return jar.filter_cookies(URL("https://www.coned.com/en/login"))
+            finally:
+                await client.close()
+
+    # Set for .coned.com, so sent to www.coned.com too, not just coned.com.
+    assert asyncio.run(restore())["ASP.NET_SessionId"].value == "abc"
+
+
+def test_encrypted_session_round_trip(tmp_path, monkeypatch):
+    path = tmp_path / "session.json"
+    monkeypatch.setattr(ConEdAccount, "session_file_path", path)
+    account = ConEdAccount("user@example.com", "password", use_cached_credentials=False)
+    cookies = [{**COOKIE, "domain": "www.coned.com"}]
+    account.write_session("token", cookies)
+
+    # Nothing readable on disk, and only for the owner.
+    assert "abc" not in path.read_text() and "token" not in path.read_text()
+    assert path.stat().st_mode & 0o777 == 0o600
+
+    session = account.read_session()
+    assert (session["token"], session["cookies"]) == ("token", cookies)
+
+    # Not with another password, nor once expired.
+    other = ConEdAccount("user@example.com", "other", use_cached_credentials=False)
+    assert other.read_session() is None
+    monkeypatch.setattr(ConEdAccount, "SESSION_TTL_SECONDS", -1)
+    account.write_session("token", cookies)
+    assert account.read_session() is None
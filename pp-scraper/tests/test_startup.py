@@ -0,0 +1,33 @@
+import os
+import sys
+import json
+import subprocess
+
+# Only what the command run needs, not at import.
+HEAVY_MODULES = [
+    "pandas",
+    "numpy",
+    "requests",
+    "aiohttp",
+    "cryptography",
+    "powerplot_scraper.config",
+    "powerplot_scraper.installation_wizard",
+]
+
+
+def test_entry_point_imports_lightly(tmp_path):
+    script = (
+        "import sys, json, powerplot_scraper.__main__; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        env={**os.environ, "HOME": str(tmp_path)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert json.loads(result.stdout) == []
+    # Nor does it set anything up on disk.
+    assert list(tmp_path.iterdir()) == []